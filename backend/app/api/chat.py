@@ -1,8 +1,90 @@
-from fastapi import APIRouter # type: ignore
+# backend/app/api/chat.py
+
+import uuid
+import base64
+import binascii
+from datetime import datetime
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status # type: ignore
+from sqlalchemy import select, tuple_ # type: ignore
+from sqlalchemy.ext.asyncio import AsyncSession # type: ignore
+
+from ..config import settings
+from ..models.models import User, ChatSession, Message
+from ..services.database_service import get_db_session
+from ..services.http_compression import compressed_json_response
+from .users import get_current_user
 
 router = APIRouter()
 
 # Rota temporária para evitar o erro de importação
 @router.get("/simple-status")
 async def get_simple_status():
-    return {"status": "chat module ativo"}
\ No newline at end of file
+    return {"status": "chat module ativo"}
+
+# ========== HISTÓRICO DE MENSAGENS ==========
+
+def encode_cursor(sent_at: datetime, message_id: uuid.UUID) -> str:
+    """Cursor opaco com a posição (sent_at, id) da última mensagem entregue."""
+    raw = f"{sent_at.isoformat()}|{message_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        sent_at, message_id = raw.split("|", 1)
+        return datetime.fromisoformat(sent_at), uuid.UUID(message_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido")
+
+@router.get("/sessions/{session_id}/messages")
+async def list_session_messages(
+    session_id: uuid.UUID,
+    request: Request,
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db_session)],
+    limit: int = Query(settings.HISTORY_PAGE_SIZE, ge=1, le=settings.HISTORY_MAX_PAGE_SIZE),
+    before: Optional[str] = Query(None, description="Cursor retornado em next_cursor da página anterior"),
+):
+    """
+    Histórico da sessão, da mensagem mais recente para trás, em páginas.
+
+    Paginação por cursor (keyset): cada página continua a partir de (sent_at, id)
+    da última mensagem entregue, usando o índice ix_messages_session_sent_at. O
+    custo é proporcional ao tamanho da página, e não ao número de mensagens já
+    percorridas (como seria com OFFSET). As mensagens de cada página vêm em ordem
+    cronológica; `next_cursor` é None quando não há mensagens mais antigas.
+    """
+    owner_id = await db.scalar(select(ChatSession.user_id).where(ChatSession.id == session_id))
+    if owner_id is None or owner_id != current_user.id:
+        # Mesma resposta para sessão inexistente ou de outro usuário
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sessão não encontrada")
+
+    query = (
+        select(Message.id, Message.sender, Message.content, Message.sent_at)
+        .where(Message.session_id == session_id)
+        .order_by(Message.sent_at.desc(), Message.id.desc())
+        .limit(limit + 1)  # uma linha a mais indica se existe próxima página
+    )
+    if before:
+        cursor_sent_at, cursor_id = decode_cursor(before)
+        query = query.where(tuple_(Message.sent_at, Message.id) < tuple_(cursor_sent_at, cursor_id))
+
+    rows = (await db.execute(query)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = encode_cursor(rows[-1].sent_at, rows[-1].id) if has_more else None
+    return compressed_json_response(request, {
+        "messages": [
+            {
+                "id": str(row.id),
+                "sender": row.sender,
+                "content": row.content,
+                "sent_at": row.sent_at.isoformat() if row.sent_at else None,
+            }
+            for row in reversed(rows)
+        ],
+        "next_cursor": next_cursor,
+    })
@@ -1,22 +1,27 @@
 # backend/app/api/users.py
 
-from fastapi import APIRouter, HTTPException, Depends, status # type: ignore
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, status # type: ignore
+from fastapi.encoders import jsonable_encoder # type: ignore
+from fastapi.responses import StreamingResponse # type: ignore
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials # type: ignore
 from pydantic import BaseModel, Field, EmailStr # type: ignore
-from typing import List, Optional, Annotated
+from typing import Any, Dict, List, Optional, Annotated
+import json
 import uuid
 from datetime import datetime
 from sqlalchemy.exc import IntegrityError # type: ignore
 from sqlalchemy import select # type: ignore
 from sqlalchemy.ext.asyncio import AsyncSession # type: ignore
 
-from ..services.database_service import AsyncSessionLocal, get_db_session
+from ..config import settings
+from ..services.database_service import AsyncSessionLocal, get_db_session, known_sessions, count_rows
 from ..models.models import User, ChatSession
 from ..services.auth_service import (
-    get_password_hash,
-    verify_password,
+    get_password_hash_async,
+    verify_password_async,
     create_access_token,
-    decode_access_token
+    decode_access_token,
+    principal_cache
 )
 
 router = APIRouter()
@@ -60,16 +65,20 @@ class LoginResponse(BaseModel):
     user: UserResponse
     session_id: uuid.UUID
 
+# Campos que podem ser pedidos na listagem (nunca inclui senha_hash)
+USER_PUBLIC_FIELDS = tuple(UserResponse.model_fields)
+
 class UserListResponse(BaseModel):
-    users: List[UserResponse]
+    users: List[Dict[str, Any]]  # UserResponse completo ou apenas os campos de ?fields=
     total: int
+    total_is_estimate: bool = False
+    next_cursor: Optional[uuid.UUID] = None
 
 # ========== DEPENDENCIES ==========
 
 async def get_db(session: Annotated[AsyncSession, Depends(get_db_session)]):
-    """Wrapper para obter sessão do banco"""
-    async for db_session in get_db_session():
-        yield db_session
+    """Wrapper para obter sessão do banco (uma única sessão por requisição)"""
+    yield session
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
@@ -77,7 +86,7 @@ async def get_current_user(
 ) -> User:
     """Obtém o usuário atual através do token JWT"""
     token = credentials.credentials
-    payload = decode_access_token(token)
+    payload = decode_access_token(token)  # assinatura e expiração são sempre verificadas
     
     if payload is None:
         raise HTTPException(
@@ -94,9 +103,13 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(select(User).where(User.id == uuid.UUID(user_id)))
-        user = result.scalar_one_or_none()
+    # Caminho rápido: principal já verificado recentemente com este mesmo token
+    user = principal_cache.get(token)
+    if user is not None:
+        return user
+    
+    result = await db.execute(select(User).where(User.id == uuid.UUID(user_id)))
+    user = result.scalar_one_or_none()
     
     if user is None:
         raise HTTPException(
@@ -111,6 +124,7 @@ async def get_current_user(
             detail="Usuário inativo",
         )
     
+    principal_cache.set(token, user)
     return user
 
 # ========== ENDPOINTS ==========
@@ -142,7 +156,7 @@ async def register_user(payload: UserRegisterRequest):
                 nome=payload.nome,
                 sobrenome=payload.sobrenome,
                 email=payload.email,
-                senha_hash=get_password_hash(payload.senha),
+                senha_hash=await get_password_hash_async(payload.senha),
                 username=username,
                 is_active="ACTIVE",
                 role="USER"
@@ -205,7 +219,7 @@ async def login_user(payload: UserLoginRequest):
             )
         
         # Verifica senha
-        if not verify_password(payload.senha, user.senha_hash):
+        if not await verify_password_async(payload.senha, user.senha_hash):
             raise HTTPException(
                 status_code=401,
                 detail="Email ou senha incorretos"
@@ -255,50 +269,103 @@ async def get_current_user_info(current_user: User = Depends(get_current_user)):
 @router.put("/users/me", response_model=UserResponse)
 async def update_current_user(
     payload: UserUpdateRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db: Annotated[AsyncSession, Depends(get_db)] = None
 ):
     """Atualiza informações do usuário autenticado"""
+    # Recarrega na sessão da requisição: o objeto do cache de principais é compartilhado
+    user = await db.get(User, current_user.id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="Usuário não encontrado")
+    
     if payload.nome:
-        current_user.nome = payload.nome
+        user.nome = payload.nome
     if payload.sobrenome:
-        current_user.sobrenome = payload.sobrenome
+        user.sobrenome = payload.sobrenome
     if payload.senha:
-        current_user.senha_hash = get_password_hash(payload.senha)
+        user.senha_hash = await get_password_hash_async(payload.senha)
     
-    current_user.updated_at = datetime.utcnow()
+    user.updated_at = datetime.utcnow()
     
+    try:
+        await db.commit()
+        await db.refresh(user)
+        principal_cache.invalidate_user(user.id)
+        return UserResponse.model_validate(user)
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Erro ao atualizar usuário: {str(e)}")
+
+def parse_user_fields(fields: Optional[str]) -> List[str]:
+    """Campos pedidos em ?fields=a,b (projeção); `id` sempre incluído por ser o cursor"""
+    if not fields:
+        return list(USER_PUBLIC_FIELDS)
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    invalid = [field for field in requested if field not in USER_PUBLIC_FIELDS]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Campos inválidos: {', '.join(invalid)}")
+    return ["id"] + [field for field in requested if field != "id"]
+
+def user_page_query(columns: List[str], after: Optional[uuid.UUID], limit: int):
+    """Página por cursor (keyset) na chave primária: custo O(limit), sem OFFSET"""
+    query = select(*[getattr(User, column) for column in columns]).order_by(User.id).limit(limit)
+    if after is not None:
+        query = query.where(User.id > after)
+    return query
+
+async def export_users_ndjson(columns: List[str], after: Optional[uuid.UUID]):
+    """Exporta os usuários como NDJSON (uma linha JSON por usuário), em lotes pelo cursor"""
+    # Sessão própria: a exportação continua depois que a dependência da requisição encerra
     async with AsyncSessionLocal() as session:
-        session.add(current_user)
-        try:
-            await session.commit()
-            await session.refresh(current_user)
-            return UserResponse.model_validate(current_user)
-        except Exception as e:
-            await session.rollback()
-            raise HTTPException(status_code=500, detail=f"Erro ao atualizar usuário: {str(e)}")
+        while True:
+            result = await session.execute(user_page_query(columns, after, settings.USERS_EXPORT_BATCH_SIZE))
+            rows = result.mappings().all()
+            if not rows:
+                break
+            yield "".join(json.dumps(jsonable_encoder(dict(row)), ensure_ascii=False) + "\n" for row in rows)
+            after = rows[-1]["id"]
 
 @router.get("/users", response_model=UserListResponse)
 async def list_users(
-    skip: int = 0,
-    limit: int = 100,
-    current_user: User = Depends(get_current_user)
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Annotated[AsyncSession, Depends(get_db)] = None,
+    limit: int = Query(100, ge=1, le=settings.USERS_MAX_PAGE_SIZE),
+    after: Optional[uuid.UUID] = Query(None, description="Cursor: next_cursor da página anterior"),
+    skip: int = Query(0, ge=0, description="Obsoleto (OFFSET); prefira o cursor `after`"),
+    fields: Optional[str] = Query(None, description="Projeção, ex.: id,nome,email"),
+    format: Optional[str] = Query(None, pattern="^(json|ndjson)$"),
 ):
-    """Lista todos os usuários (requer autenticação)"""
-    async with AsyncSessionLocal() as session:
-        # Conta total
-        result = await session.execute(select(User))
-        total = len(result.scalars().all())
-        
-        # Busca com paginação
-        result = await session.execute(
-            select(User).offset(skip).limit(limit)
-        )
-        users = result.scalars().all()
-        
-        return UserListResponse(
-            users=[UserResponse.model_validate(user) for user in users],
-            total=total
-        )
+    """
+    Lista os usuários (requer autenticação), paginando por cursor.
+
+    O total vem de SELECT count(*) ou, em tabelas grandes no PostgreSQL, da
+    estimativa do pg_class (`total_is_estimate`). Com `format=ndjson` (ou
+    Accept: application/x-ndjson) a resposta é uma exportação em streaming de
+    todos os usuários a partir do cursor, restrita a administradores.
+    """
+    columns = parse_user_fields(fields)
+    
+    if format == "ndjson" or (format is None and "application/x-ndjson" in request.headers.get("accept", "")):
+        if current_user.role != "ADMIN":
+            raise HTTPException(status_code=403, detail="Exportação restrita a administradores")
+        return StreamingResponse(export_users_ndjson(columns, after), media_type="application/x-ndjson")
+    
+    total, is_estimate = await count_rows(db, User)
+    
+    query = user_page_query(columns, after, limit + 1)  # uma linha a mais indica a próxima página
+    if skip and after is None:
+        query = query.offset(skip)
+    rows = (await db.execute(query)).mappings().all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    return UserListResponse(
+        users=[dict(row) for row in rows],
+        total=total,
+        total_is_estimate=is_estimate,
+        next_cursor=rows[-1]["id"] if has_more else None
+    )
 
 @router.get("/users/{user_id}", response_model=UserResponse)
 async def get_user(
@@ -317,17 +384,25 @@ async def get_user(
 
 @router.delete("/users/me")
 async def delete_current_user(
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db: Annotated[AsyncSession, Depends(get_db)] = None
 ):
     """Desativa (soft delete) o usuário autenticado"""
-    current_user.is_active = "INACTIVE"
-    current_user.updated_at = datetime.utcnow()
+    # Recarrega na sessão da requisição: o objeto do cache de principais é compartilhado
+    user = await db.get(User, current_user.id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="Usuário não encontrado")
     
-    async with AsyncSessionLocal() as session:
-        session.add(current_user)
-        try:
-            await session.commit()
-            return {"message": "Usuário desativado com sucesso"}
-        except Exception as e:
-            await session.rollback()
-            raise HTTPException(status_code=500, detail=f"Erro ao desativar usuário: {str(e)}")
+    user.is_active = "INACTIVE"
+    user.updated_at = datetime.utcnow()
+    
+    try:
+        await db.commit()
+        principal_cache.invalidate_user(user.id)
+        # Remove o usuário e suas sessões do cache de sessões conhecidas
+        result = await db.execute(select(ChatSession.id).where(ChatSession.user_id == user.id))
+        known_sessions.invalidate(user.id, *result.scalars().all())
+        return {"message": "Usuário desativado com sucesso"}
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Erro ao desativar usuário: {str(e)}")
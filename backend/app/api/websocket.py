@@ -1,4 +1,13 @@
+import uuid
+from typing import Optional, Tuple
+
 from fastapi import WebSocket # type: ignore
+from sqlalchemy import select # type: ignore
+
+from ..config import settings
+from ..models.models import User, ChatSession
+from ..services.auth_service import decode_access_token, principal_cache
+from ..services.database_service import AsyncSessionLocal
 
 # Gerenciador de conexões ativas por ID de sessão
 class ConnectionManager:
@@ -28,4 +37,61 @@ class ConnectionManager:
         else:
             print(f" [WS WARNING] Usuário {user_id} não está conectado. Conexões ativas: {list(self.active_connections.keys())}")
 
-manager = ConnectionManager()
\ No newline at end of file
+manager = ConnectionManager()
+
+async def resolve_websocket_session(websocket: WebSocket) -> Tuple[Optional[str], bool]:
+    """
+    Resolve, uma única vez no handshake, a sessão de chat da conexão.
+
+    Com `?token=` (JWT emitido pelo login): valida o token, o usuário e a posse da
+    sessão `?id=` (ou usa a sessão ativa mais recente do usuário). As gravações da
+    conexão (e as respostas do Worker, via `session_verified`) levam esse resultado
+    e não consultam nem criam usuário/sessão, sem depender do cache `known_sessions`.
+    Sem token, aceita `?id=` apenas se WS_ALLOW_ANONYMOUS estiver ativo.
+
+    Retorna (session_id, autenticado); session_id é None quando a conexão deve ser recusada.
+    """
+    token = websocket.query_params.get("token")
+    requested_id = (websocket.query_params.get("id") or "").strip()
+
+    if not token:
+        if settings.WS_ALLOW_ANONYMOUS and requested_id:
+            return requested_id, False
+        return None, False
+
+    payload = decode_access_token(token)
+    if not payload or not payload.get("sub"):
+        return None, False
+
+    try:
+        user_uuid = uuid.UUID(payload["sub"])
+        requested_uuid = uuid.UUID(requested_id) if requested_id else None
+    except ValueError:
+        return None, False
+
+    async with AsyncSessionLocal() as db:
+        user = principal_cache.get(token)
+        if user is None:
+            user = await db.get(User, user_uuid)
+            if user is None or user.is_active != "ACTIVE":
+                return None, False
+            principal_cache.set(token, user)
+
+        if requested_uuid is not None:
+            chat_session = await db.get(ChatSession, requested_uuid)
+            if chat_session is None or chat_session.user_id != user.id:
+                return None, False
+        else:
+            result = await db.execute(
+                select(ChatSession).where(
+                    ChatSession.user_id == user.id,
+                    ChatSession.status == "ACTIVE"
+                ).order_by(ChatSession.start_time.desc()).limit(1)
+            )
+            chat_session = result.scalar_one_or_none()
+            if chat_session is None:
+                chat_session = ChatSession(id=uuid.uuid4(), user_id=user.id, status="ACTIVE")
+                db.add(chat_session)
+                await db.commit()
+
+    return str(chat_session.id), True
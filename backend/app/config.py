@@ -3,7 +3,12 @@
 Configurações da aplicação para diferentes ambientes
 """
 import os
+import socket
 from typing import List
+from dotenv import load_dotenv
+
+# Carrega o .env antes de montar as configurações (independe da ordem de import)
+load_dotenv()
 
 class Settings:
     """Configurações da aplicação"""
@@ -26,6 +31,10 @@ class Settings:
     BACKEND_HOST: str = os.getenv("BACKEND_HOST", "0.0.0.0")
     BACKEND_PORT: int = int(os.getenv("BACKEND_PORT", "8000"))
     
+    # Identificador deste nó do API Gateway (um por processo uvicorn).
+    # Usado para rotear as respostas à réplica que mantém o WebSocket do usuário.
+    GATEWAY_NODE_ID: str = f"{os.getenv('GATEWAY_NODE_ID', socket.gethostname())}-{os.getpid()}"
+    
     # PostgreSQL
     POSTGRES_HOST: str = os.getenv("POSTGRES_HOST", os.getenv("PGHOST", "postgres"))
     POSTGRES_PORT: int = int(os.getenv("POSTGRES_PORT", os.getenv("PGPORT", "5432")))
@@ -35,9 +44,17 @@ class Settings:
     
     # Se DATABASE_URL estiver disponível (Railway, Render), use ela
     DATABASE_URL: str = os.getenv("DATABASE_URL", "")
-    if DATABASE_URL:
-        # Extrai informações da DATABASE_URL se necessário
-        pass
+    
+    # Pool de conexões (por processo). Total no servidor:
+    # (DB_POOL_SIZE + DB_MAX_OVERFLOW) x (Workers + Gateways) deve caber em max_connections
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # segundos; -1 desativa
+    DB_QUERY_CACHE_SIZE: int = int(os.getenv("DB_QUERY_CACHE_SIZE", "500"))  # cache de SQL compilado
+    # Cache de prepared statements do asyncpg por conexão (0 com PgBouncer em modo transaction)
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = int(os.getenv("DB_PREPARED_STATEMENT_CACHE_SIZE", "100"))
     
     # RabbitMQ
     RABBITMQ_URL: str = os.getenv("RABBITMQ_URL", "")
@@ -45,16 +62,131 @@ class Settings:
     RABBITMQ_PORT: int = int(os.getenv("RABBITMQ_PORT", "5672"))
     RABBITMQ_USER: str = os.getenv("RABBITMQ_USER", "user")
     RABBITMQ_PASS: str = os.getenv("RABBITMQ_PASS", "password")
+    # Transporte assíncrono (aio-pika) do API Gateway
+    RABBITMQ_CHANNEL_POOL_SIZE: int = int(os.getenv("RABBITMQ_CHANNEL_POOL_SIZE", "8"))
+    RABBITMQ_CONSUMER_PREFETCH: int = int(os.getenv("RABBITMQ_CONSUMER_PREFETCH", "100"))
+    
+    # Entrega de respostas aos WebSockets (fila limitada + despacho em lotes)
+    REPLY_QUEUE_MAXSIZE: int = int(os.getenv("REPLY_QUEUE_MAXSIZE", "1000"))
+    REPLY_BATCH_SIZE: int = int(os.getenv("REPLY_BATCH_SIZE", "64"))
+    
+    # Retentativas da fila q.ia_request: níveis de atraso (ms, backoff exponencial) e máximo antes da DLQ
+    MESSAGE_RETRY_DELAYS_MS: str = os.getenv("MESSAGE_RETRY_DELAYS_MS", "1000,5000,25000")
+    MESSAGE_MAX_RETRIES: int = int(os.getenv("MESSAGE_MAX_RETRIES", "3"))
+    
+    # Justiça entre usuários: até FAIR_INTERACTIVE_BURST mensagens por FAIR_BURST_WINDOW segundos são
+    # interativas (o excedente vai para q.ia_request.bulk); no Worker, DRR por usuário com quantum em tokens
+    FAIR_INTERACTIVE_BURST: int = int(os.getenv("FAIR_INTERACTIVE_BURST", "3"))
+    FAIR_BURST_WINDOW: float = float(os.getenv("FAIR_BURST_WINDOW", "30"))
+    FAIR_INTERACTIVE_WEIGHT: int = int(os.getenv("FAIR_INTERACTIVE_WEIGHT", "4"))
+    FAIR_QUANTUM_TOKENS: int = int(os.getenv("FAIR_QUANTUM_TOKENS", "256"))
+    
+    # Limite de taxa na entrada do WebSocket (token bucket): memory (um nó) | redis (cluster)
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+    RATE_LIMIT_USER_RATE: float = float(os.getenv("RATE_LIMIT_USER_RATE", "0.5"))  # mensagens/s por usuário
+    RATE_LIMIT_USER_BURST: int = int(os.getenv("RATE_LIMIT_USER_BURST", "5"))
+    RATE_LIMIT_GLOBAL_RATE: float = float(os.getenv("RATE_LIMIT_GLOBAL_RATE", "0"))  # cota do provedor em req/s (0 = sem limite)
+    RATE_LIMIT_GLOBAL_BURST: int = int(os.getenv("RATE_LIMIT_GLOBAL_BURST", "20"))
     
     # Redis
     REDIS_HOST: str = os.getenv("REDIS_HOST", "redis")
     REDIS_PORT: int = int(os.getenv("REDIS_PORT", "6379"))
     REDIS_URL: str = os.getenv("REDIS_URL", "")
+    REDIS_SOCKET_TIMEOUT: float = float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.5"))
+    
+    # Registro de conexões WebSocket (user_id -> nó do Gateway)
+    CONNECTION_REGISTRY_TTL: int = int(os.getenv("CONNECTION_REGISTRY_TTL", "120"))
+    
+    # WebSocket sem token (apenas ?id=): permitido por padrão só em desenvolvimento
+    WS_ALLOW_ANONYMOUS: bool = os.getenv(
+        "WS_ALLOW_ANONYMOUS", "true" if ENVIRONMENT == "development" else "false"
+    ).lower() == "true"
+    
+    # Ingestão no WebSocket: ordered (persiste -> publica -> ACK) ou
+    # pipelined (publica -> ACK -> persiste em segundo plano, com backpressure)
+    INGEST_MODE: str = os.getenv("INGEST_MODE", "pipelined").lower()
+    
+    # Gravação de mensagens em lote (write-behind): sync | batched | async
+    MESSAGE_WRITE_DURABILITY: str = os.getenv("MESSAGE_WRITE_DURABILITY", "batched").lower()
+    MESSAGE_WRITE_BATCH_SIZE: int = int(os.getenv("MESSAGE_WRITE_BATCH_SIZE", "200"))
+    MESSAGE_WRITE_FLUSH_MS: int = int(os.getenv("MESSAGE_WRITE_FLUSH_MS", "50"))
+    MESSAGE_WRITE_QUEUE_MAXSIZE: int = int(os.getenv("MESSAGE_WRITE_QUEUE_MAXSIZE", "10000"))
+    
+    # Cache de sessões conhecidas (usuário + sessão de chat já existem no banco)
+    KNOWN_SESSIONS_CACHE_SIZE: int = int(os.getenv("KNOWN_SESSIONS_CACHE_SIZE", "10000"))
+    KNOWN_SESSIONS_CACHE_TTL: int = int(os.getenv("KNOWN_SESSIONS_CACHE_TTL", "600"))
+    
+    # Contexto da conversa no Worker (turnos recentes por sessão, no Redis ou em memória)
+    CONTEXT_ENABLED: bool = os.getenv("CONTEXT_ENABLED", "true").lower() == "true"
+    CONTEXT_MAX_TURNS: int = int(os.getenv("CONTEXT_MAX_TURNS", "20"))
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+    CONTEXT_TTL: int = int(os.getenv("CONTEXT_TTL", "3600"))
+    CONTEXT_LOCAL_SESSIONS: int = int(os.getenv("CONTEXT_LOCAL_SESSIONS", "1000"))
+    
+    # Histórico de mensagens via REST (paginação por cursor) e compressão das respostas
+    HISTORY_PAGE_SIZE: int = int(os.getenv("HISTORY_PAGE_SIZE", "50"))
+    HISTORY_MAX_PAGE_SIZE: int = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "200"))
+    HTTP_COMPRESSION_MIN_BYTES: int = int(os.getenv("HTTP_COMPRESSION_MIN_BYTES", "1024"))
+    
+    # Listagem de usuários: página máxima, contagem estimada (pg_class) acima do limite e lotes da exportação NDJSON
+    USERS_MAX_PAGE_SIZE: int = int(os.getenv("USERS_MAX_PAGE_SIZE", "500"))
+    USERS_COUNT_ESTIMATE_THRESHOLD: int = int(os.getenv("USERS_COUNT_ESTIMATE_THRESHOLD", "100000"))
+    USERS_EXPORT_BATCH_SIZE: int = int(os.getenv("USERS_EXPORT_BATCH_SIZE", "1000"))
+    
+    # Particionamento mensal de messages e retenção (partições antigas arquivadas em disco e removidas)
+    MESSAGE_PARTITION_MONTHS_AHEAD: int = int(os.getenv("MESSAGE_PARTITION_MONTHS_AHEAD", "3"))
+    MESSAGE_RETENTION_MONTHS: int = int(os.getenv("MESSAGE_RETENTION_MONTHS", "12"))
+    MESSAGE_ARCHIVE_DIR: str = os.getenv("MESSAGE_ARCHIVE_DIR", "archive/messages")
+    MESSAGE_ARCHIVE_FORMAT: str = os.getenv("MESSAGE_ARCHIVE_FORMAT", "jsonl").lower()  # jsonl | parquet
+    
+    # Cache de respostas da IA (L1 em memória + L2 no Redis)
+    RESPONSE_CACHE_ENABLED: bool = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    RESPONSE_CACHE_TTL: int = int(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+    RESPONSE_CACHE_L1_SIZE: int = int(os.getenv("RESPONSE_CACHE_L1_SIZE", "1024"))
+    # Histórico da conversa na chave do cache: context (sempre) | auto (perguntas autônomas também usam a chave só da pergunta) | prompt (nunca)
+    CACHE_CONTEXT_SCOPE: str = os.getenv("CACHE_CONTEXT_SCOPE", "auto").lower()
+    CACHE_STANDALONE_MIN_WORDS: int = int(os.getenv("CACHE_STANDALONE_MIN_WORDS", "4"))
+    
+    # Cache semântico (perguntas parecidas reutilizam a resposta; índice vetorial no Worker)
+    SEMANTIC_CACHE_ENABLED: bool = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.85"))
+    SEMANTIC_CACHE_MAX_ENTRIES: int = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "100000"))
+    SEMANTIC_CACHE_DIM: int = int(os.getenv("SEMANTIC_CACHE_DIM", "256"))
+    SEMANTIC_CACHE_PATH: str = os.getenv("SEMANTIC_CACHE_PATH", "")  # vazio = apenas em memória
+    
+    # Proteção das chamadas ao provedor de IA (IA Worker): limite adaptativo (AIMD), disjuntor e orçamento de retentativas
+    PROVIDER_LIMIT_INITIAL: int = int(os.getenv("PROVIDER_LIMIT_INITIAL", "4"))
+    PROVIDER_LIMIT_MIN: int = int(os.getenv("PROVIDER_LIMIT_MIN", "1"))
+    PROVIDER_LIMIT_MAX: int = int(os.getenv("PROVIDER_LIMIT_MAX", "64"))
+    PROVIDER_LIMIT_BACKOFF: float = float(os.getenv("PROVIDER_LIMIT_BACKOFF", "0.7"))
+    PROVIDER_ACQUIRE_TIMEOUT: float = float(os.getenv("PROVIDER_ACQUIRE_TIMEOUT", "5"))
+    PROVIDER_LATENCY_THRESHOLD: float = float(os.getenv("PROVIDER_LATENCY_THRESHOLD", "20"))  # 0 = ignora latência
+    PROVIDER_BREAKER_FAILURES: int = int(os.getenv("PROVIDER_BREAKER_FAILURES", "5"))
+    PROVIDER_BREAKER_RESET: float = float(os.getenv("PROVIDER_BREAKER_RESET", "30"))
+    PROVIDER_BREAKER_SHARED: bool = os.getenv("PROVIDER_BREAKER_SHARED", "true").lower() == "true"
+    PROVIDER_RETRY_BUDGET_RATIO: float = float(os.getenv("PROVIDER_RETRY_BUDGET_RATIO", "0.2"))
+    PROVIDER_RETRY_BUDGET_RESERVE: int = int(os.getenv("PROVIDER_RETRY_BUDGET_RESERVE", "10"))
     
     # API de IA
     AI_API_KEY: str = os.getenv("AI_API_KEY", "")
     AI_MODEL: str = os.getenv("AI_MODEL", "gpt-3.5-turbo")
     AI_API_URL: str = os.getenv("AI_API_URL", "")
+    
+    # Vários provedores (nome=modelo,...; chave em AI_API_KEY_<NOME>): roteamento por latência, failover e hedging
+    AI_BACKENDS: str = os.getenv("AI_BACKENDS", "")
+    AI_ROUTER_WINDOW: int = int(os.getenv("AI_ROUTER_WINDOW", "100"))
+    AI_ROUTER_MIN_SAMPLES: int = int(os.getenv("AI_ROUTER_MIN_SAMPLES", "10"))
+    AI_ROUTER_MAX_ERROR_RATE: float = float(os.getenv("AI_ROUTER_MAX_ERROR_RATE", "0.5"))
+    AI_ROUTER_EXPLORE: float = float(os.getenv("AI_ROUTER_EXPLORE", "0.05"))
+    AI_HEDGE_ENABLED: bool = os.getenv("AI_HEDGE_ENABLED", "false").lower() == "true"
+    AI_HEDGE_QUANTILE: float = float(os.getenv("AI_HEDGE_QUANTILE", "0.95"))
+    AI_HEDGE_MIN_DELAY: float = float(os.getenv("AI_HEDGE_MIN_DELAY", "1.0"))
+    
+    # Clientes HTTP dos provedores (sessão keep-alive por backend): conexões mantidas no pool e timeouts
+    AI_HTTP_POOL_SIZE: int = int(os.getenv("AI_HTTP_POOL_SIZE", "16"))
+    AI_HTTP_CONNECT_TIMEOUT: float = float(os.getenv("AI_HTTP_CONNECT_TIMEOUT", "5"))
+    AI_HTTP_READ_TIMEOUT: float = float(os.getenv("AI_HTTP_READ_TIMEOUT", "30"))
 
 # Instância global de configurações
 settings = Settings()
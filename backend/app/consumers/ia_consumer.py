@@ -7,10 +7,15 @@ import time
 import requests
 import asyncio
 import sys
+import functools
+import uuid
+import hashlib
+import re
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from http.server import HTTPServer, BaseHTTPRequestHandler # type: ignore
-from threading import Thread # type: ignore
-from prometheus_client import Counter, generate_latest, CONTENT_TYPE_LATEST # type: ignore
+from threading import Thread, Lock # type: ignore
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST # type: ignore
 from dotenv import load_dotenv
 
 # Tenta importar a biblioteca oficial do Google Gemini
@@ -32,8 +37,18 @@ load_dotenv()
 # Adiciona o diretório raiz ao path para imports absolutos
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from app.services.rabbitmq_service import get_rabbitmq_connection
-from app.services.database_service import save_message, AsyncSessionLocal # Para persistência real
+from app.services.rabbitmq_service import BULK_QUEUE_NAME, RabbitMQPublisher, node_routing_key
+from app.services.connection_registry import connection_registry
+from app.services.response_cache import response_cache, make_cache_key
+from app.services.semantic_cache import SemanticCache
+from app.config import settings
+from app.services.message_writer import message_writer # Persistência real (gravação em lote)
+from app.services.database_service import normalize_session_uuid, load_recent_messages
+from app.services.context_store import ConversationContext, context_fingerprint, estimate_tokens
+from app.services.retry_queues import PoisonMessageError, declare_retry_topology, get_retry_count, retry_or_dead_letter
+from app.services.fair_scheduler import FairScheduler, PRIORITY_BULK, PRIORITY_INTERACTIVE
+from app.services.provider_guard import ProviderRejectedError
+from app.services.ai_router import AIRouter, ProviderBackend, http_timeout, parse_backends
 
 # --- Configurações (Lidas do .env) ---
 RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "rabbitmq")
@@ -50,12 +65,36 @@ AI_API_KEY = os.getenv("AI_API_KEY")
 AI_MODEL = os.getenv("AI_MODEL", "gpt-3.5-turbo")
 AI_API_URL = os.getenv("AI_API_URL") 
 
+# Concorrência do Worker: quantas requisições à IA ficam em andamento ao mesmo
+# tempo neste processo (1 = modo sequencial, processa dentro do callback do pika)
+WORKER_CONCURRENCY = max(1, int(os.getenv("WORKER_CONCURRENCY", "1")))
+# Mensagens recebidas além das em andamento (modo concorrente): formam a fila local
+# do escalonador justo, que escolhe a próxima por usuário/classe em vez da ordem de chegada
+WORKER_PREFETCH_FACTOR = max(1, int(os.getenv("WORKER_PREFETCH_FACTOR", "4")))
+
+# Streaming de respostas: envia os tokens ao WebSocket conforme são gerados.
+# Os pedaços são agrupados por intervalo/tamanho para não publicar um frame por token.
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "false").lower() == "true"
+STREAM_FLUSH_INTERVAL = float(os.getenv("STREAM_FLUSH_INTERVAL", "0.05"))
+STREAM_FLUSH_CHARS = int(os.getenv("STREAM_FLUSH_CHARS", "200"))
+
 # Detecta se é API Gemini baseado no modelo
 IS_GEMINI = AI_MODEL.startswith("gemini") if AI_MODEL else False
 # Detecta se é API DeepSeek baseado no modelo
 IS_DEEPSEEK = AI_MODEL.startswith("deepseek") if AI_MODEL else False
 # Detecta se é API Groq baseado no modelo (llama, mixtral, etc)
 IS_GROQ = AI_MODEL.startswith("llama") or AI_MODEL.startswith("mixtral") or AI_MODEL.startswith("gemma") if AI_MODEL else False
+PROVIDER_NAME = "groq" if IS_GROQ else ("deepseek" if IS_DEEPSEEK else ("gemini" if IS_GEMINI else "openai"))
+
+# Provedores de IA: os de AI_BACKENDS (roteamento por latência, failover e hedging) ou o
+# backend único de AI_MODEL. Cada um tem limite adaptativo de concorrência e disjuntor próprios
+ai_router = AIRouter(
+    parse_backends() or [ProviderBackend(PROVIDER_NAME, AI_MODEL, AI_API_KEY, AI_API_URL)],
+    max_workers=WORKER_CONCURRENCY * 2,
+)
+
+def has_api_key() -> bool:
+    return bool(AI_API_KEY) or any(backend.api_key for backend in ai_router.backends)
 
 # Prompt de sistema focado em apoio a estudos
 SYSTEM_PROMPT = """Você é um assistente educacional especializado EXCLUSIVAMENTE em apoio a estudos e conteúdos acadêmicos. Seu objetivo é ajudar estudantes de forma didática e pedagógica, mantendo-se ESTRITAMENTE dentro de temas de aprendizado.
@@ -82,6 +121,16 @@ IMPORTANTE: Se perguntarem sobre receitas, culinária, comida, entretenimento ou
 
 Sempre responda de forma encorajadora, focada no progresso do aluno, agindo como um tutor humano e atencioso."""
 
+# Versão do prompt de sistema: faz parte da chave do cache, então alterar o
+# prompt invalida automaticamente as respostas armazenadas
+SYSTEM_PROMPT_VERSION = hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+# Cache semântico: um índice por modelo + versão do prompt (mesma regra de invalidação do cache exato)
+semantic_cache = (
+    SemanticCache(namespace=re.sub(r"[^A-Za-z0-9_.-]", "_", f"{AI_MODEL}-{SYSTEM_PROMPT_VERSION}"))
+    if settings.SEMANTIC_CACHE_ENABLED else None
+)
+
 # Métricas de Throughput do Worker
 messages_processed_total = Counter(
     'ia_worker_messages_processed_total',
@@ -89,6 +138,20 @@ messages_processed_total = Counter(
     ['status']
 )
 
+# Requisições em andamento (modo concorrente)
+inflight_requests = Gauge(
+    'ia_worker_inflight_requests',
+    'Requisições à IA em andamento no IA Worker'
+)
+
+# Espera na fila local do escalonador justo, por classe de prioridade
+scheduler_wait_seconds = Histogram(
+    'ia_worker_scheduler_wait_seconds',
+    'Tempo entre o recebimento da mensagem e o início do processamento',
+    ['priority'],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+
 
 class MetricsHandler(BaseHTTPRequestHandler):
     """Handler HTTP para expor métricas Prometheus"""
@@ -154,16 +217,93 @@ def is_educational_content(user_prompt: str) -> bool:
     
     return True
 
+class AIProviderError(Exception):
+    """
+    Falha ao obter resposta do provedor de IA; carrega a mensagem exibida ao usuário.
+    `retryable` indica falha transitória (ex.: rate limit) que vale reagendar pela fila de espera.
+    """
+
+    def __init__(self, user_message: str, retryable: bool = False):
+        super().__init__(user_message)
+        self.user_message = user_message
+        self.retryable = retryable
+
+
+RATE_LIMIT_MESSAGE = "Erro: Rate limit da API de IA (muitas requisições). Por favor, aguarde alguns instantes e tente novamente."
+PROVIDER_UNAVAILABLE_MESSAGE = "Desculpe, o serviço de IA está sobrecarregado no momento. Por favor, tente novamente em alguns instantes."
+STREAM_INTERRUPTED_MESSAGE = "[Resposta interrompida: falha na comunicação com o serviço de IA. Por favor, envie a pergunta novamente.]"
+
+
+class ErrorResponse(str):
+    """Texto de recusa ou erro exibido ao usuário: não entra no cache nem no contexto da conversa."""
+
+
+def build_chat_messages(user_prompt: str, history: list = None) -> list:
+    """Mensagens no formato OpenAI/DeepSeek/Groq: sistema, histórico recente e a pergunta atual."""
+    return [{"role": "system", "content": SYSTEM_PROMPT}, *(history or []), {"role": "user", "content": user_prompt}]
+
+def build_gemini_prompt(user_prompt: str, history: list = None) -> str:
+    """Prompt único do Gemini com o histórico recente em forma de diálogo."""
+    turns = "".join(
+        f"{'Usuário' if turn['role'] == 'user' else 'Assistente'}: {turn['content']}\n\n" for turn in history or []
+    )
+    return f"{SYSTEM_PROMPT}\n\n{turns}Usuário: {user_prompt}\n\nAssistente:"
+
+
+def cache_fingerprints(user_prompt: str, history: list = None) -> list:
+    """
+    Contextos consultados no cache, em ordem de preferência ("" = chave só da pergunta),
+    conforme CACHE_CONTEXT_SCOPE. Com "auto", uma pergunta autônoma (não um "e o
+    segundo?") numa conversa em andamento também aproveita respostas dadas sem histórico.
+    """
+    scope = settings.CACHE_CONTEXT_SCOPE
+    if not history or scope == "prompt":
+        return [""]
+    if scope == "auto" and len(user_prompt.split()) >= settings.CACHE_STANDALONE_MIN_WORDS:
+        return [context_fingerprint(history), ""]
+    return [context_fingerprint(history)]
+
+def get_cached_response(user_prompt: str, history: list = None):
+    """Consulta o cache de respostas (None em caso de ausência ou cache desabilitado)."""
+    fingerprints = cache_fingerprints(user_prompt, history)
+    if settings.RESPONSE_CACHE_ENABLED:
+        for fingerprint in fingerprints:
+            cached_response = response_cache.get(make_cache_key(user_prompt, AI_MODEL, SYSTEM_PROMPT_VERSION, fingerprint))
+            if cached_response is not None:
+                return cached_response
+
+    # Sem acerto exato: procura uma pergunta equivalente já respondida (paráfrase).
+    # Só vale para a chave sem contexto: respostas que dependem da conversa não são reaproveitadas
+    if semantic_cache is not None and "" in fingerprints:
+        cached_response, score = semantic_cache.lookup(user_prompt)
+        if cached_response is not None:
+            print(f" [CACHE] Acerto semântico (similaridade {score:.3f}) para: '{user_prompt[:50]}...'")
+            return cached_response
+    return None
+
+def store_cached_response(user_prompt: str, bot_response: str, history: list = None):
+    if not bot_response:
+        return
+    # Grava só no contexto preferido: uma resposta gerada com histórico não vira resposta genérica da pergunta
+    fingerprint = cache_fingerprints(user_prompt, history)[0]
+    if settings.RESPONSE_CACHE_ENABLED:
+        response_cache.set(make_cache_key(user_prompt, AI_MODEL, SYSTEM_PROMPT_VERSION, fingerprint), bot_response)
+    if semantic_cache is not None and not fingerprint:
+        semantic_cache.add(user_prompt, bot_response)
+
 # Chamada real à API Externa de IA
-def call_external_ai_api(user_prompt: str):
+def call_external_ai_api(user_prompt: str, history: list = None, allow_retry: bool = False):
     """
     Chama a API de IA (OpenAI ou compatível) para gerar resposta focada em estudos.
     
     Args:
         user_prompt: Mensagem do usuário
+        history: Turnos anteriores da conversa ({"role", "content"}), mais antigo primeiro
+        allow_retry: se True, falhas transitórias (AIProviderError retryable) são
+            relançadas para que a mensagem seja reagendada em vez de virar erro ao usuário
         
     Returns:
-        Resposta gerada pela IA ou mensagem de erro
+        Resposta gerada pela IA (ou do cache) ou mensagem de erro (ErrorResponse)
     """
     # Verificação prévia: recusa conteúdo não educativo antes de chamar a API
     if not is_educational_content(user_prompt):
@@ -173,114 +313,135 @@ def call_external_ai_api(user_prompt: str):
             "Como posso ajudá-lo com seus estudos?"
         )
         print(f" [INFO] Pergunta não educativa detectada e recusada: '{user_prompt[:50]}...'")
-        return refusal_message
+        return ErrorResponse(refusal_message)
     
-    if not AI_API_KEY:
+    if not has_api_key():
         error_msg = "Erro: AI_API_KEY não configurada. Configure a variável de ambiente AI_API_KEY."
         print(f" [!!!] {error_msg}")
-        return error_msg
+        return ErrorResponse(error_msg)
+    
+    # Cache de respostas: perguntas repetidas não pagam uma nova chamada ao provedor
+    cached_response = get_cached_response(user_prompt, history)
+    if cached_response is not None:
+        print(f" [CACHE] Resposta servida do cache para: '{user_prompt[:50]}...'")
+        return cached_response
     
-    api_type = "Groq" if IS_GROQ else ("DeepSeek" if IS_DEEPSEEK else ("Gemini" if IS_GEMINI else "OpenAI"))
+    try:
+        # Melhor backend disponível, com failover (e hedging, se habilitado) entre os configurados
+        bot_response = ai_router.call(lambda backend: _call_provider(user_prompt, history, backend))
+    except ProviderRejectedError as e:
+        # Disjuntor aberto ou limite de concorrência: a chamada nem chegou ao provedor
+        print(f" [!!!] {e}.")
+        if allow_retry:
+            raise AIProviderError(PROVIDER_UNAVAILABLE_MESSAGE, retryable=True) from e
+        return ErrorResponse(PROVIDER_UNAVAILABLE_MESSAGE)
+    except AIProviderError as e:
+        # Retentativas limitadas pelo orçamento: com o provedor em falha, não multiplicam a carga
+        if e.retryable and allow_retry and ai_router.allow_retry():
+            raise
+        # Erros não são armazenados no cache
+        return ErrorResponse(e.user_message)
+    
+    store_cached_response(user_prompt, bot_response, history)
+    return bot_response
+
+
+def _call_provider(user_prompt: str, history: list = None, backend: ProviderBackend = None) -> str:
+    """
+    Chama um provedor de IA (Gemini, DeepSeek, Groq ou OpenAI); sem `backend`, o primeiro configurado.
+    Lança AIProviderError com a mensagem para o usuário em caso de falha.
+    """
+    backend = backend or ai_router.backends[0]
+    is_gemini, is_deepseek, is_groq = (backend.kind == kind for kind in ("gemini", "deepseek", "groq"))
+    model, api_key, base_url = backend.model, backend.api_key, backend.api_url
+    api_type = "Groq" if is_groq else ("DeepSeek" if is_deepseek else ("Gemini" if is_gemini else "OpenAI"))
     print(f" [+] [WORKER] Processando IA ({api_type}) para: '{user_prompt[:50]}...'")
-    print(f" [+] [WORKER] Modelo: {AI_MODEL}, IS_GEMINI: {IS_GEMINI}, IS_DEEPSEEK: {IS_DEEPSEEK}, IS_GROQ: {IS_GROQ}, API_KEY presente: {bool(AI_API_KEY)}")
+    print(f" [+] [WORKER] Backend: {backend.name}, Modelo: {model}, API_KEY presente: {bool(api_key)}")
     
     try:
         # Determina URL e formato baseado no tipo de API
-        if IS_GEMINI:
+        if is_gemini:
             # Tenta usar a biblioteca oficial do Google Gemini se disponível
             if HAS_GOOGLE_GENAI:
-                model_name = AI_MODEL if AI_MODEL else "gemini-2.0-flash"
+                model_name = model if model else "gemini-2.0-flash"
                 
                 # Verifica se o modelo está disponível no plano gratuito
                 if model_name in ["gemini-3-pro-preview", "gemini-3-pro"]:
                     print(f" [!!!] AVISO: Modelo '{model_name}' não está disponível no plano gratuito. Usando 'gemini-2.0-flash'.")
                     model_name = "gemini-2.0-flash"
                 
-                max_retries_lib = 3
-                retry_delay_lib = 2
-                
-                for attempt_lib in range(max_retries_lib):
-                    try:
-                        # Cria o cliente
-                        client = genai.Client(api_key=AI_API_KEY)
-                        
-                        # Combina system prompt com user prompt
-                        full_prompt = f"{SYSTEM_PROMPT}\n\nUsuário: {user_prompt}\n\nAssistente:"
-                        
-                        print(f" [+] [WORKER] Usando biblioteca oficial Google Gemini (modelo: {model_name}, tentativa {attempt_lib + 1}/{max_retries_lib})")
-                        
-                        # Gera conteúdo usando a biblioteca oficial
-                        response = client.models.generate_content(
-                            model=model_name,
-                            contents=full_prompt
-                        )
-                        
-                        bot_response = response.text
-                        if bot_response:
-                            print(f" [+] [WORKER] Resposta da IA (Gemini) gerada com sucesso ({len(bot_response)} caracteres)")
-                            return bot_response
-                        else:
-                            return "Erro: A API retornou uma resposta vazia."
-                            
-                    except Exception as lib_error:
-                        error_str = str(lib_error)
-                        print(f" [!!!] Erro ao usar biblioteca oficial (tentativa {attempt_lib + 1}/{max_retries_lib}): {error_str}")
-                        
-                        # Se for rate limit (429) ou quota esgotada, verifica se é quota 0
-                        if "429" in error_str or "rate limit" in error_str.lower() or "quota" in error_str.lower() or "RESOURCE_EXHAUSTED" in error_str:
-                            # Verifica se é quota 0 (limit: 0) - significa que não tem acesso ao plano gratuito
-                            if "limit: 0" in error_str or '"limit": 0' in error_str:
-                                # Se for quota 0, retorna mensagem clara sobre o problema
-                                error_msg = (
-                                    "❌ Erro: Sua API key do Google Gemini não tem acesso ao plano gratuito ou a quota está zerada.\n\n"
-                                    "🔍 O que fazer:\n"
-                                    "1. Acesse https://aistudio.google.com/\n"
-                                    "2. Verifique se sua API key está ativa\n"
-                                    "3. Verifique o uso e quotas em: https://ai.dev/usage?tab=rate-limit\n"
-                                    "4. Certifique-se de que o projeto tem acesso ao plano gratuito habilitado\n"
-                                    "5. Se necessário, gere uma nova API key em um projeto diferente\n\n"
-                                    "💡 Nota: Alguns modelos podem ter quota 0 no plano gratuito. Tente usar uma API key de um projeto que tenha acesso ao plano gratuito habilitado."
-                                )
-                                print(f" [!!!] {error_msg}")
-                                return error_msg
-                            
-                            # Se for rate limit normal (não quota 0), tenta novamente
-                            if attempt_lib < max_retries_lib - 1:
-                                wait_time = retry_delay_lib * (2 ** attempt_lib)
-                                print(f" [!!!] Rate limit detectado. Aguardando {wait_time}s antes de tentar novamente...")
-                                time.sleep(wait_time)
-                                continue
-                            else:
-                                return "Erro: Rate limit da API de IA (muitas requisições). Por favor, aguarde alguns instantes e tente novamente."
+                # Uma única tentativa: rate limit volta à fila de espera (retentativa com atraso,
+                # sem sleep no Worker) e outros erros caem no método HTTP direto abaixo
+                try:
+                    # Cliente do SDK criado uma vez por backend (conexões reaproveitadas entre mensagens)
+                    client = backend.sdk_client(lambda: genai.Client(api_key=api_key))
+                    
+                    # Combina system prompt com user prompt
+                    full_prompt = build_gemini_prompt(user_prompt, history)
+                    
+                    print(f" [+] [WORKER] Usando biblioteca oficial Google Gemini (modelo: {model_name})")
+                    
+                    # Gera conteúdo usando a biblioteca oficial
+                    response = client.models.generate_content(
+                        model=model_name,
+                        contents=full_prompt
+                    )
+                    
+                    bot_response = response.text
+                    if bot_response:
+                        print(f" [+] [WORKER] Resposta da IA (Gemini) gerada com sucesso ({len(bot_response)} caracteres)")
+                        return bot_response
+                    else:
+                        raise AIProviderError("Erro: A API retornou uma resposta vazia.")
                         
-                        # Se for erro 404 (modelo não encontrado), retorna mensagem específica
-                        if "404" in error_str or "NOT_FOUND" in error_str or "is not found" in error_str.lower():
+                except AIProviderError:
+                    raise
+                except Exception as lib_error:
+                    error_str = str(lib_error)
+                    print(f" [!!!] Erro ao usar biblioteca oficial: {error_str}")
+                    
+                    # Se for rate limit (429) ou quota esgotada, verifica se é quota 0
+                    if "429" in error_str or "rate limit" in error_str.lower() or "quota" in error_str.lower() or "RESOURCE_EXHAUSTED" in error_str:
+                        # Verifica se é quota 0 (limit: 0) - significa que não tem acesso ao plano gratuito
+                        if "limit: 0" in error_str or '"limit": 0' in error_str:
+                            # Se for quota 0, retorna mensagem clara sobre o problema
                             error_msg = (
-                                f"❌ Erro: Modelo '{model_name}' não encontrado na API v1beta.\n\n"
+                                "❌ Erro: Sua API key do Google Gemini não tem acesso ao plano gratuito ou a quota está zerada.\n\n"
                                 "🔍 O que fazer:\n"
-                                "1. Verifique se o nome do modelo está correto\n"
-                                "2. Tente usar um modelo disponível no plano gratuito\n"
-                                "3. Consulte a documentação: https://ai.google.dev/gemini-api/docs/models\n"
-                                f"4. Modelo atual configurado: {AI_MODEL}"
+                                "1. Acesse https://aistudio.google.com/\n"
+                                "2. Verifique se sua API key está ativa\n"
+                                "3. Verifique o uso e quotas em: https://ai.dev/usage?tab=rate-limit\n"
+                                "4. Certifique-se de que o projeto tem acesso ao plano gratuito habilitado\n"
+                                "5. Se necessário, gere uma nova API key em um projeto diferente\n\n"
+                                "💡 Nota: Alguns modelos podem ter quota 0 no plano gratuito. Tente usar uma API key de um projeto que tenha acesso ao plano gratuito habilitado."
                             )
                             print(f" [!!!] {error_msg}")
-                            return error_msg
+                            raise AIProviderError(error_msg)
                         
-                        # Se não for rate limit e for a última tentativa, faz fallback para HTTP
-                        if attempt_lib == max_retries_lib - 1:
-                            print(f" [!!!] Todas as tentativas com biblioteca oficial falharam. Tentando método HTTP direto como fallback...")
-                            break
-                        else:
-                            # Para outros erros, tenta novamente
-                            time.sleep(retry_delay_lib)
-                            continue
+                        # Rate limit normal (não quota 0): retentativa com atraso pela fila
+                        raise AIProviderError(RATE_LIMIT_MESSAGE, retryable=True)
+                    
+                    # Se for erro 404 (modelo não encontrado), retorna mensagem específica
+                    if "404" in error_str or "NOT_FOUND" in error_str or "is not found" in error_str.lower():
+                        error_msg = (
+                            f"❌ Erro: Modelo '{model_name}' não encontrado na API v1beta.\n\n"
+                            "🔍 O que fazer:\n"
+                            "1. Verifique se o nome do modelo está correto\n"
+                            "2. Tente usar um modelo disponível no plano gratuito\n"
+                            "3. Consulte a documentação: https://ai.google.dev/gemini-api/docs/models\n"
+                            f"4. Modelo atual configurado: {model}"
+                        )
+                        print(f" [!!!] {error_msg}")
+                        raise AIProviderError(error_msg)
+                    
+                    print(f" [!!!] Biblioteca oficial falhou. Tentando método HTTP direto como fallback...")
             
             # Método HTTP direto (fallback ou quando biblioteca não está disponível)
             # API do Google Gemini via HTTP
             # URL: https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={API_KEY}
             # Modelos válidos no plano gratuito: gemini-2.0-flash, gemini-1.5-flash
             # NOTA: gemini-3-pro-preview NÃO está disponível no plano gratuito (quota: 0)
-            model_name = AI_MODEL if AI_MODEL else "gemini-2.0-flash"
+            model_name = model if model else "gemini-2.0-flash"
             
             # Lista de modelos inválidos ou não disponíveis no plano gratuito - substitui por modelo válido
             # gemini-3-pro-preview não está disponível no plano gratuito (quota: 0)
@@ -289,11 +450,11 @@ def call_external_ai_api(user_prompt: str):
                 print(f" [!!!] AVISO: Modelo '{model_name}' não está disponível no plano gratuito. Usando 'gemini-2.0-flash' como alternativa.")
                 model_name = "gemini-2.0-flash"
             
-            api_url = AI_API_URL or f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:generateContent"
+            api_url = base_url or f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:generateContent"
             print(f" [+] [WORKER] URL da API Gemini: {api_url.split('?')[0]} (modelo: {model_name})")
             
             # Combina system prompt com user prompt para Gemini
-            full_prompt = f"{SYSTEM_PROMPT}\n\nUsuário: {user_prompt}\n\nAssistente:"
+            full_prompt = build_gemini_prompt(user_prompt, history)
             
             headers = {
                 "Content-Type": "application/json"
@@ -313,123 +474,100 @@ def call_external_ai_api(user_prompt: str):
             
             # Adiciona a chave como parâmetro na URL para Gemini
             if "?" in api_url:
-                api_url = f"{api_url}&key={AI_API_KEY}"
+                api_url = f"{api_url}&key={api_key}"
             else:
-                api_url = f"{api_url}?key={AI_API_KEY}"
+                api_url = f"{api_url}?key={api_key}"
                 
-        elif IS_DEEPSEEK:
+        elif is_deepseek:
             # API DeepSeek (compatível com OpenAI)
-            api_url = AI_API_URL or "https://api.deepseek.com/v1/chat/completions"
+            api_url = base_url or "https://api.deepseek.com/v1/chat/completions"
             
             headers = {
                 "Content-Type": "application/json",
-                "Authorization": f"Bearer {AI_API_KEY}"
+                "Authorization": f"Bearer {api_key}"
             }
             
             payload = {
-                "model": AI_MODEL,
-                "messages": [
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": user_prompt}
-                ],
+                "model": model,
+                "messages": build_chat_messages(user_prompt, history),
                 "temperature": 0.7,
                 "max_tokens": 1000
             }
-        elif IS_GROQ:
+        elif is_groq:
             # API Groq (compatível com OpenAI)
-            api_url = AI_API_URL or "https://api.groq.com/openai/v1/chat/completions"
+            api_url = base_url or "https://api.groq.com/openai/v1/chat/completions"
             
             headers = {
                 "Content-Type": "application/json",
-                "Authorization": f"Bearer {AI_API_KEY}"
+                "Authorization": f"Bearer {api_key}"
             }
             
             payload = {
-                "model": AI_MODEL,
-                "messages": [
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": user_prompt}
-                ],
+                "model": model,
+                "messages": build_chat_messages(user_prompt, history),
                 "temperature": 0.7,
                 "max_tokens": 1000
             }
         else:
             # API OpenAI (padrão)
-            api_url = AI_API_URL or "https://api.openai.com/v1/chat/completions"
+            api_url = base_url or "https://api.openai.com/v1/chat/completions"
             
             headers = {
                 "Content-Type": "application/json",
-                "Authorization": f"Bearer {AI_API_KEY}"
+                "Authorization": f"Bearer {api_key}"
             }
             
             payload = {
-                "model": AI_MODEL,
-                "messages": [
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": user_prompt}
-                ],
+                "model": model,
+                "messages": build_chat_messages(user_prompt, history),
                 "temperature": 0.7,
                 "max_tokens": 1000
             }
         
-        # Faz a requisição HTTP com retry para rate limiting (429)
+        # Faz a requisição HTTP (rate limit 429 é reagendado pela fila de espera, sem sleep aqui)
         print(f" [+] [WORKER] Enviando requisição para API de IA...")
         
-        max_retries = 3
-        retry_delay = 2  # Começa com 2 segundos
+        response = backend.http.post(
+            api_url,
+            headers=headers,
+            json=payload,
+            timeout=http_timeout()  # (conexão, leitura)
+        )
         
-        for attempt in range(max_retries):
-            response = requests.post(
-                api_url,
-                headers=headers,
-                json=payload,
-                timeout=30  # Timeout de 30 segundos
-            )
-            
-            print(f" [+] [WORKER] Resposta recebida: Status {response.status_code} (tentativa {attempt + 1}/{max_retries})")
-            
-            # Se for 429 (rate limit), verifica se é quota 0 ou rate limit normal
-            if response.status_code == 429:
-                try:
-                    error_data = response.json()
-                    error_text = json.dumps(error_data)
-                    # Verifica se é quota 0 (limit: 0)
-                    if "limit: 0" in error_text or '"limit": 0' in error_text:
-                        error_msg = (
-                            "❌ Erro: Sua API key do Google Gemini não tem acesso ao plano gratuito ou a quota está zerada.\n\n"
-                            "🔍 O que fazer:\n"
-                            "1. Acesse https://aistudio.google.com/\n"
-                            "2. Verifique se sua API key está ativa\n"
-                            "3. Verifique o uso e quotas em: https://ai.dev/usage?tab=rate-limit\n"
-                            "4. Certifique-se de que o projeto tem acesso ao plano gratuito habilitado\n"
-                            "5. Se necessário, gere uma nova API key em um projeto diferente\n\n"
-                            "💡 Nota: Alguns modelos podem ter quota 0 no plano gratuito. Tente usar uma API key de um projeto que tenha acesso ao plano gratuito habilitado."
-                        )
-                        print(f" [!!!] {error_msg}")
-                        return error_msg
-                except:
-                    pass
-                
-                # Se for rate limit normal (não quota 0), tenta novamente
-                if attempt < max_retries - 1:
-                    wait_time = retry_delay * (2 ** attempt)  # Backoff exponencial: 2s, 4s, 8s
-                    print(f" [!!!] Rate limit atingido (429). Aguardando {wait_time}s antes de tentar novamente...")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    error_msg = "Erro: Rate limit da API de IA (muitas requisições). Por favor, aguarde alguns instantes e tente novamente."
+        print(f" [+] [WORKER] Resposta recebida: Status {response.status_code}")
+        
+        # Se for 429 (rate limit), verifica se é quota 0 ou rate limit normal
+        if response.status_code == 429:
+            try:
+                error_data = response.json()
+                error_text = json.dumps(error_data)
+                # Verifica se é quota 0 (limit: 0)
+                if "limit: 0" in error_text or '"limit": 0' in error_text:
+                    error_msg = (
+                        "❌ Erro: Sua API key do Google Gemini não tem acesso ao plano gratuito ou a quota está zerada.\n\n"
+                        "🔍 O que fazer:\n"
+                        "1. Acesse https://aistudio.google.com/\n"
+                        "2. Verifique se sua API key está ativa\n"
+                        "3. Verifique o uso e quotas em: https://ai.dev/usage?tab=rate-limit\n"
+                        "4. Certifique-se de que o projeto tem acesso ao plano gratuito habilitado\n"
+                        "5. Se necessário, gere uma nova API key em um projeto diferente\n\n"
+                        "💡 Nota: Alguns modelos podem ter quota 0 no plano gratuito. Tente usar uma API key de um projeto que tenha acesso ao plano gratuito habilitado."
+                    )
                     print(f" [!!!] {error_msg}")
-                    return error_msg
+                    raise AIProviderError(error_msg)
+            except ValueError:
+                pass
             
-            # Se não for 429, sai do loop de retry
-            break
+            # Rate limit normal (não quota 0): retentativa com atraso pela fila
+            print(f" [!!!] Rate limit atingido (429). Mensagem será reagendada.")
+            raise AIProviderError(RATE_LIMIT_MESSAGE, retryable=True)
         
         # Verifica se a requisição foi bem-sucedida
         if response.status_code == 200:
             response_data = response.json()
             
             # Extrai a resposta baseado no tipo de API
-            if IS_GEMINI:
+            if is_gemini:
                 # Formato Gemini: {"candidates": [{"content": {"parts": [{"text": "..."}]}}]}
                 if "candidates" in response_data and len(response_data["candidates"]) > 0:
                     candidate = response_data["candidates"][0]
@@ -442,19 +580,19 @@ def call_external_ai_api(user_prompt: str):
                 error_msg = "Erro: Resposta da API Gemini não contém 'candidates' válido."
                 print(f" [!!!] {error_msg}")
                 print(f" [!!!] Resposta da API: {response_data}")
-                return error_msg
+                raise AIProviderError(error_msg)
             else:
                 # Formato OpenAI/DeepSeek/Groq: {"choices": [{"message": {"content": "..."}}]}
                 if "choices" in response_data and len(response_data["choices"]) > 0:
                     bot_response = response_data["choices"][0]["message"]["content"]
-                    api_name = "Groq" if IS_GROQ else ("DeepSeek" if IS_DEEPSEEK else "OpenAI")
+                    api_name = "Groq" if is_groq else ("DeepSeek" if is_deepseek else "OpenAI")
                     print(f" [+] [WORKER] Resposta da IA ({api_name}) gerada com sucesso ({len(bot_response)} caracteres)")
                     return bot_response
                 else:
                     error_msg = "Erro: Resposta da API não contém 'choices' válido."
                     print(f" [!!!] {error_msg}")
                     print(f" [!!!] Resposta da API: {response_data}")
-                    return error_msg
+                    raise AIProviderError(error_msg)
         else:
             error_msg = f"Erro na API de IA: Status {response.status_code} - {response.text[:500]}"
             print(f" [!!!] {error_msg}")
@@ -467,22 +605,22 @@ def call_external_ai_api(user_prompt: str):
                     error_data = response.json()
                     error_text = json.dumps(error_data)
                     if "decommissioned" in error_text.lower() or "no longer supported" in error_text.lower():
-                        return (
-                            f"❌ Erro: O modelo '{AI_MODEL}' foi descontinuado e não é mais suportado.\n\n"
+                        raise AIProviderError(
+                            f"❌ Erro: O modelo '{model}' foi descontinuado e não é mais suportado.\n\n"
                             "🔍 O que fazer:\n"
                             "1. Verifique os modelos disponíveis em: https://console.groq.com/docs/models\n"
                             "2. Atualize o modelo no arquivo .env\n"
                             "3. Modelos sugeridos: llama-3.3-70b-versatile, llama-3.3-8b-instant, mixtral-8x7b-32768\n\n"
-                            f"💡 Modelo atual configurado: {AI_MODEL}"
+                            f"💡 Modelo atual configurado: {model}"
                         )
-                except:
+                except ValueError:
                     pass
             elif response.status_code == 402:
                 # Erro 402: Saldo insuficiente (DeepSeek)
                 try:
                     error_data = response.json()
                     if "Insufficient Balance" in str(error_data) or "insufficient" in str(error_data).lower():
-                        return (
+                        raise AIProviderError(
                             "❌ Erro: Saldo insuficiente na conta da API DeepSeek.\n\n"
                             "🔍 O que fazer:\n"
                             "1. Acesse https://platform.deepseek.com/\n"
@@ -491,118 +629,409 @@ def call_external_ai_api(user_prompt: str):
                             "4. Verifique se a API key está correta e ativa\n\n"
                             "💡 Nota: A API DeepSeek requer créditos na conta para funcionar."
                         )
-                except:
+                except ValueError:
                     pass
-                return "Erro: Saldo insuficiente na conta da API. Por favor, adicione créditos à sua conta."
-            elif response.status_code == 404 and IS_GEMINI:
-                return f"Erro: O modelo '{AI_MODEL}' não foi encontrado. Por favor, verifique se o modelo está correto (ex: gemini-2.0-flash, gemini-1.5-flash)."
+                raise AIProviderError("Erro: Saldo insuficiente na conta da API. Por favor, adicione créditos à sua conta.")
+            elif response.status_code == 404 and is_gemini:
+                raise AIProviderError(f"Erro: O modelo '{model}' não foi encontrado. Por favor, verifique se o modelo está correto (ex: gemini-2.0-flash, gemini-1.5-flash).")
             elif response.status_code == 429:
-                return f"Erro: Rate limit da API de IA (muitas requisições). Por favor, aguarde alguns instantes e tente novamente."
+                raise AIProviderError(RATE_LIMIT_MESSAGE, retryable=True)
             elif response.status_code == 401:
-                return f"Erro: Chave de API inválida ou expirada. Por favor, verifique a configuração da API."
+                raise AIProviderError(f"Erro: Chave de API inválida ou expirada. Por favor, verifique a configuração da API.")
             elif response.status_code == 403:
-                return f"Erro: Acesso negado à API. Verifique as permissões da sua chave de API."
+                raise AIProviderError(f"Erro: Acesso negado à API. Verifique as permissões da sua chave de API.")
             else:
-                return f"Desculpe, ocorreu um erro ao processar sua mensagem (Status {response.status_code}). Por favor, tente novamente."
+                # 5xx são falhas transitórias do provedor; demais códigos não mudam ao tentar de novo
+                raise AIProviderError(
+                    f"Desculpe, ocorreu um erro ao processar sua mensagem (Status {response.status_code}). Por favor, tente novamente.",
+                    retryable=response.status_code >= 500
+                )
             
+    except AIProviderError:
+        raise
     except requests.exceptions.Timeout:
-        error_msg = "Erro: Timeout ao chamar API de IA (mais de 30 segundos)."
+        error_msg = f"Erro: Timeout ao chamar API de IA (mais de {settings.AI_HTTP_READ_TIMEOUT:g} segundos)."
         print(f" [!!!] {error_msg}")
-        return "Desculpe, a resposta está demorando mais que o esperado. Por favor, tente novamente."
+        raise AIProviderError("Desculpe, a resposta está demorando mais que o esperado. Por favor, tente novamente.", retryable=True)
     except requests.exceptions.RequestException as e:
         error_msg = f"Erro de conexão com API de IA: {str(e)}"
         print(f" [!!!] {error_msg}")
-        return "Desculpe, não foi possível conectar ao serviço de IA. Por favor, tente novamente mais tarde."
+        raise AIProviderError("Desculpe, não foi possível conectar ao serviço de IA. Por favor, tente novamente mais tarde.", retryable=True)
     except Exception as e:
         error_msg = f"Erro inesperado ao chamar API de IA: {str(e)}"
         print(f" [!!!] {error_msg}")
         import traceback
         traceback.print_exc()
-        return "Desculpe, ocorreu um erro inesperado. Por favor, tente novamente."
+        raise AIProviderError("Desculpe, ocorreu um erro inesperado. Por favor, tente novamente.")
+
+# --- Streaming (SSE) ---
+def _iter_sse_data(response):
+    """Itera sobre os campos 'data:' de uma resposta Server-Sent Events."""
+    # SSE é sempre UTF-8; sem isso o requests pode decodificar como ISO-8859-1
+    response.encoding = "utf-8"
+    for line in response.iter_lines(decode_unicode=True):
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return
+        yield data
+
+
+def stream_external_ai_api(user_prompt: str, history: list = None, backend: ProviderBackend = None):
+    """
+    Gera a resposta da IA em pedaços, usando os endpoints de streaming dos provedores
+    (SSE compatível com OpenAI para OpenAI/DeepSeek/Groq, streamGenerateContent para Gemini).
+
+    Lança exceção se o streaming não puder ser iniciado; o chamador decide o fallback.
+    """
+    backend = backend or ai_router.backends[0]
+    is_gemini, is_deepseek, is_groq = (backend.kind == kind for kind in ("gemini", "deepseek", "groq"))
+    model, api_key, base_url = backend.model, backend.api_key, backend.api_url
+    if is_gemini:
+        model_name = model if model else "gemini-2.0-flash"
+        if model_name in ["gemini-3", "gemini-pro", "gemini-pro-1.0", "gemini-3-pro-preview", "gemini-3-pro"]:
+            model_name = "gemini-2.0-flash"
+        full_prompt = build_gemini_prompt(user_prompt, history)
+
+        if HAS_GOOGLE_GENAI:
+            client = backend.sdk_client(lambda: genai.Client(api_key=api_key))
+            for chunk in client.models.generate_content_stream(model=model_name, contents=full_prompt):
+                if chunk.text:
+                    yield chunk.text
+            return
+
+        if base_url:
+            api_url = base_url.split("?")[0].replace(":generateContent", ":streamGenerateContent")
+        else:
+            api_url = f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:streamGenerateContent"
+        params = {"alt": "sse", "key": api_key}
+        headers = {"Content-Type": "application/json"}
+        payload = {
+            "contents": [{"parts": [{"text": full_prompt}]}],
+            "generationConfig": {"temperature": 0.7, "maxOutputTokens": 1000}
+        }
+    else:
+        if is_deepseek:
+            api_url = base_url or "https://api.deepseek.com/v1/chat/completions"
+        elif is_groq:
+            api_url = base_url or "https://api.groq.com/openai/v1/chat/completions"
+        else:
+            api_url = base_url or "https://api.openai.com/v1/chat/completions"
+        params = None
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        }
+        payload = {
+            "model": model,
+            "messages": build_chat_messages(user_prompt, history),
+            "temperature": 0.7,
+            "max_tokens": 1000,
+            "stream": True
+        }
+
+    with backend.http.post(api_url, headers=headers, params=params, json=payload, stream=True, timeout=http_timeout()) as response:
+        if response.status_code != 200:
+            raise RuntimeError(f"Streaming indisponível: Status {response.status_code}")
+
+        for data in _iter_sse_data(response):
+            event = json.loads(data)
+            if is_gemini:
+                # Formato Gemini: {"candidates": [{"content": {"parts": [{"text": "..."}]}}]}
+                candidates = event.get("candidates") or [{}]
+                parts = candidates[0].get("content", {}).get("parts") or [{}]
+                text = parts[0].get("text")
+            else:
+                # Formato OpenAI/DeepSeek/Groq: {"choices": [{"delta": {"content": "..."}}]}
+                choices = event.get("choices") or [{}]
+                text = choices[0].get("delta", {}).get("content")
+            if text:
+                yield text
+
 
 # --- Lógica de Publicação de Resposta ---
-def publish_response(user_id: str, bot_response: str):
+# Publicador persistente de respostas (reaproveita conexões entre mensagens)
+response_publisher = RabbitMQPublisher(
+    topology=[(RESPONSE_EXCHANGE_NAME, RESPONSE_QUEUE_NAME, RESPONSE_QUEUE_NAME)]
+)
 
-    try:
-        connection = get_rabbitmq_connection()
-        channel = connection.channel()
+def resolve_reply_route(user_id: str, reply_node: str = None) -> str:
+    """
+    Endereça a resposta ao nó do Gateway que mantém o WebSocket: o registro
+    reflete reconexões recentes; o 'reply_to' da requisição é o fallback.
+    Sem nenhum dos dois, usa a fila compartilhada (compatibilidade).
+    """
+    node_id = connection_registry.lookup(user_id) or reply_node
+    return node_routing_key(node_id) if node_id else RESPONSE_QUEUE_NAME
 
-        # Garante que a Exchange e a Fila de RESPOSTA existam (Resiliência/OS5)
-        channel.exchange_declare(exchange=RESPONSE_EXCHANGE_NAME, exchange_type='direct', durable=True)
-        channel.queue_declare(queue=RESPONSE_QUEUE_NAME, durable=True)
-        channel.queue_bind(exchange=RESPONSE_EXCHANGE_NAME, queue=RESPONSE_QUEUE_NAME, routing_key=RESPONSE_QUEUE_NAME)
 
-        response_payload = {
+def publish_response(user_id: str, bot_response: str, reply_node: str = None):
+
+    response_payload = {
+        "user_id": user_id,
+        "bot_content": bot_response, 
+        "timestamp_processed": time.time()
+    }
+
+    routing_key = resolve_reply_route(user_id, reply_node)
+
+    published = response_publisher.publish(RESPONSE_EXCHANGE_NAME, routing_key, response_payload)
+    if published:
+        print(f" [->] Resposta enviada para: {routing_key}")
+    else:
+        print(f" [!] ERRO ao publicar resposta: {routing_key}")
+    return published
+
+
+# Pedaços intermediários não precisam sobreviver a um reinício do broker:
+# o frame final ('end') carrega a resposta completa e é persistente
+_TRANSIENT_PROPERTIES = pika.BasicProperties(delivery_mode=pika.spec.TRANSIENT_DELIVERY_MODE)
+
+def stream_response(user_id: str, user_prompt: str, reply_node: str = None, history: list = None,
+                    allow_retry: bool = False) -> str:
+    """
+    Publica a resposta em frames incrementais ('chunk', com número de sequência)
+    seguidos de um marcador de fim ('end') com o texto completo. Retorna o texto final.
+
+    Se o streaming falhar no meio, o frame 'end' sai com `truncated: true` e o texto
+    parcial seguido de um aviso; o retorno é um ErrorResponse (não entra no cache nem
+    no contexto). `allow_retry` é repassado ao fallback sem streaming.
+    """
+    stream_id = uuid.uuid4().hex
+    routing_key = resolve_reply_route(user_id, reply_node)  # resolvido uma vez por resposta
+    parts, pending = [], []
+    seq = 0
+    last_flush = time.time()
+
+    def publish_frame(frame_type: str, content: str, properties=None, **extra):
+        nonlocal seq
+        response_publisher.publish(RESPONSE_EXCHANGE_NAME, routing_key, {
             "user_id": user_id,
-            "bot_content": bot_response, 
-            "timestamp_processed": time.time()
-        }
-        
-        body = json.dumps(response_payload)
-        
-        channel.basic_publish(
-            exchange=RESPONSE_EXCHANGE_NAME,
-            routing_key=RESPONSE_QUEUE_NAME,
-            body=body,
-            properties=pika.BasicProperties(
-                delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE
-            )
-        )
-        
-        print(f" [->] Resposta enviada para fila: {RESPONSE_QUEUE_NAME}")
-        connection.close()
-        return True
+            "type": frame_type,
+            "stream_id": stream_id,
+            "seq": seq,
+            "bot_content": content,
+            "timestamp_processed": time.time(),
+            **extra
+        }, properties)
+        seq += 1
 
-    except Exception as e:
-        print(f" [!] ERRO ao publicar resposta na fila: {e}")
-        return False
+    fallback_response = None
+    truncated = False
+    cached_response = get_cached_response(user_prompt, history) if has_api_key() else None
+    if cached_response is not None:
+        # Acerto no cache: a resposta completa vai direto no frame final
+        parts = [cached_response]
+    elif is_educational_content(user_prompt) and has_api_key():
+        # Streaming no backend preferido; em falha antes do primeiro token, o fallback faz failover
+        backend = ai_router.ranked()[0]
+        try:
+            with ai_router.measure(backend):  # latência e falhas entram no ranking dos backends
+                for delta in stream_external_ai_api(user_prompt, history, backend):
+                    parts.append(delta)
+                    pending.append(delta)
+                    if time.time() - last_flush >= STREAM_FLUSH_INTERVAL or sum(map(len, pending)) >= STREAM_FLUSH_CHARS:
+                        publish_frame("chunk", "".join(pending), _TRANSIENT_PROPERTIES)
+                        pending = []
+                        last_flush = time.time()
+            store_cached_response(user_prompt, "".join(parts), history)
+        except Exception as e:
+            print(f" [!!!] Erro no streaming da IA após {len(parts)} pedaços: {e}")
+            truncated = bool(parts)
+
+    if not parts:
+        # Recusa, falta de chave ou falha antes do primeiro token: usa o caminho
+        # sem streaming (retries e mensagens de erro tratadas)
+        fallback_response = call_external_ai_api(user_prompt, history, allow_retry=allow_retry)
+        parts, pending = [fallback_response], []
+    elif pending:
+        publish_frame("chunk", "".join(pending), _TRANSIENT_PROPERTIES)
+
+    if truncated:
+        # Resposta parcial: não é gravada como resposta completa nem entra no cache/contexto
+        bot_response = ErrorResponse(f"{''.join(parts)}\n\n{STREAM_INTERRUPTED_MESSAGE}")
+        publish_frame("end", bot_response, truncated=True)
+        print(f" [->] Resposta interrompida transmitida em {seq} frames para: {routing_key}")
+        return bot_response
+
+    # Mantém o tipo ErrorResponse do fallback (o chamador não o registra no contexto)
+    bot_response = fallback_response if fallback_response is not None else "".join(parts)
+    publish_frame("end", bot_response)
+    print(f" [->] Resposta transmitida em {seq} frames para: {routing_key}")
+    return bot_response
+
+
+# --- Loop de Persistência ---
+# Um único event loop de longa duração (em thread própria) executa todo o acesso
+# assíncrono ao banco. Criar um loop por mensagem (asyncio.run) quebraria o pool
+# do asyncpg, cujas conexões ficam presas ao loop que as criou.
+_db_loop = None
+_db_loop_lock = Lock()
+
+def run_db(coro, timeout: float = 30):
+    """Executa uma corrotina de banco no loop de persistência e aguarda o resultado."""
+    global _db_loop
+    with _db_loop_lock:
+        if _db_loop is None:
+            _db_loop = asyncio.new_event_loop()
+            Thread(target=_db_loop.run_forever, name="db-loop", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _db_loop).result(timeout)
+
+# --- Contexto da Conversa ---
+# Anel de turnos recentes por sessão; aquecido do PostgreSQL (via loop de persistência) na primeira mensagem
+conversation_context = ConversationContext(
+    loader=lambda session_id, limit: run_db(load_recent_messages(session_id, limit))
+)
+
+def load_history(session_id: str, user_prompt: str) -> list:
+    """Histórico recente da sessão, sem a pergunta atual (que pode já ter sido gravada pelo Gateway)."""
+    if not settings.CONTEXT_ENABLED:
+        return []
+    history = conversation_context.get_history(session_id)
+    if history and history[-1]["role"] == "user" and history[-1]["content"] == user_prompt:
+        history = history[:-1]
+    return history
 
 # --- Lógica de Callback e Consumo ---
-def callback(ch, method, properties, body):
+def handle_message(body, retry_count: int = 0):
+    """
+    Processa uma requisição completa: IA, persistência e publicação da resposta.
+    Lança exceção em caso de falha (o chamador decide entre retentativa e DLQ).
+    Enquanto houver retentativas (`retry_count`), falhas transitórias do provedor
+    são relançadas; na última, o usuário recebe a mensagem de erro.
+    """
+    message_data = json.loads(body)
+    
+    user_id = message_data.get("user_id")
+    user_prompt = message_data.get("content")
+    
+    if not user_id or not user_prompt:
+         raise PoisonMessageError("Mensagem incompleta (sem user_id ou content)")
+    
+    allow_retry = retry_count < settings.MESSAGE_MAX_RETRIES
+
+    # 1. Processamento da IA (Etapa Lenta), com os turnos recentes da conversa
+    session_key = str(normalize_session_uuid(user_id))
+    history = load_history(session_key, user_prompt)
+    # No modo streaming os pedaços já são publicados durante a geração
+    if STREAM_RESPONSES:
+        bot_response = stream_response(user_id, user_prompt, message_data.get("reply_to"), history, allow_retry=allow_retry)
+    else:
+        bot_response = call_external_ai_api(user_prompt, history, allow_retry=allow_retry)
+    
+    if settings.CONTEXT_ENABLED and not isinstance(bot_response, ErrorResponse):
+        conversation_context.append(session_key, user_prompt, bot_response)
+    
+    # 2. Persistência da Resposta do Bot (apenas a mensagem final)
+    print(f" [DB] Salvando resposta do BOT no PostgreSQL para usuário {user_id}...")
+    
+    # Sessão autenticada no handshake do Gateway: já existe no banco, dispensa o upsert
+    run_db(message_writer.write(user_id, "BOT", bot_response, verified=bool(message_data.get("session_verified"))))
+    
+    # 3. Publicar a Resposta na Fila q.ia_response
+    if not STREAM_RESPONSES:
+        publish_response(user_id, bot_response, message_data.get("reply_to"))
+    
+    # 4. Registra métrica de throughput (mensagem processada com sucesso)
+    messages_processed_total.labels(status='success').inc()
 
+
+def settle_failure(ch, delivery_tag, body, properties, error: Exception):
+    """
+    Reagenda (fila de espera) ou envia à DLQ a mensagem que falhou e confirma a
+    original: a falha nunca volta à cabeça da fila nem ocupa o Worker esperando.
+    """
     try:
-        message_data = json.loads(body)
-        
-        user_id = message_data.get("user_id")
-        user_prompt = message_data.get("content")
-        
-        if not user_id or not user_prompt:
-             print(" [!] Mensagem incompleta recebida. Ignorando.")
-             ch.basic_ack(delivery_tag=method.delivery_tag)
-             return
+        outcome = retry_or_dead_letter(ch, body, properties, error)
+    except Exception as e:
+        # Sem conseguir republicar (ou o broker recusou a cópia), devolve à fila (comportamento anterior)
+        print(f" [!!!] Falha ao reagendar mensagem ({e}). Devolvendo à fila.")
+        ch.basic_nack(delivery_tag=delivery_tag)
+        return
+    messages_processed_total.labels(status=outcome).inc()
+    ch.basic_ack(delivery_tag=delivery_tag)
 
-        # 1. Processamento da IA (Etapa Lenta)
-        bot_response = call_external_ai_api(user_prompt)
-        
-        # 2. Persistência da Resposta do Bot
-        print(f" [DB] Salvando resposta do BOT no PostgreSQL para usuário {user_id}...")
-        
-        async def save_bot_message_async():
-             async with AsyncSessionLocal() as db_session:
-                await save_message(db_session, user_id, "BOT", bot_response)
 
-        # Executa a função assíncrona de forma síncrona
-        asyncio.run(save_bot_message_async())
-        
-        # 3. Publicar a Resposta na Fila q.ia_response
-        publish_response(user_id, bot_response)
-        
-        # 4. Registra métrica de throughput (mensagem processada com sucesso)
-        messages_processed_total.labels(status='success').inc()
+def callback(ch, method, properties, body):
+    """Modo sequencial: processa dentro do callback do pika (uma mensagem por vez)."""
+
+    try:
+        handle_message(body, get_retry_count(properties))
         
-        # 5. Confirmação (ACK)
+        # Confirmação (ACK)
         ch.basic_ack(delivery_tag=method.delivery_tag) 
 
     except Exception as e:
-        print(f" [!!!] Erro no processamento do Worker: {e}. Rejeitando mensagem.")
+        print(f" [!!!] Erro no processamento do Worker: {e}.")
         # Registra métrica de falha
         messages_processed_total.labels(status='error').inc()
-        # Rejeita a mensagem para que ela volte à fila ou vá para uma DLQ
-        ch.basic_nack(delivery_tag=method.delivery_tag) 
+        settle_failure(ch, method.delivery_tag, body, properties, e)
+
+
+# Pool de threads do modo concorrente (a chamada à IA é I/O-bound)
+_executor = None
+
+def _settle(ch, delivery_tag, body, properties, error: Exception = None):
+    """Executado na thread da conexão pika: o canal não é thread-safe."""
+    if not ch.is_open:
+        # Canal caiu: o broker reentrega a mensagem sem ACK automaticamente
+        return
+    if error is None:
+        ch.basic_ack(delivery_tag=delivery_tag)
+    else:
+        settle_failure(ch, delivery_tag, body, properties, error)
+
+def _process_in_pool(connection, ch, delivery_tag, body, properties=None):
+    inflight_requests.inc()
+    error = None
+    try:
+        handle_message(body, get_retry_count(properties))
+    except Exception as e:
+        print(f" [!!!] Erro no processamento do Worker: {e}.")
+        messages_processed_total.labels(status='error').inc()
+        error = e
+    finally:
+        inflight_requests.dec()
+
+    # ACK/retentativa são devolvidos à thread da conexão de consumo
+    try:
+        connection.add_callback_threadsafe(functools.partial(_settle, ch, delivery_tag, body, properties, error))
+    except Exception as e:
+        print(f" [!] Conexão de consumo encerrada antes do ACK (a mensagem será reentregue): {e}")
+
+# Fila local do modo concorrente: deficit round-robin por usuário, interativa antes de bulk
+scheduler = FairScheduler()
+
+def scheduling_key(body) -> tuple:
+    """(usuário, classe, custo em tokens) da requisição; mensagens ilegíveis seguem como interativas."""
+    try:
+        message_data = json.loads(body)
+        user_id = str(message_data.get("user_id") or "")
+        priority = PRIORITY_BULK if message_data.get("priority") == PRIORITY_BULK else PRIORITY_INTERACTIVE
+        return user_id, priority, estimate_tokens(str(message_data.get("content") or ""))
+    except (ValueError, AttributeError):
+        return "", PRIORITY_INTERACTIVE, 1
+
+def _run_next_scheduled():
+    """Cada tarefa do pool processa a próxima mensagem escolhida pelo escalonador (não a recém-chegada)."""
+    scheduled = scheduler.get(timeout=1)
+    if scheduled is None:
+        return
+    (connection, ch, delivery_tag, body, properties), priority, waited = scheduled
+    scheduler_wait_seconds.labels(priority=priority).observe(waited)
+    _process_in_pool(connection, ch, delivery_tag, body, properties)
+
+def concurrent_callback(connection, ch, method, properties, body):
+    """Modo concorrente: enfileira a mensagem no escalonador justo e retorna imediatamente."""
+    user_id, priority, cost = scheduling_key(body)
+    scheduler.put(user_id, (connection, ch, method.delivery_tag, body, properties), priority, cost)
+    _executor.submit(_run_next_scheduled)
 
 
 def start_consuming():
     """Conecta ao RabbitMQ e inicia o loop de consumo da fila de requisição."""
+    global _executor
     credentials = pika.PlainCredentials(RABBITMQ_USER, RABBITMQ_PASS)
     parameters = pika.ConnectionParameters(
         host=RABBITMQ_HOST,
@@ -617,13 +1046,30 @@ def start_consuming():
         channel.exchange_declare(exchange=EXCHANGE_NAME, exchange_type='direct', durable=True)
         channel.queue_declare(queue=QUEUE_NAME, durable=True)
         channel.queue_bind(exchange=EXCHANGE_NAME, queue=QUEUE_NAME, routing_key=QUEUE_NAME)
+        channel.queue_declare(queue=BULK_QUEUE_NAME, durable=True)
+        channel.queue_bind(exchange=EXCHANGE_NAME, queue=BULK_QUEUE_NAME, routing_key=BULK_QUEUE_NAME)
+        # Filas de espera (retentativa com atraso) e DLQ
+        declare_retry_topology(channel)
+        # Publisher confirms: a cópia reagendada/DLQ precisa estar no broker antes do
+        # ACK da original (senão uma queda do broker entre os dois perde a mensagem)
+        channel.confirm_delivery()
         
-        # Fair dispatch (Qualidade de Serviço - QoS)
-        channel.basic_qos(prefetch_count=1)
+        # Fair dispatch (Qualidade de Serviço - QoS): no modo sequencial o prefetch
+        # limita as requisições em andamento ao nível de concorrência; no concorrente,
+        # algumas mensagens a mais aguardam no escalonador justo (sem sair do broker sem ACK)
+        prefetch = WORKER_CONCURRENCY * WORKER_PREFETCH_FACTOR if WORKER_CONCURRENCY > 1 else WORKER_CONCURRENCY
+        channel.basic_qos(prefetch_count=prefetch)
 
-        print(f' [*] Worker IA iniciado. Aguardando mensagens na fila {QUEUE_NAME}.')
+        print(f' [*] Worker IA iniciado (concorrência: {WORKER_CONCURRENCY}). Aguardando mensagens nas filas {QUEUE_NAME} e {BULK_QUEUE_NAME}.')
         
-        channel.basic_consume(queue=QUEUE_NAME, on_message_callback=callback)
+        if WORKER_CONCURRENCY > 1:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=WORKER_CONCURRENCY, thread_name_prefix="ia-worker")
+            on_message = functools.partial(concurrent_callback, connection)
+        else:
+            on_message = callback
+        channel.basic_consume(queue=QUEUE_NAME, on_message_callback=on_message)
+        channel.basic_consume(queue=BULK_QUEUE_NAME, on_message_callback=on_message)
         channel.start_consuming()
 
     except pika.exceptions.AMQPConnectionError as e:
@@ -631,6 +1077,11 @@ def start_consuming():
         time.sleep(5)
         start_consuming() # Tenta reconectar (Resiliência)
     except KeyboardInterrupt:
+        run_db(message_writer.stop())  # grava as respostas ainda pendentes na fila
+        if semantic_cache is not None:
+            semantic_cache.flush()
+        for backend in ai_router.backends:
+            backend.close()
         print('Worker desligado.')
 
 if __name__ == '__main__':
@@ -640,11 +1091,16 @@ if __name__ == '__main__':
     print(f" [WORKER] Modelo configurado: {AI_MODEL}")
     api_type_startup = "Groq" if IS_GROQ else ("DeepSeek" if IS_DEEPSEEK else ("Gemini" if IS_GEMINI else "OpenAI"))
     print(f" [WORKER] Tipo de API: {api_type_startup}")
-    print(f" [WORKER] API Key presente: {'Sim' if AI_API_KEY else 'NÃO - ERRO!'}")
+    print(f" [WORKER] Backends de IA: {', '.join(f'{b.name} ({b.model})' for b in ai_router.backends)}"
+          f"{' com hedging' if ai_router.hedge_enabled else ''}")
+    print(f" [WORKER] API Key presente: {'Sim' if has_api_key() else 'NÃO - ERRO!'}")
     print(f" [WORKER] URL da API: {AI_API_URL or 'Usando padrão'}")
+    print(f" [WORKER] Concorrência (requisições em andamento): {WORKER_CONCURRENCY}")
+    print(f" [WORKER] Streaming de respostas: {'Sim' if STREAM_RESPONSES else 'Não'}")
+    print(f" [WORKER] Cache semântico: {'Sim (limiar ' + str(settings.SEMANTIC_CACHE_THRESHOLD) + ')' if semantic_cache is not None else 'Não'}")
     print("=" * 60)
     
-    if not AI_API_KEY:
+    if not has_api_key():
         print(" [!!!] ERRO CRÍTICO: AI_API_KEY não configurada!")
         print(" [!!!] Configure a variável AI_API_KEY no arquivo .env")
         exit(1)
@@ -5,7 +5,13 @@ import os
 import json
 import threading
 import asyncio
+from contextlib import aclosing
 from ..api.websocket import manager # Importa o ConnectionManager que gerencia as conexões WS
+from ..services.reply_dispatcher import reply_dispatcher # Entrega as respostas aos WebSockets no loop do servidor
+from ..services.async_rabbitmq_service import broker, HAS_AIO_PIKA
+from ..services.connection_registry import connection_registry
+from ..services.rabbitmq_service import NODE_QUEUE_ARGUMENTS, node_queue_name, node_routing_key
+from ..config import settings
 
 # --- Configurações (Lidas do .env) ---
 RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "rabbitmq")
@@ -14,6 +20,20 @@ RABBITMQ_PASS = os.getenv("RABBITMQ_PASS", "password")
 RESPONSE_QUEUE_NAME = 'q.ia_response'
 RESPONSE_EXCHANGE_NAME = 'x.chat_responses' # Nova Exchange para Respostas
 
+def build_ws_frame(response_data: dict) -> str:
+    """
+    Monta o frame enviado ao WebSocket. Respostas em streaming viram frames
+    incrementais ('chunk') com número de sequência e um marcador de fim ('end').
+    """
+    frame = {"sender": "BOT", "content": response_data.get("bot_content")}
+    if response_data.get("type") in ("chunk", "end"):
+        frame["type"] = response_data["type"]
+        frame["stream_id"] = response_data.get("stream_id")
+        frame["seq"] = response_data.get("seq")
+        if response_data.get("truncated"):
+            frame["truncated"] = True  # streaming interrompido: resposta parcial
+    return json.dumps(frame)
+
 def callback(ch, method, properties, body):
     """
     Função chamada quando uma resposta processada é recebida do Worker.
@@ -21,39 +41,16 @@ def callback(ch, method, properties, body):
     try:
         response_data = json.loads(body)
         user_id = response_data.get("user_id")
-        bot_content = response_data.get("bot_content")
         
-        print(f" [<-] Resposta recebida da fila para o usuário: {user_id}")
-        print(f" [<-] Conteúdo da resposta: {bot_content[:100]}...")
+        if response_data.get("type") != "chunk":
+            print(f" [<-] Resposta recebida da fila para o usuário: {user_id}")
 
-        # 1. Enviar a resposta via WebSocket
-        # Como o callback do pika é síncrono, precisamos criar um novo event loop
+        # 1. Entrega a resposta ao event loop do servidor
+        # O callback do pika roda em outra thread: a resposta é entregue à fila do
+        # despachante (que pertence ao loop principal) em vez de criar um loop por mensagem.
+        # Se a fila estiver cheia, apenas esta thread aguarda (backpressure).
         if user_id:
-            try:
-                # Cria um novo event loop para esta thread
-                # Isso é necessário porque o callback do pika roda em uma thread separada
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                
-                # Executa a função assíncrona
-                loop.run_until_complete(
-                    manager.send_personal_message(
-                        json.dumps({"sender": "BOT", "content": bot_content}), 
-                        user_id
-                    )
-                )
-                loop.close()
-                print(f" [->] Resposta enviada via WebSocket para {user_id}")
-            except Exception as ws_error:
-                print(f" [!!!] Erro ao enviar via WebSocket: {ws_error}")
-                import traceback
-                traceback.print_exc()
-                # Fecha o loop mesmo em caso de erro
-                try:
-                    if 'loop' in locals():
-                        loop.close()
-                except:
-                    pass
+            reply_dispatcher.submit_threadsafe(user_id, build_ws_frame(response_data))
 
         # 2. Confirmação (ACK)
         # Informa ao RabbitMQ que a mensagem foi entregue com sucesso.
@@ -63,7 +60,12 @@ def callback(ch, method, properties, body):
         print(f" [!!!] Erro no processamento da resposta (WS ou JSON): {e}")
         import traceback
         traceback.print_exc()
-        ch.basic_nack(delivery_tag=method.delivery_tag) # NACK para re-enfileirar, se o erro for recuperável
+        # Re-enfileira uma única vez (erro transitório); na reentrega, ou se o corpo
+        # for inválido, descarta para não prender o consumidor num laço infinito
+        requeue = not method.redelivered and not isinstance(e, (json.JSONDecodeError, UnicodeDecodeError))
+        if not requeue:
+            print(f" [!!!] Resposta descartada após falha: {body[:200]!r}")
+        ch.basic_nack(delivery_tag=method.delivery_tag, requeue=requeue)
 
 def start_response_consumer_thread():
     """Inicia a conexão e o consumo do RabbitMQ em uma thread separada."""
@@ -90,8 +92,14 @@ def start_response_consumer_thread():
             channel.queue_declare(queue=RESPONSE_QUEUE_NAME, durable=True)
             channel.queue_bind(exchange=RESPONSE_EXCHANGE_NAME, queue=RESPONSE_QUEUE_NAME, routing_key=RESPONSE_QUEUE_NAME)
             
-            print(f' [*] Consumidor de Respostas WS iniciado. Escutando: {RESPONSE_QUEUE_NAME}')
+            # Fila exclusiva deste nó do Gateway (respostas roteadas pelo Worker)
+            node_queue = node_queue_name(settings.GATEWAY_NODE_ID)
+            channel.queue_declare(queue=node_queue, durable=False, arguments=NODE_QUEUE_ARGUMENTS)
+            channel.queue_bind(exchange=RESPONSE_EXCHANGE_NAME, queue=node_queue, routing_key=node_routing_key(settings.GATEWAY_NODE_ID))
+            
+            print(f' [*] Consumidor de Respostas WS iniciado. Escutando: {node_queue}, {RESPONSE_QUEUE_NAME}')
             
+            channel.basic_consume(queue=node_queue, on_message_callback=callback)
             channel.basic_consume(queue=RESPONSE_QUEUE_NAME, on_message_callback=callback)
             channel.start_consuming()
 
@@ -115,8 +123,77 @@ def start_response_consumer_thread():
                 time.sleep(retry_delay)
 
 
+async def handle_response(response_data: dict, from_shared_queue: bool = False):
+    """Encaminha uma resposta do Worker ao despachante de WebSockets (no event loop do servidor)."""
+    user_id = response_data.get("user_id")
+
+    if response_data.get("type") != "chunk":
+        print(f" [<-] Resposta recebida da fila para o usuário: {user_id}")
+    if not user_id:
+        return
+
+    # Respostas da fila compartilhada (Workers sem roteamento por nó) podem chegar
+    # à réplica errada: encaminha ao nó que mantém o WebSocket, se houver outro
+    if from_shared_queue and user_id not in manager.active_connections:
+        node_id = await connection_registry.lookup_async(user_id)
+        if node_id and node_id != settings.GATEWAY_NODE_ID:
+            if await broker.publish(RESPONSE_EXCHANGE_NAME, node_routing_key(node_id), response_data):
+                print(f" [<-] Resposta de {user_id} encaminhada ao nó {node_id}")
+                return
+
+    await reply_dispatcher.submit(user_id, build_ws_frame(response_data))
+
+
+async def _consume_queue(queue_name: str, from_shared_queue: bool, **queue_kwargs):
+    # aclosing: ao cancelar/reiniciar o TaskGroup, o iterador é fechado na hora (e com ele o canal)
+    async with aclosing(broker.consume(queue_name, **queue_kwargs)) as messages:
+        async for message in messages:
+            try:
+                # ACK ao sair do bloco; em caso de exceção, NACK re-enfileirando apenas
+                # na primeira entrega (mensagem envenenada não circula indefinidamente)
+                async with message.process(requeue=not message.redelivered):
+                    await handle_response(json.loads(message.body), from_shared_queue)
+            except Exception as e:
+                print(f" [!!!] Erro no processamento da resposta (WS ou JSON): {e}")
+
+
+async def consume_responses(retry_delay: int = 5):
+    """
+    Consome as filas de respostas de forma nativa no event loop do FastAPI (aio-pika):
+    a fila exclusiva deste nó e a fila compartilhada (compatibilidade).
+    Reconecta automaticamente se a conexão com o RabbitMQ cair.
+    """
+    node_queue = node_queue_name(settings.GATEWAY_NODE_ID)
+    while True:
+        try:
+            await broker.connect()
+            print(f' [*] Consumidor de Respostas WS (asyncio) iniciado. Escutando: {node_queue}, {RESPONSE_QUEUE_NAME}')
+
+            async with asyncio.TaskGroup() as group:
+                group.create_task(_consume_queue(node_queue, False, durable=False, arguments=NODE_QUEUE_ARGUMENTS))
+                group.create_task(_consume_queue(RESPONSE_QUEUE_NAME, True))
+
+        except asyncio.CancelledError:
+            print(' [*] Consumidor de Respostas desligado.')
+            raise
+        except Exception as e:
+            print(f" [!!!] Erro de conexão com RabbitMQ (Consumer de Resposta): {e}. Tentando novamente em {retry_delay}s...")
+            await asyncio.sleep(retry_delay)
+
+
 def start_response_consumer():
-    """Cria e inicia a thread do consumidor para não bloquear o servidor FastAPI."""
+    """
+    Inicia o consumidor de respostas sem bloquear o servidor FastAPI.
+
+    Com aio-pika disponível, roda como task no próprio event loop; caso contrário,
+    usa a thread com o consumidor pika bloqueante.
+    """
+    if HAS_AIO_PIKA:
+        task = asyncio.get_running_loop().create_task(consume_responses())
+        print(" [API] Task do Consumidor de Resposta (asyncio) iniciada.")
+        return task
+
     consumer_thread = threading.Thread(target=start_response_consumer_thread, daemon=True)
     consumer_thread.start()
-    print(" [API] Thread do Consumidor de Resposta iniciada.")
\ No newline at end of file
+    print(" [API] Thread do Consumidor de Resposta iniciada.")
+    return None
\ No newline at end of file
@@ -2,14 +2,23 @@ from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Response # type: ig
 import json
 import time
 import uuid
+import asyncio
+from datetime import datetime, timezone
 from contextlib import asynccontextmanager
 
 # Importar Rotas e Serviços
 from .api import chat, users
 from .consumers.response_consumer import start_response_consumer
-from .services.database_service import init_db, AsyncSessionLocal, save_message
-from .services.rabbitmq_service import publish_message
-from .api.websocket import manager # Importa apenas o gerenciador de conexão (manager)
+from .services.database_service import init_db, normalize_session_uuid
+from .services.message_writer import message_writer
+from .services.rabbitmq_service import publisher
+from .services.async_rabbitmq_service import broker, publish_request
+from .api.websocket import manager, resolve_websocket_session
+from .services.reply_dispatcher import reply_dispatcher
+from .services.fair_scheduler import PriorityClassifier
+from .services.rate_limiter import rate_limiter, throttled_frame
+from .services.connection_registry import connection_registry
+from .services.redis_service import close_async_redis
 from .services.metrics_service import get_metrics, websocket_message_duration, websocket_messages_total
 from .config import settings
 from prometheus_client import CONTENT_TYPE_LATEST # type: ignore
@@ -20,15 +29,43 @@ from fastapi.middleware.cors import CORSMiddleware # type: ignore
 async def lifespan(app: FastAPI):
     # --- Evento de STARTUP ---
     await init_db()
+    message_writer.start()
     print(" [API] Serviços de Banco de Dados inicializados.")
     
-    start_response_consumer() 
+    # Abre a conexão/pool de publicação e declara a topologia uma única vez
+    try:
+        if broker is not None:
+            await broker.connect()
+            print(" [API] Transporte AMQP assíncrono (aio-pika) iniciado.")
+        else:
+            await asyncio.to_thread(publisher.start)
+            print(" [API] Publicador RabbitMQ (pool de canais) iniciado.")
+    except Exception as e:
+        print(f" [API] Aviso: RabbitMQ indisponível no startup, a conexão será refeita sob demanda: {e}")
+    
+    reply_dispatcher.start()
+    connection_registry.start()
+    print(f" [API] Nó do Gateway: {settings.GATEWAY_NODE_ID}")
+    response_consumer_task = start_response_consumer() 
     print(" [API] Consumidor de Respostas (RabbitMQ) iniciado.")
     
     print(" [API] Todos os serviços de startup concluídos.")
     yield
     # --- Evento de SHUTDOWN ---
     print(" [API] Desligamento da aplicação.")
+    if response_consumer_task is not None:
+        response_consumer_task.cancel()
+        try:
+            await response_consumer_task
+        except asyncio.CancelledError:
+            pass
+    await reply_dispatcher.stop()
+    await message_writer.stop()  # grava as mensagens ainda pendentes na fila
+    await connection_registry.stop()
+    await close_async_redis()
+    if broker is not None:
+        await broker.close()
+    publisher.close()
 
 
 app = FastAPI(
@@ -55,6 +92,9 @@ app.add_middleware(
 app.include_router(chat.router, prefix="/api/v1", tags=["Chat"])
 app.include_router(users.router, prefix="/api/v1", tags=["Users"])
 
+# Classe de prioridade por usuário (interativa até FAIR_INTERACTIVE_BURST mensagens por janela)
+priority_classifier = PriorityClassifier()
+
 # Rota de health check
 @app.get("/health")
 async def health_check():
@@ -72,46 +112,66 @@ async def websocket_endpoint(websocket: WebSocket):
     # Aceita a conexão WebSocket primeiro
     await websocket.accept()
     
-    user_id = websocket.query_params.get("id") 
-    
-    if not user_id:
-        await websocket.close(code=1008, reason="ID de usuário ausente.")
+    # Autenticação e vínculo da sessão uma única vez, no handshake
+    user_id, authenticated = await resolve_websocket_session(websocket)
+    if user_id is None:
+        await websocket.close(code=1008, reason="Token inválido ou sessão não autorizada.")
         return
+    session_uuid = normalize_session_uuid(user_id)
     
-    # Validação: aceita qualquer string não vazia como user_id
-    # (o frontend gera IDs no formato "user-xxx-timestamp")
-    if not user_id.strip():
-        await websocket.close(code=1008, reason="ID de usuário/sessão inválido.")
-        return
-        
     await manager.connect(user_id, websocket)
+    # Registra qual nó mantém o WebSocket (roteamento das respostas entre réplicas)
+    await connection_registry.register(user_id)
     
     try:
         while True:
             data = await websocket.receive_text()
             
+            # Limite de taxa (usuário e global): o excesso é recusado aqui, antes da fila e do provedor
+            if settings.RATE_LIMIT_ENABLED:
+                retry_after, scope = await rate_limiter.check(user_id)
+                if retry_after > 0:
+                    await manager.send_personal_message(json.dumps(throttled_frame(retry_after, scope)), user_id)
+                    websocket_messages_total.labels(action=f"throttled_{scope}").inc()
+                    continue
+            
             # Inicia medição de latência para mensagem WebSocket
             start_time = time.time()
+            received_at = datetime.now(timezone.utc)
             
-            # --- Persistência (Database) ---
-            async with AsyncSessionLocal() as db_session:
-                # O comando save_message deve ser importado
-                success = await save_message(db_session, user_id, "USER", data)
+            # --- Persistência (modo ordered): grava antes de publicar ---
+            if settings.INGEST_MODE == "ordered":
+                # Gravação em lote: um INSERT/commit por lote em vez de por mensagem
+                await message_writer.write(session_uuid, "USER", data, sent_at=received_at, verified=authenticated)
 
             # Formato de mensagem para a fila (JSON)
             message_data = {
                 "user_id": user_id,
                 "content": data,
-                "timestamp_sent": time.time()
+                "timestamp_sent": time.time(),
+                "reply_to": settings.GATEWAY_NODE_ID, # Nó que deve receber a resposta
+                "session_verified": authenticated, # Sessão validada no handshake (Worker não precisa criá-la)
+                # Rajadas de um mesmo usuário vão para a fila bulk e não atrasam os demais
+                "priority": priority_classifier.classify(user_id)
             }
             
-            publish_message(message_data) 
+            # Publicação awaitable no event loop (aio-pika), sem chamadas bloqueantes
+            await publish_request(message_data)
+            websocket_messages_total.labels(action=f"publish_{message_data['priority']}").inc()
             
             # 3. Envia ACK imediato
             await manager.send_personal_message(
                 json.dumps({"sender": "SYSTEM", "content": "Mensagem recebida e em processamento..."}), 
                 user_id
             )
+            websocket_message_duration.labels(action="ack").observe(time.time() - start_time)
+            
+            # --- Persistência (modo pipelined): fora do caminho do ACK ---
+            # Apenas enfileira no gravador em lote; só aguarda se a fila estiver cheia (backpressure)
+            if settings.INGEST_MODE != "ordered":
+                await message_writer.write(
+                    session_uuid, "USER", data, sent_at=received_at, wait_for_commit=False, verified=authenticated
+                )
             
             # Registra métricas de WebSocket
             duration = time.time() - start_time
@@ -120,6 +180,8 @@ async def websocket_endpoint(websocket: WebSocket):
 
     except WebSocketDisconnect:
         manager.disconnect(user_id)
+        await connection_registry.unregister(user_id)
     except Exception as e:
         print(f" [WS ERROR] Erro na comunicação WebSocket: {e}")
-        manager.disconnect(user_id)
\ No newline at end of file
+        manager.disconnect(user_id)
+        await connection_registry.unregister(user_id)
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, TIMESTAMP, ForeignKey, Text # type: ignore
+from sqlalchemy import Column, String, TIMESTAMP, ForeignKey, Text, Index # type: ignore
 from sqlalchemy.dialects.postgresql import UUID # type: ignore
 from sqlalchemy.ext.declarative import declarative_base # type: ignore
 from sqlalchemy.sql import func # type: ignore
@@ -32,6 +32,8 @@ class ChatSession(Base):
     status = Column(String(20), default='ACTIVE')
 
 class Message(Base):
+    # Em produção pode ser particionada por mês em sent_at (migrate_db.py --partition-messages);
+    # nesse caso a chave primária no banco é (id, sent_at)
     __tablename__ = 'messages'
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -39,3 +41,8 @@ class Message(Base):
     sender = Column(String(10), nullable=False) # 'USER' ou 'BOT'
     content = Column(Text, nullable=False)
     sent_at = Column(TIMESTAMP(timezone=True), default=func.now())
+
+    # Histórico por sessão em ordem cronológica (paginação por cursor em (sent_at, id))
+    __table_args__ = (
+        Index('ix_messages_session_sent_at', 'session_id', 'sent_at', 'id'),
+    )
@@ -0,0 +1,282 @@
+# backend/app/services/ai_router.py
+"""
+Roteamento entre vários provedores de IA (IA Worker).
+
+Cada backend (provedor + modelo + chave) mantém uma janela móvel das últimas
+chamadas (latência e falhas). Novas requisições vão primeiro ao backend saudável
+mais rápido (mediana de latência); falhas passam ao próximo da lista (failover).
+
+Com AI_HEDGE_ENABLED, se o primeiro backend não responder dentro do seu p95, uma
+segunda requisição é enviada ao próximo backend e vence a primeira resposta: a
+cauda de latência de um provedor lento deixa de chegar ao usuário. A chamada
+perdedora é cancelada se ainda não começou; se já estiver em andamento, seu
+resultado é descartado (threads não podem ser interrompidas).
+
+Configuração (AI_BACKENDS): "nome=modelo,nome=modelo", com a chave e a URL de
+cada backend em AI_API_KEY_<NOME> e AI_API_URL_<NOME>. Vazio mantém o backend
+único de AI_MODEL / AI_API_KEY / AI_API_URL.
+
+Cada backend mantém clientes de longa duração: uma requests.Session com pool de
+conexões keep-alive (sem handshake TCP+TLS por mensagem) e o cliente do SDK do
+provedor (ex.: genai.Client), criado uma única vez.
+"""
+
+import os
+import time
+import random
+import threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ..config import settings
+from .provider_guard import ProviderGuard, ProviderRejectedError, RetryBudget, is_overload_error, BREAKER_OPEN
+from .metrics_service import ai_router_failovers_total, ai_router_hedges_total
+
+
+def provider_kind(model: str) -> str:
+    """Tipo de API a partir do nome do modelo (mesma regra do Worker)."""
+    model = model or ""
+    if model.startswith(("llama", "mixtral", "gemma")):
+        return "groq"
+    if model.startswith("deepseek"):
+        return "deepseek"
+    if model.startswith("gemini"):
+        return "gemini"
+    return "openai"
+
+
+def create_http_session(pool_size: int = settings.AI_HTTP_POOL_SIZE) -> requests.Session:
+    """
+    Sessão HTTP compartilhada pelas threads do Worker: conexões reaproveitadas
+    (keep-alive) em vez de um handshake TCP+TLS por chamada. Sem retentativas no
+    adaptador: falhas seguem para o disjuntor e as filas de espera.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(1, pool_size), max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def http_timeout() -> tuple:
+    """(conexão, leitura) em segundos para as chamadas aos provedores."""
+    return settings.AI_HTTP_CONNECT_TIMEOUT, settings.AI_HTTP_READ_TIMEOUT
+
+
+class BackendStats:
+    """Janela das últimas `window` chamadas: latências (sucessos) e taxa de falhas."""
+
+    def __init__(self, window: int = settings.AI_ROUTER_WINDOW):
+        self._calls = deque(maxlen=max(1, window))  # (latência, ok)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._calls)
+
+    def record(self, latency: float, ok: bool):
+        with self._lock:
+            self._calls.append((latency, ok))
+
+    def percentile(self, q: float):
+        with self._lock:
+            latencies = sorted(latency for latency, ok in self._calls if ok)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    def error_rate(self) -> float:
+        with self._lock:
+            if not self._calls:
+                return 0.0
+            return sum(1 for _, ok in self._calls if not ok) / len(self._calls)
+
+
+class ProviderBackend:
+    """Um provedor configurado: modelo, credenciais, proteção (ProviderGuard) e estatísticas."""
+
+    def __init__(self, name: str, model: str, api_key: str, api_url: str = "", kind: str = None,
+                 guard: ProviderGuard = None, stats: BackendStats = None):
+        self.name = name
+        self.model = model
+        self.api_key = api_key
+        self.api_url = api_url or ""
+        self.kind = kind or provider_kind(model)
+        self.guard = guard or ProviderGuard(name)
+        self.stats = stats or BackendStats()
+        self.http = create_http_session()
+        self._sdk_client = None
+        self._sdk_lock = threading.Lock()
+
+    def sdk_client(self, factory):
+        """Cliente do SDK do provedor, criado por `factory()` na primeira chamada e reaproveitado."""
+        if self._sdk_client is None:
+            with self._sdk_lock:
+                if self._sdk_client is None:
+                    self._sdk_client = factory()
+        return self._sdk_client
+
+    def close(self):
+        self.http.close()
+
+    def __repr__(self):
+        return f"ProviderBackend({self.name!r}, {self.model!r})"
+
+
+def parse_backends(raw: str = settings.AI_BACKENDS, retry_budget: RetryBudget = None) -> list:
+    """Backends de AI_BACKENDS ("nome=modelo,..."); todos dividem o mesmo orçamento de retentativas."""
+    retry_budget = retry_budget or RetryBudget()
+    backends = []
+    for entry in raw.split(","):
+        if not entry.strip():
+            continue
+        name, _, model = entry.strip().partition("=")
+        name, model = name.strip(), model.strip()
+        if not name or not model:
+            raise ValueError(f"AI_BACKENDS inválido: '{entry}' (use nome=modelo)")
+        env_name = name.upper().replace("-", "_")
+        backends.append(ProviderBackend(
+            name, model,
+            api_key=os.getenv(f"AI_API_KEY_{env_name}", ""),
+            api_url=os.getenv(f"AI_API_URL_{env_name}", ""),
+            guard=ProviderGuard(name, retry_budget=retry_budget),
+        ))
+    return backends
+
+
+class AIRouter:
+    """Escolhe o backend por latência/saúde, faz failover e (opcional) requisições hedged."""
+
+    def __init__(self, backends: list, hedge_enabled: bool = settings.AI_HEDGE_ENABLED,
+                 hedge_quantile: float = settings.AI_HEDGE_QUANTILE, hedge_min_delay: float = settings.AI_HEDGE_MIN_DELAY,
+                 min_samples: int = settings.AI_ROUTER_MIN_SAMPLES, max_error_rate: float = settings.AI_ROUTER_MAX_ERROR_RATE,
+                 explore_ratio: float = settings.AI_ROUTER_EXPLORE, max_workers: int = 8):
+        if not backends:
+            raise ValueError("AIRouter precisa de pelo menos um backend")
+        self.backends = list(backends)
+        self.hedge_enabled = hedge_enabled and len(self.backends) > 1
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.explore_ratio = explore_ratio
+        self._max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _healthy(self, backend: ProviderBackend) -> bool:
+        if backend.guard.breaker.state == BREAKER_OPEN:
+            return False
+        return len(backend.stats) < self.min_samples or backend.stats.error_rate() <= self.max_error_rate
+
+    def ranked(self) -> list:
+        """Backends em ordem de preferência: saudáveis pela mediana de latência, depois os demais."""
+        def latency(backend):
+            # Sem amostras suficientes o backend vai à frente, para ser medido
+            if len(backend.stats) < self.min_samples:
+                return 0.0
+            return backend.stats.percentile(0.5) or 0.0
+
+        healthy = sorted((b for b in self.backends if self._healthy(b)), key=latency)
+        unhealthy = sorted((b for b in self.backends if not self._healthy(b)), key=lambda b: b.stats.error_rate())
+        # Exploração: de vez em quando um backend mais lento é medido de novo (a latência muda com o tempo)
+        if len(healthy) > 1 and random.random() < self.explore_ratio:
+            healthy.insert(0, healthy.pop(random.randrange(1, len(healthy))))
+        return healthy + unhealthy
+
+    def hedge_delay(self, backend: ProviderBackend):
+        """Espera antes da requisição hedged: o p95 do backend (None sem amostras suficientes)."""
+        if len(backend.stats) < self.min_samples:
+            return None
+        p95 = backend.stats.percentile(self.hedge_quantile)
+        return None if p95 is None else max(self.hedge_min_delay, p95)
+
+    def allow_retry(self) -> bool:
+        """Orçamento de retentativas (compartilhado entre os backends)."""
+        return self.backends[0].guard.allow_retry()
+
+    @contextmanager
+    def measure(self, backend: ProviderBackend):
+        """
+        Envolve uma chamada ao backend: proteção (ProviderGuard) e amostra de latência/falha
+        para o ranking. Usado pelo `call` e por chamadas diretas (ex.: streaming no Worker).
+        """
+        started = time.monotonic()
+        try:
+            with backend.guard.call():
+                yield
+        except ProviderRejectedError:
+            raise  # a chamada não foi feita: não entra nas estatísticas
+        except Exception:
+            backend.stats.record(time.monotonic() - started, ok=False)
+            raise
+        backend.stats.record(time.monotonic() - started, ok=True)
+
+    def _attempt(self, fn, backend: ProviderBackend):
+        with self.measure(backend):
+            return fn(backend)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="ai-hedge")
+            return self._executor
+
+    @staticmethod
+    def _final_error(errors: list):
+        # Uma falha transitória tem prioridade: a mensagem ainda pode ser reagendada
+        return next((e for e in errors if is_overload_error(e)), errors[-1])
+
+    def call(self, fn):
+        """Executa `fn(backend)` no melhor backend, com failover e (se habilitado) hedging."""
+        order = self.ranked()
+        if not self.hedge_enabled:
+            errors = []
+            for index, backend in enumerate(order):
+                if index:
+                    ai_router_failovers_total.labels(backend=backend.name).inc()
+                try:
+                    return self._attempt(fn, backend)
+                except Exception as e:
+                    print(f" [ROUTER] Falha em {backend.name}: {e}")
+                    errors.append(e)
+            raise self._final_error(errors)
+        return self._call_hedged(fn, order)
+
+    def _call_hedged(self, fn, order: list):
+        executor = self._get_executor()
+        pending, errors = {}, []
+        next_index, hedged = 0, False
+
+        def launch():
+            nonlocal next_index
+            backend = order[next_index]
+            next_index += 1
+            pending[executor.submit(self._attempt, fn, backend)] = backend
+
+        launch()
+        while pending:
+            delay = None if hedged or next_index >= len(order) else self.hedge_delay(next(iter(pending.values())))
+            done, _ = wait(pending, timeout=delay, return_when=FIRST_COMPLETED)
+            if not done:
+                # O primeiro passou do seu p95: dispara a segunda requisição
+                hedged = True
+                ai_router_hedges_total.labels(backend=order[next_index].name).inc()
+                launch()
+                continue
+            for future in done:
+                backend = pending.pop(future)
+                error = future.exception()
+                if error is None:
+                    for loser in pending:
+                        loser.cancel()
+                    return future.result()
+                print(f" [ROUTER] Falha em {backend.name}: {error}")
+                errors.append(error)
+            if not pending and next_index < len(order):
+                ai_router_failovers_total.labels(backend=order[next_index].name).inc()
+                launch()
+        raise self._final_error(errors)
@@ -0,0 +1,142 @@
+# backend/app/services/async_rabbitmq_service.py
+
+import json
+import asyncio
+from typing import AsyncIterator
+
+from ..config import settings
+from .rabbitmq_service import (
+    EXCHANGE_NAME,
+    QUEUE_NAME,
+    BULK_QUEUE_NAME,
+    RESPONSE_EXCHANGE_NAME,
+    RESPONSE_QUEUE_NAME,
+    NODE_QUEUE_ARGUMENTS,
+    node_queue_name,
+    node_routing_key,
+    publish_message_async,
+    request_routing_key,
+)
+
+# Tenta importar o cliente AMQP assíncrono (aio-pika)
+try:
+    import aio_pika # type: ignore
+    from aio_pika.pool import Pool # type: ignore
+    HAS_AIO_PIKA = True
+except ImportError as e:
+    HAS_AIO_PIKA = False
+    print(f" [INFO] Biblioteca 'aio-pika' não encontrada. Usando publicador pika em executor. Erro: {e}")
+
+
+def get_amqp_url() -> str:
+    """Monta a URL AMQP a partir das configurações (RABBITMQ_URL tem prioridade)"""
+    if settings.RABBITMQ_URL:
+        return settings.RABBITMQ_URL
+    return (
+        f"amqp://{settings.RABBITMQ_USER}:{settings.RABBITMQ_PASS}"
+        f"@{settings.RABBITMQ_HOST}:{settings.RABBITMQ_PORT}/"
+    )
+
+
+class AsyncRabbitMQ:
+    """
+    Camada de mensageria nativa asyncio (aio-pika) do API Gateway.
+
+    Roda no mesmo event loop do FastAPI: a publicação é awaitable e o consumo
+    é um iterador assíncrono, sem threads nem chamadas bloqueantes no caminho
+    das mensagens. A conexão é "robusta" (reconecta e restaura a topologia).
+    """
+
+    def __init__(self, channel_pool_size: int = settings.RABBITMQ_CHANNEL_POOL_SIZE):
+        self.channel_pool_size = channel_pool_size
+        self._connection = None
+        self._channel_pool = None
+        self._connect_lock = asyncio.Lock()
+
+    @property
+    def is_connected(self) -> bool:
+        return self._connection is not None and not self._connection.is_closed
+
+    async def _new_channel(self):
+        return await self._connection.channel()
+
+    async def connect(self):
+        """Abre a conexão, o pool de canais e declara a topologia uma única vez."""
+        async with self._connect_lock:
+            if self.is_connected:
+                return
+            self._connection = await aio_pika.connect_robust(get_amqp_url())
+            self._channel_pool = Pool(self._new_channel, max_size=self.channel_pool_size)
+            await self.declare_topology()
+            print(" [AMQP] Conexão assíncrona com RabbitMQ estabelecida.")
+
+    async def declare_topology(self):
+        async with self._channel_pool.acquire() as channel:
+            for exchange_name, queue_name in (
+                (EXCHANGE_NAME, QUEUE_NAME),
+                (EXCHANGE_NAME, BULK_QUEUE_NAME),
+                (RESPONSE_EXCHANGE_NAME, RESPONSE_QUEUE_NAME),
+            ):
+                # durable=True para Resiliência (OS5), igual ao publicador síncrono
+                exchange = await channel.declare_exchange(exchange_name, aio_pika.ExchangeType.DIRECT, durable=True)
+                queue = await channel.declare_queue(queue_name, durable=True)
+                await queue.bind(exchange, routing_key=queue_name)
+
+            # Fila de respostas exclusiva deste nó (roteamento por nó do Gateway)
+            node_queue = await channel.declare_queue(
+                node_queue_name(settings.GATEWAY_NODE_ID), durable=False, arguments=NODE_QUEUE_ARGUMENTS
+            )
+            await node_queue.bind(RESPONSE_EXCHANGE_NAME, routing_key=node_routing_key(settings.GATEWAY_NODE_ID))
+
+    async def publish(self, exchange_name: str, routing_key: str, message_data: dict, headers: dict = None) -> bool:
+        """Publica uma mensagem JSON persistente usando um canal do pool."""
+        try:
+            async with self._channel_pool.acquire() as channel:
+                exchange = await channel.get_exchange(exchange_name, ensure=False)
+                await exchange.publish(
+                    aio_pika.Message(
+                        body=json.dumps(message_data).encode(),
+                        content_type="application/json",
+                        delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                        headers=headers or {},
+                    ),
+                    routing_key=routing_key,
+                )
+            return True
+        except Exception as e:
+            print(f" [!] ERRO ao publicar mensagem (aio-pika): {e}")
+            return False
+
+    async def consume(self, queue_name: str, prefetch_count: int = settings.RABBITMQ_CONSUMER_PREFETCH,
+                      durable: bool = True, arguments: dict = None) -> AsyncIterator:
+        """Itera assincronamente sobre as mensagens de uma fila (ack fica a cargo do chamador)."""
+        channel = await self._connection.channel()
+        try:
+            await channel.set_qos(prefetch_count=prefetch_count)
+            queue = await channel.declare_queue(queue_name, durable=durable, arguments=arguments)
+            async with queue.iterator() as queue_iter:
+                async for message in queue_iter:
+                    yield message
+        finally:
+            # Consumidor reiniciado/cancelado: fecha o canal (senão cada reinício vaza um canal na conexão)
+            if not channel.is_closed:
+                await channel.close()
+
+    async def close(self):
+        if self._channel_pool is not None:
+            await self._channel_pool.close()
+            self._channel_pool = None
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+
+
+broker = AsyncRabbitMQ() if HAS_AIO_PIKA else None
+
+
+async def publish_request(message_data: dict) -> bool:
+    """Publica uma requisição para os Workers pelo transporte disponível."""
+    if broker is not None and broker.is_connected:
+        return await broker.publish(EXCHANGE_NAME, request_routing_key(message_data), message_data)
+    # Fallback: publicador pika com pool de canais, executado fora do event loop
+    return await publish_message_async(message_data)
@@ -1,9 +1,16 @@
 import os
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt # type: ignore
 import bcrypt # type: ignore
 from dotenv import load_dotenv
+from .metrics_service import password_hash_queue_seconds, password_hash_duration_seconds
 
 load_dotenv()
 
@@ -12,6 +19,19 @@ SECRET_KEY = os.getenv("SECRET_KEY", "sua-chave-secreta-super-segura-aqui-mude-e
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 horas
 
+# Hash de senha (bcrypt) fora do event loop: o bcrypt libera o GIL, então um pool
+# de threads pequeno basta; o tamanho do pool é o limite de hashes simultâneos
+PASSWORD_HASH_WORKERS = max(1, int(os.getenv("PASSWORD_HASH_WORKERS", "2")))
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
+# Cache de principais autenticados (token -> usuário) para pular o banco nos endpoints autenticados
+PRINCIPAL_CACHE_TTL = int(os.getenv("PRINCIPAL_CACHE_TTL", "30"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+
+# Hash sentinela dos usuários temporários: não é um hash bcrypt válido, então
+# verify_password sempre retorna False (essas contas não fazem login por senha)
+PLACEHOLDER_PASSWORD_HASH = "!temporary-user-no-password"
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifica se a senha plain corresponde ao hash"""
     try:
@@ -35,6 +55,28 @@ def get_password_hash(password: str) -> str:
     hashed = bcrypt.hashpw(password_bytes, salt)
     return hashed.decode('utf-8')
 
+async def _run_in_hash_pool(operation: str, func, *args):
+    """Executa uma operação de bcrypt no pool dedicado, medindo a espera na fila."""
+    submitted_at = time.perf_counter()
+
+    def timed():
+        started_at = time.perf_counter()
+        password_hash_queue_seconds.labels(operation=operation).observe(started_at - submitted_at)
+        try:
+            return func(*args)
+        finally:
+            password_hash_duration_seconds.labels(operation=operation).observe(time.perf_counter() - started_at)
+
+    return await asyncio.get_running_loop().run_in_executor(_hash_executor, timed)
+
+async def get_password_hash_async(password: str) -> str:
+    """Versão não bloqueante de get_password_hash (para uso em endpoints async)"""
+    return await _run_in_hash_pool("hash", get_password_hash, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Versão não bloqueante de verify_password (para uso em endpoints async)"""
+    return await _run_in_hash_pool("verify", verify_password, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Cria token JWT"""
     to_encode = data.copy()
@@ -54,3 +96,70 @@ def decode_access_token(token: str) -> Optional[dict]:
     except JWTError:
         return None
 
+
+
+class PrincipalCache:
+    """
+    Cache de curta duração dos usuários já verificados, indexado pelo token.
+
+    O JWT é validado (assinatura e expiração) a cada requisição; o cache só evita
+    a consulta ao banco. Atualização/desativação do usuário invalida todas as
+    entradas dele neste processo; nas demais réplicas o TTL curto limita a defasagem.
+    """
+
+    def __init__(self, ttl: int = PRINCIPAL_CACHE_TTL, max_entries: int = PRINCIPAL_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # sha256(token) -> (expira_em, user_id, usuário)
+        self._by_user = {}             # user_id -> chaves dos tokens desse usuário
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> str:
+        # Não mantém o token em claro na memória
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def _drop(self, key: str):
+        _, user_id, _ = self._entries.pop(key)
+        keys = self._by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[user_id]
+
+    def get(self, token: str):
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def set(self, token: str, user):
+        if self.ttl <= 0:
+            return
+        key = self._key(token)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, user.id, user)
+            self._by_user.setdefault(user.id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in list(self._by_user.get(user_id, ())):
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+
+principal_cache = PrincipalCache()
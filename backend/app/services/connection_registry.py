@@ -0,0 +1,112 @@
+# backend/app/services/connection_registry.py
+
+import asyncio
+
+from ..config import settings
+from .redis_service import get_async_redis, get_sync_redis
+
+REGISTRY_KEY_PREFIX = "ws:node:"
+
+# Remove a chave apenas se ela ainda apontar para este nó (o usuário pode ter
+# reconectado em outra réplica antes do desconectar ser processado aqui)
+_UNREGISTER_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _registry_key(user_id: str) -> str:
+    return f"{REGISTRY_KEY_PREFIX}{user_id}"
+
+
+class ConnectionRegistry:
+    """
+    Registro distribuído (Redis) de qual nó do API Gateway mantém o WebSocket
+    de cada usuário. O Gateway registra/remove as conexões locais e renova o
+    TTL periodicamente; o Worker consulta o registro para endereçar a resposta
+    à réplica correta.
+    """
+
+    def __init__(self, node_id: str = settings.GATEWAY_NODE_ID, ttl: int = settings.CONNECTION_REGISTRY_TTL):
+        self.node_id = node_id
+        self.ttl = ttl
+        self._local_users = set()
+        self._refresh_task = None
+        self._available = True
+
+    def _report(self, ok: bool, error: Exception = None):
+        # Loga apenas mudanças de estado para não poluir o log a cada mensagem
+        if ok and not self._available:
+            print(" [REGISTRY] Redis disponível novamente.")
+        elif not ok and self._available:
+            print(f" [REGISTRY] Aviso: Redis indisponível, roteamento por nó degradado: {error}")
+        self._available = ok
+
+    async def register(self, user_id: str):
+        self._local_users.add(user_id)
+        try:
+            await get_async_redis().set(_registry_key(user_id), self.node_id, ex=self.ttl)
+            self._report(True)
+        except Exception as e:
+            self._report(False, e)
+
+    async def unregister(self, user_id: str):
+        self._local_users.discard(user_id)
+        try:
+            await get_async_redis().eval(_UNREGISTER_SCRIPT, 1, _registry_key(user_id), self.node_id)
+            self._report(True)
+        except Exception as e:
+            self._report(False, e)
+
+    async def lookup_async(self, user_id: str):
+        try:
+            node_id = await get_async_redis().get(_registry_key(user_id))
+            self._report(True)
+            return node_id
+        except Exception as e:
+            self._report(False, e)
+            return None
+
+    def lookup(self, user_id: str):
+        """Consulta síncrona (IA Worker): retorna o nó que mantém o WebSocket, ou None"""
+        try:
+            node_id = get_sync_redis().get(_registry_key(user_id))
+            self._report(True)
+            return node_id
+        except Exception as e:
+            self._report(False, e)
+            return None
+
+    async def _refresh_loop(self):
+        # Renova o TTL de todas as conexões locais em lote (pipeline), sem custo por mensagem
+        while True:
+            await asyncio.sleep(self.ttl / 2)
+            if not self._local_users:
+                continue
+            try:
+                pipe = get_async_redis().pipeline(transaction=False)
+                for user_id in list(self._local_users):
+                    pipe.set(_registry_key(user_id), self.node_id, ex=self.ttl)
+                await pipe.execute()
+                self._report(True)
+            except Exception as e:
+                self._report(False, e)
+
+    def start(self):
+        self._refresh_task = asyncio.get_running_loop().create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+        for user_id in list(self._local_users):
+            await self.unregister(user_id)
+
+
+connection_registry = ConnectionRegistry()
@@ -0,0 +1,144 @@
+# backend/app/services/context_store.py
+
+import json
+import hashlib
+import threading
+from collections import OrderedDict, deque
+
+from ..config import settings
+from .redis_service import get_sync_redis
+
+CONTEXT_KEY_PREFIX = "ctx:"
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa barata de tokens (~4 caracteres por token em português/inglês)."""
+    return len(text) // 4 + 1
+
+
+def trim_to_budget(history: list, token_budget: int) -> list:
+    """Mantém os turnos mais recentes que cabem no orçamento de tokens (ordem preservada)."""
+    kept, used = [], 0
+    for turn in reversed(history):
+        used += estimate_tokens(turn["content"])
+        if used > token_budget:
+            break
+        kept.append(turn)
+    kept.reverse()
+    # Não começa o contexto com uma resposta órfã do assistente
+    while kept and kept[0]["role"] != "user":
+        kept.pop(0)
+    return kept
+
+
+def context_fingerprint(history: list) -> str:
+    """Hash do histórico usado como parte da chave do cache de respostas."""
+    if not history:
+        return ""
+    raw = json.dumps(history, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class ConversationContext:
+    """
+    Janela de contexto por sessão: anel limitado dos turnos recentes
+    (usuário/assistente), no Redis (compartilhado entre Workers, com TTL)
+    ou, se o Redis estiver indisponível, em memória do processo (LRU).
+
+    Na primeira consulta de uma sessão o anel é aquecido a partir do PostgreSQL
+    pelo `loader` (uma única consulta limitada a `max_turns`); depois disso cada
+    mensagem custa apenas um LRANGE e um RPUSH, sem varrer o histórico no banco.
+    """
+
+    def __init__(self, loader=None, max_turns: int = settings.CONTEXT_MAX_TURNS,
+                 token_budget: int = settings.CONTEXT_TOKEN_BUDGET, ttl: int = settings.CONTEXT_TTL,
+                 local_sessions: int = settings.CONTEXT_LOCAL_SESSIONS, use_redis: bool = True):
+        self.loader = loader  # loader(session_id, limite) -> [{"role", "content"}, ...] (mais antigo primeiro)
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.ttl = ttl
+        self.local_sessions = local_sessions
+        self.use_redis = use_redis
+        self._local = OrderedDict()  # session_id -> deque(maxlen=max_turns)
+        self._lock = threading.Lock()
+        self._redis_available = True
+
+    def _report_redis(self, ok: bool, error: Exception = None):
+        if ok and not self._redis_available:
+            print(" [CONTEXT] Redis disponível novamente.")
+        elif not ok and self._redis_available:
+            print(f" [CONTEXT] Aviso: Redis indisponível, contexto mantido apenas em memória: {error}")
+        self._redis_available = ok
+
+    # --- Armazenamento ---
+    def _read(self, session_id: str):
+        """Retorna a lista de turnos, ou None se a sessão não estiver no armazenamento."""
+        if self.use_redis:
+            try:
+                key = CONTEXT_KEY_PREFIX + session_id
+                pipe = get_sync_redis().pipeline(transaction=False)
+                pipe.exists(key)
+                pipe.lrange(key, 0, -1)
+                exists, items = pipe.execute()
+                self._report_redis(True)
+                return [json.loads(item) for item in items] if exists else None
+            except Exception as e:
+                self._report_redis(False, e)
+        with self._lock:
+            turns = self._local.get(session_id)
+            if turns is None:
+                return None
+            self._local.move_to_end(session_id)
+            return list(turns)
+
+    def _write(self, session_id: str, turns: list):
+        if self.use_redis:
+            try:
+                key = CONTEXT_KEY_PREFIX + session_id
+                pipe = get_sync_redis().pipeline(transaction=False)
+                if turns:
+                    pipe.rpush(key, *[json.dumps(turn, ensure_ascii=False) for turn in turns])
+                else:
+                    # Sessão sem histórico: marcador vazio evita aquecer de novo a cada mensagem
+                    pipe.rpush(key, json.dumps({"role": "marker", "content": ""}))
+                pipe.ltrim(key, -self.max_turns, -1)
+                pipe.expire(key, self.ttl)
+                pipe.execute()
+                self._report_redis(True)
+                return
+            except Exception as e:
+                self._report_redis(False, e)
+        with self._lock:
+            local = self._local.get(session_id)
+            if local is None:
+                local = self._local[session_id] = deque(maxlen=self.max_turns)
+            local.extend(turns)
+            self._local.move_to_end(session_id)
+            while len(self._local) > self.local_sessions:
+                self._local.popitem(last=False)
+
+    # --- API ---
+    def get_history(self, session_id: str) -> list:
+        """Turnos recentes da sessão, já recortados pelo orçamento de tokens."""
+        turns = self._read(session_id)
+        if turns is None:
+            turns = []
+            if self.loader is not None:
+                try:
+                    turns = self.loader(session_id, self.max_turns)
+                except Exception as e:
+                    print(f" [CONTEXT] Aviso: falha ao aquecer o contexto do PostgreSQL: {e}")
+            self._write(session_id, turns)
+        turns = [turn for turn in turns if turn.get("role") in ("user", "assistant")]
+        return trim_to_budget(turns, self.token_budget)
+
+    def append(self, session_id: str, user_prompt: str, bot_response: str):
+        """Registra um turno completo (pergunta e resposta) no anel da sessão."""
+        self._write(session_id, [
+            {"role": "user", "content": user_prompt},
+            {"role": "assistant", "content": bot_response},
+        ])
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
@@ -1,27 +1,62 @@
 # backend/app/services/database_service.py
 
-import os
-from dotenv import load_dotenv
+import time
+import threading
+from collections import OrderedDict
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession # type: ignore
 from sqlalchemy.orm import sessionmaker # type: ignore
+from sqlalchemy.engine import URL, make_url # type: ignore
 from ..models.models import Base, User, ChatSession, Message
 import uuid
+from sqlalchemy import select, func, text # type: ignore
 from sqlalchemy.exc import IntegrityError # type: ignore
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert # type: ignore
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert # type: ignore
+from ..config import settings
+from .auth_service import PLACEHOLDER_PASSWORD_HASH
+from .db_pool import InstrumentedPool
 
-# Carrega variáveis de ambiente do arquivo .env
-load_dotenv()
 
-# Lendo configurações do .env
-POSTGRES_USER = os.getenv("POSTGRES_USER")
-POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD")
-POSTGRES_HOST = os.getenv("POSTGRES_HOST")
-POSTGRES_DB = os.getenv("POSTGRES_DB")
+def get_database_url() -> str:
+    """URL assíncrona do banco: DATABASE_URL (Railway, Render) ou as variáveis POSTGRES_*"""
+    if settings.DATABASE_URL:
+        url = make_url(settings.DATABASE_URL)
+        if url.drivername in ("postgres", "postgresql"):
+            url = url.set(drivername="postgresql+asyncpg")
+    else:
+        url = URL.create(
+            "postgresql+asyncpg",
+            username=settings.POSTGRES_USER,
+            password=settings.POSTGRES_PASSWORD,
+            host=settings.POSTGRES_HOST,
+            port=settings.POSTGRES_PORT,
+            database=settings.POSTGRES_DB,
+        )
+    if url.drivername == "postgresql+asyncpg":
+        url = url.update_query_dict({"prepared_statement_cache_size": str(settings.DB_PREPARED_STATEMENT_CACHE_SIZE)})
+    return url.render_as_string(hide_password=False)
+
+
+def create_engine_from_settings(database_url: str):
+    """Engine assíncrono com o pool dimensionado pelas configurações e instrumentado."""
+    return create_async_engine(
+        database_url,
+        echo=False,
+        poolclass=InstrumentedPool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        query_cache_size=settings.DB_QUERY_CACHE_SIZE,
+    )
+
 
 # URL de Conexão (usando driver assíncrono: asyncpg)
-DATABASE_URL = f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:5432/{POSTGRES_DB}"
+DATABASE_URL = get_database_url()
 
 # Configuração do Engine
-engine = create_async_engine(DATABASE_URL, echo=False)
+engine = create_engine_from_settings(DATABASE_URL)
 
 # Criador de Sessão (Usado para obter uma nova sessão de DB)
 AsyncSessionLocal = sessionmaker(
@@ -42,60 +77,182 @@ async def get_db_session() -> AsyncSession:
     async with AsyncSessionLocal() as session:
         yield session
 
-def normalize_session_uuid(session_id: str) -> uuid.UUID:
+def normalize_session_uuid(session_id) -> uuid.UUID:
 
+    if isinstance(session_id, uuid.UUID):
+        return session_id  # já resolvido no handshake do WebSocket
     try:
         return uuid.UUID(session_id)
     except ValueError:
         return uuid.uuid5(uuid.NAMESPACE_DNS, session_id)
 
 
-async def ensure_user_and_session(session: AsyncSession, session_uuid: uuid.UUID):
-
-    user = await session.get(User, session_uuid)
-    if not user:
-        # Cria usuário mínimo para compatibilidade (não recomendado para produção)
-        # Em produção, o usuário deve ser criado via registro/login
-        email = f"user_{str(session_uuid)[:8]}@temp.local"
-        username = f"user_{str(session_uuid)[:8]}"
-        from .auth_service import get_password_hash
-        session.add(User(
-            id=session_uuid,
-            nome="Usuário",
-            sobrenome="Temporário",
-            email=email,
-            senha_hash=get_password_hash("temp123"),
-            username=username,
-            is_active="ACTIVE"
-        ))
-        await session.flush()  # garante que o usuário existe antes da sessão
-
-    chat_session = await session.get(ChatSession, session_uuid)
-    if not chat_session:
-        session.add(ChatSession(id=session_uuid, user_id=session_uuid, status="ACTIVE"))
-        await session.flush()
-
-
-async def save_message(session: AsyncSession, session_id: str, sender: str, content: str):
+class KnownSessionsCache:
+    """
+    Cache limitado (LRU com TTL) dos session_ids cujo usuário e sessão de chat já
+    existem no banco. Usado pelo Gateway e pelo Worker através do save_message:
+    um acerto dispensa as consultas de existência antes do INSERT da mensagem.
+    Só é preenchido após o commit, para nunca apontar para linhas que não existem.
+    """
+
+    def __init__(self, max_entries: int = settings.KNOWN_SESSIONS_CACHE_SIZE, ttl: int = settings.KNOWN_SESSIONS_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # session_uuid -> expira_em
+        self._lock = threading.Lock()
+
+    def __contains__(self, session_uuid: uuid.UUID) -> bool:
+        with self._lock:
+            expires_at = self._entries.get(session_uuid)
+            if expires_at is None:
+                return False
+            if expires_at < time.monotonic():
+                del self._entries[session_uuid]
+                return False
+            self._entries.move_to_end(session_uuid)
+            return True
+
+    def add(self, *session_uuids: uuid.UUID):
+        with self._lock:
+            expires_at = time.monotonic() + self.ttl
+            for session_uuid in session_uuids:
+                self._entries[session_uuid] = expires_at
+                self._entries.move_to_end(session_uuid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *session_uuids: uuid.UUID):
+        with self._lock:
+            for session_uuid in session_uuids:
+                self._entries.pop(session_uuid, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+known_sessions = KnownSessionsCache()
+
+
+def _temporary_user_row(session_uuid: uuid.UUID) -> dict:
+    # Usuário mínimo para compatibilidade (não recomendado para produção)
+    # Em produção, o usuário deve ser criado via registro/login
+    return {
+        "id": session_uuid,
+        "nome": "Usuário",
+        "sobrenome": "Temporário",
+        "email": f"user_{str(session_uuid)[:8]}@temp.local",
+        "senha_hash": PLACEHOLDER_PASSWORD_HASH,  # sentinela: sem bcrypt por usuário temporário
+        "username": f"user_{str(session_uuid)[:8]}",
+        "is_active": "ACTIVE",
+    }
+
+
+def _insert_ignore(session: AsyncSession, model):
+    """INSERT ... ON CONFLICT DO NOTHING no dialeto da conexão (PostgreSQL ou SQLite)."""
+    dialect = session.get_bind().dialect.name
+    insert = sqlite_insert if dialect == "sqlite" else postgresql_insert
+    return insert(model).on_conflict_do_nothing()
+
+
+async def ensure_users_and_sessions(session: AsyncSession, session_uuids) -> list:
+    """
+    Garante usuário e sessão de chat para cada session_id não verificado: ids já
+    conhecidos são ignorados e os demais vão num upsert (ON CONFLICT DO NOTHING).
+
+    Sessões autenticadas no handshake do WebSocket não passam por aqui (o chamador
+    as marca como verificadas). Ainda assim, um id que já é de uma sessão de chat
+    nunca recebe usuário temporário: uma única consulta por lote, só em falta no cache.
+
+    Retorna os ids resolvidos; o chamador os registra em `known_sessions` depois do commit.
+    """
+    missing = [session_uuid for session_uuid in dict.fromkeys(session_uuids) if session_uuid not in known_sessions]
+    if not missing:
+        return []
+
+    result = await session.execute(select(ChatSession.id).where(ChatSession.id.in_(missing)))
+    existing = set(result.scalars().all())
+    new = [session_uuid for session_uuid in missing if session_uuid not in existing]
+    if new:
+        await session.execute(_insert_ignore(session, User), [_temporary_user_row(session_uuid) for session_uuid in new])
+        await session.execute(
+            _insert_ignore(session, ChatSession),
+            [{"id": session_uuid, "user_id": session_uuid, "status": "ACTIVE"} for session_uuid in new]
+        )
+    return missing
+
+
+async def ensure_user_and_session(session: AsyncSession, session_uuid: uuid.UUID) -> list:
+    return await ensure_users_and_sessions(session, [session_uuid])
+
+
+async def save_message(session: AsyncSession, session_id: str, sender: str, content: str, sent_at=None,
+                       verified: bool = False):
     try:
         session_uuid = normalize_session_uuid(session_id)
 
-        # garante usuário e sessão antes de inserir a mensagem
-        await ensure_user_and_session(session, session_uuid)
+        # garante usuário e sessão antes de inserir a mensagem; sessões verificadas no
+        # handshake (verified=True) já existem e dispensam o upsert
+        upserted = [] if verified else await ensure_user_and_session(session, session_uuid)
 
         new_message = Message(
             session_id=session_uuid,
             sender=sender,
             content=content
         )
+        if sent_at is not None:
+            new_message.sent_at = sent_at  # gravação adiada: preserva o horário de chegada
         session.add(new_message)
         await session.commit()
+        known_sessions.add(*upserted)
         return True
     except IntegrityError:
         await session.rollback()
+        # O cache pode estar desatualizado (ex.: sessão removida): a próxima gravação refaz o upsert
+        known_sessions.invalidate(session_uuid)
         # retorno esperado em caso de falha de integridade (ex: FK inválida - session_id não existe)
         return False
     except Exception as e:
         await session.rollback()
         print(f" [DB ERROR] Falha ao salvar mensagem: {e}")
         return False
+
+
+async def load_recent_messages(session_id, limit: int) -> list:
+    """
+    Últimas `limit` mensagens da sessão no formato de contexto da IA
+    ({"role": "user"|"assistant", "content"}), da mais antiga para a mais recente.
+    """
+    session_uuid = normalize_session_uuid(session_id)
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Message.sender, Message.content)
+            .where(Message.session_id == session_uuid)
+            .order_by(Message.sent_at.desc())
+            .limit(limit)
+        )
+        rows = result.all()
+    return [
+        {"role": "user" if sender == "USER" else "assistant", "content": content}
+        for sender, content in reversed(rows)
+    ]
+
+
+async def count_rows(session: AsyncSession, model, estimate_threshold: int = settings.USERS_COUNT_ESTIMATE_THRESHOLD):
+    """
+    Total de linhas da tabela do modelo, sem carregar as linhas no Python.
+    No PostgreSQL, tabelas grandes (estimativa do planner >= `estimate_threshold`)
+    usam pg_class.reltuples, que é O(1) mas aproximado (atualizado pelo
+    ANALYZE/autovacuum). Nos demais casos faz SELECT count(*).
+    Retorna (total, é_estimativa).
+    """
+    if session.bind.dialect.name == "postgresql" and estimate_threshold > 0:
+        estimate = await session.scalar(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)"),
+            {"table": model.__tablename__},
+        )
+        # reltuples = -1 (ou 0) em tabelas nunca analisadas: cai para a contagem exata
+        if estimate is not None and estimate >= estimate_threshold:
+            return int(estimate), True
+    total = await session.scalar(select(func.count()).select_from(model))
+    return int(total or 0), False
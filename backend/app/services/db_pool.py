@@ -0,0 +1,44 @@
+# backend/app/services/db_pool.py
+
+import time
+
+from sqlalchemy import exc # type: ignore
+from sqlalchemy.pool import AsyncAdaptedQueuePool # type: ignore
+
+from .metrics_service import (
+    db_pool_checked_out,
+    db_pool_wait_seconds,
+    db_pool_overflow_total,
+    db_pool_timeouts_total,
+)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    Pool assíncrono do SQLAlchemy com métricas Prometheus: conexões em uso,
+    tempo de espera por uma conexão, conexões de overflow abertas e timeouts.
+    Mesmo comportamento do AsyncAdaptedQueuePool (pool padrão do create_async_engine).
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            db_pool_timeouts_total.inc()
+            raise
+        finally:
+            db_pool_wait_seconds.observe(time.perf_counter() - start)
+        db_pool_checked_out.set(self.checkedout())
+        return record
+
+    def _do_return_conn(self, record):
+        super()._do_return_conn(record)
+        db_pool_checked_out.set(self.checkedout())
+
+    def _inc_overflow(self) -> bool:
+        created = super()._inc_overflow()
+        # _overflow parte de -pool_size: valores positivos são conexões além do pool fixo
+        if created and self._overflow > 0:
+            db_pool_overflow_total.inc()
+        return created
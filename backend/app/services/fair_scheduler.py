@@ -0,0 +1,133 @@
+# backend/app/services/fair_scheduler.py
+"""
+Justiça entre usuários na fila de requisições da IA.
+
+- PriorityClassifier (Gateway): cada usuário tem uma cota de mensagens
+  "interativas" por janela de tempo; o excedente de uma rajada (ex.: 50
+  perguntas coladas de uma vez) é publicado como "bulk" numa fila separada,
+  então não fica na frente das mensagens dos outros estudantes.
+- FairScheduler (Worker): as mensagens recebidas (prefetch) aguardam em
+  subfilas por usuário e são entregues ao pool por deficit round-robin (DRR),
+  com custo proporcional ao tamanho do prompt; entre as classes, a interativa
+  recebe `interactive_weight` vezes mais turnos que a bulk (sem inanição).
+"""
+
+import time
+import threading
+from collections import OrderedDict, deque
+
+from ..config import settings
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BULK = "bulk"
+PRIORITY_CLASSES = (PRIORITY_INTERACTIVE, PRIORITY_BULK)
+
+
+class PriorityClassifier:
+    """Janela deslizante por usuário: até `burst` mensagens em `window` segundos são interativas."""
+
+    def __init__(self, burst: int = settings.FAIR_INTERACTIVE_BURST, window: float = settings.FAIR_BURST_WINDOW,
+                 max_users: int = 100000):
+        self.burst = burst
+        self.window = window
+        self.max_users = max_users
+        self._recent = OrderedDict()  # user_id -> deque de instantes das últimas mensagens
+        self._lock = threading.Lock()
+
+    def classify(self, user_id: str, now: float = None) -> str:
+        if self.burst <= 0:
+            return PRIORITY_INTERACTIVE  # classificação desativada
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            recent = self._recent.get(user_id)
+            if recent is None:
+                recent = self._recent[user_id] = deque()
+                while len(self._recent) > self.max_users:
+                    self._recent.popitem(last=False)
+            self._recent.move_to_end(user_id)
+            while recent and now - recent[0] > self.window:
+                recent.popleft()
+            recent.append(now)
+            return PRIORITY_INTERACTIVE if len(recent) <= self.burst else PRIORITY_BULK
+
+
+class FairScheduler:
+    """
+    Fila thread-safe com deficit round-robin entre usuários, por classe de prioridade.
+
+    A cada visita, o usuário da vez recebe `quantum` de crédito e é atendido se o
+    crédito cobrir o custo da sua próxima mensagem; depois vai para o fim da
+    rodada. Mensagens caras (prompts longos) precisam de mais visitas, então um
+    usuário não monopoliza o Worker nem com muitas mensagens nem com mensagens grandes.
+    """
+
+    def __init__(self, quantum: int = settings.FAIR_QUANTUM_TOKENS,
+                 interactive_weight: int = settings.FAIR_INTERACTIVE_WEIGHT):
+        self.quantum = max(1, quantum)
+        self._cycle = [PRIORITY_INTERACTIVE] * max(1, interactive_weight) + [PRIORITY_BULK]
+        self._turn = 0
+        self._users = {cls: OrderedDict() for cls in PRIORITY_CLASSES}  # user_id -> deque[(custo, enfileirado_em, item)]
+        self._deficit = {cls: {} for cls in PRIORITY_CLASSES}
+        self._size = 0
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        with self._cond:
+            return self._size
+
+    def depth(self, priority: str) -> int:
+        with self._cond:
+            return sum(len(queue) for queue in self._users[priority].values())
+
+    def put(self, user_id: str, item, priority: str = PRIORITY_INTERACTIVE, cost: int = 1):
+        if priority not in self._users:
+            priority = PRIORITY_INTERACTIVE
+        with self._cond:
+            users = self._users[priority]
+            queue = users.get(user_id)
+            if queue is None:
+                queue = users[user_id] = deque()
+                self._deficit[priority][user_id] = 0
+            queue.append((max(1, cost), time.monotonic(), item))
+            self._size += 1
+            self._cond.notify()
+
+    def _next_class(self) -> str:
+        for offset in range(len(self._cycle)):
+            priority = self._cycle[(self._turn + offset) % len(self._cycle)]
+            if self._users[priority]:
+                self._turn = (self._turn + offset + 1) % len(self._cycle)
+                return priority
+        return None
+
+    def _pop(self, priority: str):
+        users, deficit = self._users[priority], self._deficit[priority]
+        while True:
+            user_id, queue = next(iter(users.items()))
+            cost, enqueued_at, item = queue[0]
+            deficit[user_id] += self.quantum
+            users.move_to_end(user_id)  # uma mensagem por visita: o próximo usuário é o seguinte da rodada
+            if deficit[user_id] < cost:
+                continue
+            queue.popleft()
+            if queue:
+                # Crédito não usado não se acumula entre atendimentos: só espera acumula crédito
+                deficit[user_id] = 0
+            else:
+                # Usuário sem mensagens sai da rodada e perde o crédito acumulado (regra do DRR)
+                del users[user_id]
+                del deficit[user_id]
+            return item, enqueued_at
+
+    def get(self, timeout: float = None):
+        """
+        Próxima mensagem pela política de justiça: (item, classe, segundos de espera),
+        ou None se nada chegar dentro de `timeout`.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._size > 0, timeout=timeout):
+                return None
+            priority = self._next_class()
+            item, enqueued_at = self._pop(priority)
+            self._size -= 1
+            return item, priority, time.monotonic() - enqueued_at
@@ -0,0 +1,68 @@
+# backend/app/services/http_compression.py
+
+import gzip
+import json
+
+from fastapi import Request # type: ignore
+from fastapi.responses import Response # type: ignore
+
+from ..config import settings
+
+try:
+    import zstandard # type: ignore
+except ImportError:  # zstd é opcional; sem a biblioteca, apenas gzip é oferecido
+    zstandard = None
+
+
+def supported_encodings() -> list:
+    """Codificações disponíveis no servidor, da preferida para a menos preferida."""
+    return (["zstd"] if zstandard is not None else []) + ["gzip"]
+
+
+def choose_encoding(accept_encoding: str):
+    """
+    Escolhe a codificação a partir do cabeçalho Accept-Encoding, respeitando
+    q=0 (recusa explícita). Retorna None se o cliente não aceitar nenhuma.
+    """
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name] = quality
+
+    for encoding in supported_encodings():
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    return gzip.compress(body, compresslevel=5)
+
+
+def compressed_json_response(request: Request, payload, min_size: int = None) -> Response:
+    """
+    Serializa `payload` em JSON e comprime com gzip/zstd quando o cliente aceita
+    e o corpo passa de `min_size` bytes (corpos pequenos não compensam o custo).
+    """
+    if min_size is None:
+        min_size = settings.HTTP_COMPRESSION_MIN_BYTES
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    headers = {"Vary": "Accept-Encoding"}
+    encoding = choose_encoding(request.headers.get("accept-encoding", "")) if len(body) >= min_size else None
+    if encoding is not None:
+        body = compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,221 @@
+# backend/app/services/message_partitions.py
+"""
+Particionamento mensal da tabela `messages` (RANGE em sent_at) e arquivamento
+das partições antigas em disco.
+
+Cada mês fica numa partição `messages_pAAAAMM` com os próprios índices: o custo
+de índice e de VACUUM depende do tamanho do mês, e não do histórico inteiro, e
+apagar um mês antigo é um DROP da partição (sem DELETE em massa nem inchaço).
+"""
+
+import os
+import re
+import gzip
+import json
+import uuid
+from datetime import date, datetime, timezone
+
+from sqlalchemy import text # type: ignore
+
+from ..config import settings
+
+try:
+    import zstandard # type: ignore
+except ImportError:  # sem zstd, o JSONL é comprimido com gzip
+    zstandard = None
+
+PARENT_TABLE = "messages"
+DEFAULT_PARTITION = "messages_default"
+PARTITION_PATTERN = re.compile(r"^messages_p(\d{4})(\d{2})$")
+ARCHIVE_FORMATS = ("jsonl", "parquet")
+
+
+# --- Meses e nomes ---
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_p{month.year:04d}{month.month:02d}"
+
+
+def parse_partition_name(name: str):
+    """Mês da partição a partir do nome, ou None se não seguir o padrão messages_pAAAAMM."""
+    match = PARTITION_PATTERN.match(name)
+    if match is None:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def months_between(first: date, last: date) -> list:
+    """Meses de `first` até `last` (inclusive)."""
+    months, current = [], month_start(first)
+    while current <= month_start(last):
+        months.append(current)
+        current = add_months(current, 1)
+    return months
+
+
+def create_partition_sql(month: date, parent: str = PARENT_TABLE) -> str:
+    lower, upper = month, add_months(month, 1)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {parent} "
+        f"FOR VALUES FROM ('{lower.isoformat()} 00:00:00+00') TO ('{upper.isoformat()} 00:00:00+00')"
+    )
+
+
+def partitions_to_archive(partitions: list, today: date, retention_months: int) -> list:
+    """Partições inteiramente anteriores à janela de retenção (mês corrente + meses anteriores)."""
+    oldest_kept = add_months(month_start(today), -retention_months)
+    return sorted(
+        (month, name) for name in partitions
+        if (month := parse_partition_name(name)) is not None and month < oldest_kept
+    )
+
+
+# --- Consultas no PostgreSQL ---
+
+async def is_partitioned(conn) -> bool:
+    relkind = await conn.scalar(text(
+        "SELECT relkind FROM pg_class WHERE relname = :table AND relnamespace = 'public'::regnamespace"
+    ), {"table": PARENT_TABLE})
+    return relkind == "p"
+
+
+async def list_partitions(conn) -> list:
+    result = await conn.execute(text("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = :table
+    """), {"table": PARENT_TABLE})
+    return [row[0] for row in result]
+
+
+async def ensure_future_partitions(conn, months_ahead: int = settings.MESSAGE_PARTITION_MONTHS_AHEAD,
+                                   today: date = None) -> list:
+    """
+    Cria as partições do mês corrente e dos próximos `months_ahead` meses.
+    Precisa rodar antes da virada do mês: linhas que caem na partição DEFAULT
+    impedem criar depois a partição daquele intervalo.
+    """
+    today = today or datetime.now(timezone.utc).date()
+    existing = set(await list_partitions(conn))
+    created = []
+    for month in months_between(today, add_months(month_start(today), months_ahead)):
+        if partition_name(month) not in existing:
+            await conn.execute(text(create_partition_sql(month)))
+            created.append(partition_name(month))
+    return created
+
+
+# --- Arquivo em disco ---
+
+def _serializable(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def archive_path(directory: str, month: date, fmt: str) -> str:
+    suffix = "parquet" if fmt == "parquet" else ("jsonl.zst" if zstandard is not None else "jsonl.gz")
+    return os.path.join(directory, f"{partition_name(month)}.{suffix}")
+
+
+class MessageArchiveWriter:
+    """
+    Grava as mensagens de uma partição em arquivo comprimido: JSONL (zstd ou,
+    sem a biblioteca, gzip) ou Parquet com compressão zstd (requer pyarrow).
+    Escreve num arquivo temporário e só o renomeia no `close()`, para que um
+    arquivo final nunca fique pela metade.
+    """
+
+    PARQUET_BATCH = 10000
+
+    def __init__(self, path: str, fmt: str = "jsonl"):
+        if fmt not in ARCHIVE_FORMATS:
+            raise ValueError(f"Formato de arquivo inválido: {fmt} (use {', '.join(ARCHIVE_FORMATS)})")
+        self.path = path
+        self.fmt = fmt
+        self.rows = 0
+        self._tmp_path = path + ".tmp"
+        self._file = None
+        self._parquet = None
+        self._pending = []
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if fmt == "parquet":
+            try:
+                import pyarrow # type: ignore  # noqa: F401
+            except ImportError:
+                raise RuntimeError("Formato parquet requer o pacote pyarrow (pip install pyarrow)")
+        elif path.endswith(".zst"):
+            self._raw = open(self._tmp_path, "wb")
+            self._file = zstandard.ZstdCompressor(level=9).stream_writer(self._raw)
+        else:
+            self._file = gzip.open(self._tmp_path, "wb", compresslevel=6)
+
+    def write(self, row: dict):
+        row = {key: _serializable(value) for key, value in row.items()}
+        self.rows += 1
+        if self.fmt == "parquet":
+            self._pending.append(row)
+            if len(self._pending) >= self.PARQUET_BATCH:
+                self._flush_parquet()
+            return
+        self._file.write((json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8"))
+
+    def _flush_parquet(self):
+        import pyarrow as pa # type: ignore
+        import pyarrow.parquet as pq # type: ignore
+        if not self._pending:
+            return
+        table = pa.Table.from_pylist(self._pending)
+        if self._parquet is None:
+            self._parquet = pq.ParquetWriter(self._tmp_path, table.schema, compression="zstd")
+        self._parquet.write_table(table)
+        self._pending = []
+
+    def close(self):
+        if self.fmt == "parquet":
+            self._flush_parquet()
+            if self._parquet is not None:
+                self._parquet.close()
+            else:
+                open(self._tmp_path, "wb").close()  # partição vazia
+        else:
+            self._file.close()
+            if self.path.endswith(".zst"):
+                self._raw.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        """Descarta o arquivo temporário após uma falha na exportação."""
+        try:
+            if self._parquet is not None:
+                self._parquet.close()
+            elif self._file is not None:
+                self._file.close()
+                if self.path.endswith(".zst"):
+                    self._raw.close()
+        finally:
+            if os.path.exists(self._tmp_path):
+                os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
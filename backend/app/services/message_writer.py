@@ -0,0 +1,191 @@
+# backend/app/services/message_writer.py
+
+import time
+import uuid
+import asyncio
+from datetime import datetime, timezone
+
+from sqlalchemy import insert # type: ignore
+
+from ..config import settings
+from ..models.models import Message
+from .database_service import (
+    AsyncSessionLocal,
+    known_sessions,
+    normalize_session_uuid,
+    ensure_users_and_sessions,
+    save_message,
+)
+from .metrics_service import db_write_queue_depth, db_write_batch_size, db_write_flush_seconds
+
+DURABILITY_MODES = ("sync", "batched", "async")
+
+
+class MessageWriter:
+    """
+    Persistência de mensagens em lote (write-behind).
+
+    As mensagens entram numa fila asyncio limitada e uma task dedicada grava
+    a cada `batch_size` mensagens ou `flush_interval_ms` milissegundos, com um
+    único INSERT de múltiplas linhas e um único commit por lote.
+
+    Modos de durabilidade:
+      - sync:    um commit por mensagem (comportamento anterior, sem fila); com
+                 `wait_for_commit=False` o commit roda numa task em segundo plano
+      - batched: o chamador aguarda o commit do lote que contém sua mensagem
+      - async:   o chamador retorna ao enfileirar; a mensagem é gravada em até
+                 `flush_interval_ms` (perde-se o lote pendente se o processo cair)
+    """
+
+    def __init__(self, durability: str = settings.MESSAGE_WRITE_DURABILITY,
+                 batch_size: int = settings.MESSAGE_WRITE_BATCH_SIZE,
+                 flush_interval_ms: int = settings.MESSAGE_WRITE_FLUSH_MS,
+                 maxsize: int = settings.MESSAGE_WRITE_QUEUE_MAXSIZE,
+                 session_factory=AsyncSessionLocal):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Modo de durabilidade inválido: {durability} (use {', '.join(DURABILITY_MODES)})")
+        self.durability = durability
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.maxsize = maxsize
+        self.session_factory = session_factory
+        self._queue = None
+        self._task = None
+        self._background = set()  # gravações do modo sync disparadas sem aguardar o commit
+
+    def start(self):
+        """Cria a fila e a task de gravação no event loop corrente."""
+        if self.durability == "sync" or self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        print(f" [DB] Gravação em lote iniciada (modo {self.durability}, lote {self.batch_size}, "
+              f"intervalo {int(self.flush_interval * 1000)} ms).")
+
+    async def write(self, session_id: str, sender: str, content: str,
+                    sent_at: datetime = None, wait_for_commit: bool = None, verified: bool = False) -> bool:
+        """
+        Registra uma mensagem conforme o modo de durabilidade configurado.
+        `wait_for_commit=False` força o comportamento write-behind (retorna ao
+        enfileirar) independentemente do modo; `sent_at` preserva o horário real
+        de chegada quando a gravação acontece depois de outras etapas.
+        `verified=True` indica sessão autenticada no handshake do WebSocket: o
+        flush não faz upsert de usuário/sessão para ela.
+        """
+        sent_at = sent_at or datetime.now(timezone.utc)
+        if self.durability == "sync":
+            save = self._save_one(session_id, sender, content, sent_at, verified)
+            # Write-behind pedido pelo chamador (ex.: ACK pipelined): o INSERT não bloqueia
+            # quem chamou; com `maxsize` gravações pendentes, aguarda (backpressure)
+            if wait_for_commit is False and len(self._background) < self.maxsize:
+                task = asyncio.get_running_loop().create_task(save)
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
+                return True
+            return await save
+
+        self.start()  # no-op se já iniciado (o Worker inicia sob demanda no loop de persistência)
+        row = {
+            "id": uuid.uuid4(),
+            "session_id": normalize_session_uuid(session_id),
+            "sender": sender,
+            "content": content,
+            "sent_at": sent_at,  # horário de chegada, não do flush
+        }
+        if wait_for_commit is None:
+            wait_for_commit = self.durability == "batched"
+        future = asyncio.get_running_loop().create_future() if wait_for_commit else None
+        await self._queue.put((row, future, verified))  # backpressure: aguarda espaço se a fila estiver cheia
+        db_write_queue_depth.set(self._queue.qsize())
+        if future is None:
+            return True
+        return await future
+
+    async def _save_one(self, session_id, sender: str, content: str, sent_at: datetime, verified: bool) -> bool:
+        async with self.session_factory() as db_session:
+            return await save_message(db_session, session_id, sender, content, sent_at=sent_at, verified=verified)
+
+    async def _next_batch(self) -> list:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _flush(self, batch: list):
+        rows = [row for row, _, _ in batch]
+        start = time.perf_counter()
+        try:
+            async with self.session_factory() as db_session:
+                upserted = await ensure_users_and_sessions(
+                    db_session, [row["session_id"] for row, _, verified in batch if not verified]
+                )
+                await db_session.execute(insert(Message), rows)
+                await db_session.commit()
+            known_sessions.add(*upserted)
+            results = [True] * len(rows)
+        except Exception as e:
+            # Um registro inválido não pode derrubar o lote inteiro: regrava um a um
+            print(f" [DB ERROR] Falha ao gravar lote de {len(rows)} mensagens, gravando individualmente: {e}")
+            results = []
+            for row, _, verified in batch:
+                async with self.session_factory() as db_session:
+                    results.append(await save_message(
+                        db_session, row["session_id"], row["sender"], row["content"], sent_at=row["sent_at"],
+                        verified=verified,
+                    ))
+        db_write_flush_seconds.observe(time.perf_counter() - start)
+        db_write_batch_size.observe(len(rows))
+
+        for (_, future, _), ok in zip(batch, results):
+            if future is not None and not future.done():
+                future.set_result(ok)
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            db_write_queue_depth.set(self._queue.qsize())
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                print(f" [DB ERROR] Falha inesperada na gravação em lote: {e}")
+                for _, future, _ in batch:
+                    if future is not None and not future.done():
+                        future.set_result(False)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def stop(self, timeout: float = 10.0):
+        """Grava o que restou na fila (com limite de tempo) e encerra a task."""
+        if self._background:
+            _, pending = await asyncio.wait(set(self._background), timeout=timeout)
+            if pending:
+                print(f" [!] {len(pending)} mensagens não gravadas no desligamento.")
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f" [!] {self._queue.qsize()} mensagens não gravadas no desligamento.")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._queue = None
+
+
+message_writer = MessageWriter()
@@ -1,6 +1,6 @@
 # backend/app/services/metrics_service.py
 
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST # type: ignore
+from prometheus_client import Counter, Gauge, Histogram, generate_latest # type: ignore
 from starlette.middleware.base import BaseHTTPMiddleware # type: ignore
 from starlette.requests import Request # type: ignore
 from starlette.responses import Response # type: ignore
@@ -36,6 +36,134 @@ websocket_messages_total = Counter(
     ['action']
 )
 
+# Métricas do despachante de respostas (fila entre o consumidor e os WebSockets)
+reply_queue_depth = Gauge(
+    'ws_reply_queue_depth',
+    'Respostas aguardando envio aos WebSockets'
+)
+
+reply_batch_size = Histogram(
+    'ws_reply_batch_size',
+    'Quantidade de respostas enviadas por lote de despacho',
+    buckets=[1, 2, 4, 8, 16, 32, 64, 128]
+)
+
+# Métricas do pool de conexões do PostgreSQL (SQLAlchemy)
+db_pool_checked_out = Gauge(
+    'db_pool_checked_out_connections',
+    'Conexões do pool em uso neste processo'
+)
+
+db_pool_wait_seconds = Histogram(
+    'db_pool_wait_seconds',
+    'Tempo de espera para obter uma conexão do pool em segundos',
+    buckets=[0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0]
+)
+
+db_pool_overflow_total = Counter(
+    'db_pool_overflow_total',
+    'Conexões de overflow abertas (além de DB_POOL_SIZE)'
+)
+
+db_pool_timeouts_total = Counter(
+    'db_pool_timeouts_total',
+    'Esperas por conexão que excederam DB_POOL_TIMEOUT'
+)
+
+# Métricas da gravação de mensagens em lote (write-behind)
+db_write_queue_depth = Gauge(
+    'db_write_queue_depth',
+    'Mensagens aguardando gravação no banco'
+)
+
+db_write_batch_size = Histogram(
+    'db_write_batch_size',
+    'Quantidade de mensagens gravadas por lote (um commit por lote)',
+    buckets=[1, 2, 5, 10, 25, 50, 100, 200, 500]
+)
+
+db_write_flush_seconds = Histogram(
+    'db_write_flush_seconds',
+    'Duração da gravação de um lote de mensagens em segundos',
+    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5]
+)
+
+# Métricas do pool de hash de senhas (bcrypt fora do event loop)
+password_hash_queue_seconds = Histogram(
+    'password_hash_queue_seconds',
+    'Tempo de espera na fila do pool de bcrypt em segundos',
+    ['operation'],
+    buckets=[0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
+)
+
+password_hash_duration_seconds = Histogram(
+    'password_hash_duration_seconds',
+    'Duração das operações de bcrypt em segundos',
+    ['operation'],
+    buckets=[0.01, 0.05, 0.1, 0.25, 0.5, 1.0]
+)
+
+# Métricas do cache de respostas da IA (IA Worker)
+ai_cache_requests_total = Counter(
+    'ai_cache_requests_total',
+    'Consultas ao cache de respostas da IA',
+    ['tier', 'result']
+)
+
+ai_cache_lookup_seconds = Histogram(
+    'ai_cache_lookup_seconds',
+    'Latência de consulta ao cache de respostas da IA em segundos',
+    ['tier'],
+    buckets=[0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1]
+)
+
+
+# Proteção das chamadas ao provedor de IA (IA Worker): limite adaptativo, disjuntor e orçamento de retentativas
+ai_provider_concurrency_limit = Gauge(
+    'ai_provider_concurrency_limit',
+    'Limite adaptativo (AIMD) de chamadas simultâneas ao provedor de IA',
+    ['provider']
+)
+
+ai_provider_inflight = Gauge(
+    'ai_provider_inflight',
+    'Chamadas ao provedor de IA em andamento',
+    ['provider']
+)
+
+ai_provider_rejected_total = Counter(
+    'ai_provider_rejected_total',
+    'Chamadas ao provedor de IA recusadas localmente',
+    ['provider', 'reason']
+)
+
+ai_provider_breaker_state = Gauge(
+    'ai_provider_breaker_state',
+    'Estado do disjuntor do provedor de IA (0 = fechado, 1 = semiaberto, 2 = aberto)',
+    ['provider']
+)
+
+ai_provider_request_seconds = Histogram(
+    'ai_provider_request_seconds',
+    'Duração das chamadas ao provedor de IA em segundos',
+    ['provider', 'outcome'],
+    buckets=[0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0]
+)
+
+
+# Roteamento entre provedores de IA (IA Worker)
+ai_router_hedges_total = Counter(
+    'ai_router_hedges_total',
+    'Requisições hedged enviadas após o p95 do backend principal',
+    ['backend']
+)
+
+ai_router_failovers_total = Counter(
+    'ai_router_failovers_total',
+    'Requisições repassadas a outro backend após falha',
+    ['backend']
+)
+
 
 class MetricsMiddleware(BaseHTTPMiddleware):
     """Middleware para coletar métricas de latência e contagem de requisições HTTP"""
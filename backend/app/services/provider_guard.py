@@ -0,0 +1,252 @@
+# backend/app/services/provider_guard.py
+"""
+Proteção das chamadas ao provedor de IA (IA Worker), por provedor.
+
+- Limite adaptativo de concorrência (AIMD): cada sucesso aumenta o limite em
+  ~1 por "janela" de chamadas; 429, timeout, 5xx ou resposta acima de
+  PROVIDER_LATENCY_THRESHOLD o multiplicam por PROVIDER_LIMIT_BACKOFF. A
+  vazão acompanha a capacidade real do provedor em vez de alternar entre
+  sobrecarga (rajada de 429) e ociosidade.
+- Disjuntor (circuit breaker): após PROVIDER_BREAKER_FAILURES falhas
+  transitórias seguidas, o provedor deixa de receber tráfego por
+  PROVIDER_BREAKER_RESET segundos; depois uma única chamada de teste
+  (semiaberto) decide se ele volta. Com PROVIDER_BREAKER_SHARED, a abertura é
+  publicada no Redis e vale para todos os Workers.
+- Orçamento de retentativas: cada chamada deposita PROVIDER_RETRY_BUDGET_RATIO
+  fichas e cada retentativa consome uma, então as retentativas nunca passam
+  de uma fração do tráfego (não multiplicam a carga de um provedor já em falha).
+
+Falhas contam como sobrecarga quando a exceção é transitória (atributo
+`retryable`, como em AIProviderError); erros de configuração (401, modelo
+inexistente) não abrem o disjuntor.
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+
+from ..config import settings
+from .redis_service import get_sync_redis
+from .metrics_service import (
+    ai_provider_breaker_state,
+    ai_provider_concurrency_limit,
+    ai_provider_inflight,
+    ai_provider_rejected_total,
+    ai_provider_request_seconds,
+)
+
+BREAKER_CLOSED = "closed"
+BREAKER_HALF_OPEN = "half_open"
+BREAKER_OPEN = "open"
+_BREAKER_STATE_VALUES = {BREAKER_CLOSED: 0, BREAKER_HALF_OPEN: 1, BREAKER_OPEN: 2}
+
+BREAKER_KEY_PREFIX = "ai:breaker:"
+
+
+class ProviderRejectedError(Exception):
+    """A chamada não foi feita (disjuntor aberto ou limite de concorrência): falha transitória."""
+
+    retryable = True
+
+    def __init__(self, provider: str, reason: str):
+        super().__init__(f"Provedor {provider} indisponível ({reason})")
+        self.provider = provider
+        self.reason = reason
+
+
+def is_overload_error(error: Exception) -> bool:
+    return bool(getattr(error, "retryable", False))
+
+
+class AIMDLimiter:
+    """Limite de chamadas simultâneas com aumento aditivo e redução multiplicativa."""
+
+    def __init__(self, initial: int = settings.PROVIDER_LIMIT_INITIAL, min_limit: int = settings.PROVIDER_LIMIT_MIN,
+                 max_limit: int = settings.PROVIDER_LIMIT_MAX, backoff: float = settings.PROVIDER_LIMIT_BACKOFF):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.backoff = backoff
+        self._limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.inflight = 0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def acquire(self, timeout: float = None) -> bool:
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.inflight < int(self._limit), timeout=timeout):
+                return False
+            self.inflight += 1
+            return True
+
+    def release(self, overloaded: bool):
+        with self._cond:
+            if overloaded:
+                self._limit = max(self.min_limit, self._limit * self.backoff)
+            elif self.inflight * 2 >= int(self._limit):
+                # Só cresce quando o limite está sendo usado (sem inflar o limite em período ocioso)
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+            self.inflight -= 1
+            self._cond.notify_all()
+
+
+class CircuitBreaker:
+    """Fechado -> aberto (falhas seguidas) -> semiaberto (uma chamada de teste) -> fechado ou aberto."""
+
+    def __init__(self, name: str, failure_threshold: int = settings.PROVIDER_BREAKER_FAILURES,
+                 reset_timeout: float = settings.PROVIDER_BREAKER_RESET, shared: bool = settings.PROVIDER_BREAKER_SHARED,
+                 clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.shared = shared
+        self.state = BREAKER_CLOSED
+        self._clock = clock
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._shared_checked_at = None
+        self._lock = threading.Lock()
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            print(f" [BREAKER] {self.name}: {self.state} -> {state}")
+        self.state = state
+        ai_provider_breaker_state.labels(provider=self.name).set(_BREAKER_STATE_VALUES[state])
+
+    def _open(self, now: float):
+        self._opened_at = now
+        self._probing = False
+        self._set_state(BREAKER_OPEN)
+
+    def _opened_elsewhere(self, now: float) -> bool:
+        """Outro Worker abriu o disjuntor? Consulta o Redis no máximo uma vez por segundo."""
+        if not self.shared or (self._shared_checked_at is not None and now - self._shared_checked_at < 1.0):
+            return False
+        self._shared_checked_at = now
+        try:
+            return bool(get_sync_redis().exists(f"{BREAKER_KEY_PREFIX}{self.name}"))
+        except Exception:
+            return False  # sem Redis, cada Worker decide sozinho
+
+    def _publish_open(self):
+        if not self.shared:
+            return
+        try:
+            get_sync_redis().set(f"{BREAKER_KEY_PREFIX}{self.name}", "1", px=max(1, int(self.reset_timeout * 1000)))
+        except Exception:
+            pass
+
+    def allow(self) -> bool:
+        with self._lock:
+            now = self._clock()
+            if self.state == BREAKER_CLOSED:
+                if not self._opened_elsewhere(now):
+                    return True
+                self._open(now)
+            if self.state == BREAKER_OPEN:
+                if now - self._opened_at < self.reset_timeout:
+                    return False
+                self._set_state(BREAKER_HALF_OPEN)
+            # Semiaberto: apenas uma chamada de teste por vez
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def cancel_probe(self):
+        """A chamada de teste liberada pelo semiaberto não chegou a ser feita."""
+        with self._lock:
+            self._probing = False
+
+    def record(self, failed: bool):
+        publish = False
+        with self._lock:
+            if not failed:
+                self._failures = 0
+                self._probing = False
+                self._set_state(BREAKER_CLOSED)
+                return
+            self._failures += 1
+            if self.state == BREAKER_HALF_OPEN or self._failures >= self.failure_threshold:
+                publish = self.state != BREAKER_OPEN
+                self._open(self._clock())
+        if publish:
+            self._publish_open()
+
+
+class RetryBudget:
+    """Retentativas limitadas a uma fração das chamadas (com reserva inicial para tráfego baixo)."""
+
+    def __init__(self, ratio: float = settings.PROVIDER_RETRY_BUDGET_RATIO,
+                 reserve: int = settings.PROVIDER_RETRY_BUDGET_RESERVE):
+        self.ratio = ratio
+        self.capacity = max(1.0, float(reserve))
+        self._tokens = self.capacity
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class ProviderGuard:
+    """Limite adaptativo + disjuntor + orçamento de retentativas de um provedor."""
+
+    def __init__(self, name: str, limiter: AIMDLimiter = None, breaker: CircuitBreaker = None,
+                 retry_budget: RetryBudget = None, acquire_timeout: float = settings.PROVIDER_ACQUIRE_TIMEOUT,
+                 latency_threshold: float = settings.PROVIDER_LATENCY_THRESHOLD):
+        self.name = name
+        self.limiter = limiter or AIMDLimiter()
+        self.breaker = breaker or CircuitBreaker(name)
+        self.retry_budget = retry_budget or RetryBudget()
+        self.acquire_timeout = acquire_timeout
+        self.latency_threshold = latency_threshold
+        ai_provider_concurrency_limit.labels(provider=name).set(self.limiter.limit)
+        ai_provider_breaker_state.labels(provider=name).set(_BREAKER_STATE_VALUES[self.breaker.state])
+
+    def _reject(self, reason: str):
+        ai_provider_rejected_total.labels(provider=self.name, reason=reason).inc()
+        raise ProviderRejectedError(self.name, reason)
+
+    @contextmanager
+    def call(self):
+        """Envolve uma chamada ao provedor; lança ProviderRejectedError se ela não puder ser feita."""
+        if not self.breaker.allow():
+            self._reject("circuit_open")
+        if not self.limiter.acquire(timeout=self.acquire_timeout):
+            self.breaker.cancel_probe()
+            self._reject("concurrency")
+        ai_provider_inflight.labels(provider=self.name).inc()
+        self.retry_budget.deposit()
+        started = time.monotonic()
+        failed = False
+        try:
+            yield
+        except Exception as e:
+            failed = is_overload_error(e)
+            raise
+        finally:
+            elapsed = time.monotonic() - started
+            slow = self.latency_threshold > 0 and elapsed > self.latency_threshold
+            self.limiter.release(overloaded=failed or slow)
+            self.breaker.record(failed)
+            ai_provider_inflight.labels(provider=self.name).dec()
+            ai_provider_concurrency_limit.labels(provider=self.name).set(self.limiter.limit)
+            ai_provider_request_seconds.labels(provider=self.name, outcome="failure" if failed else "success").observe(elapsed)
+
+    def allow_retry(self) -> bool:
+        """Consome uma ficha do orçamento; False = a falha vai direto ao usuário, sem retentativa."""
+        if self.retry_budget.try_spend():
+            return True
+        ai_provider_rejected_total.labels(provider=self.name, reason="retry_budget").inc()
+        return False
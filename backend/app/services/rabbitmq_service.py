@@ -1,6 +1,10 @@
 import pika # type: ignore
 import os
 import json
+import queue
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # Configuração de conexão do RabbitMQ (lendo do .env)
 RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "rabbitmq")
@@ -8,67 +12,202 @@ RABBITMQ_PORT = int(os.getenv("RABBITMQ_PORT", 5672))
 RABBITMQ_USER = os.getenv("RABBITMQ_USER", "user")
 RABBITMQ_PASS = os.getenv("RABBITMQ_PASS", "password")
 
+# Tamanho do pool de canais do publicador (cada canal tem sua própria conexão,
+# pois a BlockingConnection do pika não é thread-safe)
+RABBITMQ_PUBLISHER_POOL_SIZE = int(os.getenv("RABBITMQ_PUBLISHER_POOL_SIZE", "4"))
+RABBITMQ_HEARTBEAT = int(os.getenv("RABBITMQ_HEARTBEAT", "60"))
+
 QUEUE_NAME = 'q.ia_request'
 EXCHANGE_NAME = 'x.chat_requests'
+# Excedente de rajadas de um mesmo usuário (classe "bulk"): não fica na frente das mensagens interativas
+BULK_QUEUE_NAME = 'q.ia_request.bulk'
+
+RESPONSE_QUEUE_NAME = 'q.ia_response'
+RESPONSE_EXCHANGE_NAME = 'x.chat_responses'
+
+# Fila de respostas exclusiva de cada nó do Gateway: removida pelo broker
+# se ficar sem consumidor por mais de 60s (nó desligado)
+NODE_QUEUE_ARGUMENTS = {"x-expires": 60000}
+
+def request_routing_key(message_data: dict) -> str:
+    """Fila de destino da requisição conforme a classe de prioridade definida pelo Gateway"""
+    return BULK_QUEUE_NAME if message_data.get("priority") == "bulk" else QUEUE_NAME
+
+def node_routing_key(node_id: str) -> str:
+    """Routing key que endereça as respostas ao nó do Gateway que mantém o WebSocket"""
+    return f"node.{node_id}"
 
-def get_rabbitmq_connection():
+def node_queue_name(node_id: str) -> str:
+    return f"{RESPONSE_QUEUE_NAME}.{node_id}"
+
+def get_rabbitmq_connection(connection_attempts: int = 5, retry_delay: int = 5):
 
     credentials = pika.PlainCredentials(RABBITMQ_USER, RABBITMQ_PASS)
     parameters = pika.ConnectionParameters(
         host=RABBITMQ_HOST,
         port=RABBITMQ_PORT,
         credentials=credentials,
+        heartbeat=RABBITMQ_HEARTBEAT,
         # Timeout para falha de conexão (boa prática em SD)
-        connection_attempts=5, 
-        retry_delay=5 
+        connection_attempts=connection_attempts,
+        retry_delay=retry_delay
     )
     return pika.BlockingConnection(parameters)
 
-def publish_message(message_data: dict):
 
-    try:
-        connection = get_rabbitmq_connection()
+class RabbitMQPublisher:
+    """
+    Publicador persistente com pool de canais.
+
+    Mantém conexões abertas entre publicações (evita o handshake TCP + AMQP
+    por mensagem), declara a topologia uma única vez por processo e reconecta
+    automaticamente quando um canal do pool é encontrado fechado.
+    """
+
+    def __init__(self, topology: list, pool_size: int = RABBITMQ_PUBLISHER_POOL_SIZE):
+        # topology: lista de (exchange, fila, routing_key) a declarar uma vez
+        self.topology = topology
+        self.pool_size = pool_size
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._lock = threading.Lock()
+        self._topology_declared = False
+        self._executor = None
+
+    def _declare_topology(self, channel):
+        with self._lock:
+            if self._topology_declared:
+                return
+            declared_exchanges = set()
+            for exchange, queue_name, routing_key in self.topology:
+                # 'durable=True' para que Exchange, Fila e mensagens sobrevivam a reinicializações (Resiliência/OS5)
+                if exchange not in declared_exchanges:
+                    channel.exchange_declare(exchange=exchange, exchange_type='direct', durable=True)
+                    declared_exchanges.add(exchange)
+                channel.queue_declare(queue=queue_name, durable=True)
+                channel.queue_bind(exchange=exchange, queue=queue_name, routing_key=routing_key)
+            self._topology_declared = True
+
+    def _open_channel(self):
+        connection = get_rabbitmq_connection(connection_attempts=2, retry_delay=1)
         channel = connection.channel()
+        self._declare_topology(channel)
+        return connection, channel
 
-        # 1. Declarar a Exchange (Garante que ela exista)
-        channel.exchange_declare(
-            exchange=EXCHANGE_NAME, 
-            exchange_type='direct',
-            durable=True # 'durable=True' para garantir que a Exchange sobreviva a reinicializações (Resiliência/OS5)
-        )
-        
-        # 2. Declarar a Fila (Garante que ela exista)
-        channel.queue_declare(
-            queue=QUEUE_NAME, 
-            durable=True # 'durable=True' para garantir que a Fila e mensagens sobrevivam (Resiliência/OS5)
-        )
-        
-        # 3. Vincular a Fila à Exchange
-        channel.queue_bind(
-            exchange=EXCHANGE_NAME,
-            queue=QUEUE_NAME,
-            routing_key=QUEUE_NAME # Usamos o nome da fila como routing key
-        )
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            connection, channel = self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                return self._open_channel(), False
+            except Exception:
+                self._slots.release()
+                raise
+        return (connection, channel), True
 
-        # 4. Publicar a Mensagem
-        body = json.dumps(message_data)
-        
+    def _release(self, entry):
+        self._idle.put(entry)
+        self._slots.release()
+
+    def _discard(self, entry):
+        connection, _ = entry
+        try:
+            if connection.is_open:
+                connection.close()
+        except Exception:
+            pass
+        self._slots.release()
+
+    def _basic_publish(self, entry, exchange: str, routing_key: str, body: str, properties):
+        connection, channel = entry
+        # Processa heartbeats pendentes de conexões ociosas no pool
+        connection.process_data_events(time_limit=0)
         channel.basic_publish(
-            exchange=EXCHANGE_NAME,
-            routing_key=QUEUE_NAME,
+            exchange=exchange,
+            routing_key=routing_key,
             body=body,
-            properties=pika.BasicProperties(
+            properties=properties
+        )
+
+    def publish(self, exchange: str, routing_key: str, message_data: dict, properties=None) -> bool:
+        """Publica uma mensagem reaproveitando um canal do pool."""
+        body = json.dumps(message_data)
+        if properties is None:
+            properties = pika.BasicProperties(
                 delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE # Persistente: A mensagem sobreviverá a reinicialização do RabbitMQ (Resiliência/OS5)
             )
-        )
-        
-        print(f" [x] Mensagem enviada para a fila: {QUEUE_NAME}")
-        connection.close()
+
+        try:
+            entry, reused = self._acquire()
+        except pika.exceptions.AMQPConnectionError as e:
+            print(f" [!] ERRO: Não foi possível conectar ao RabbitMQ: {e}")
+            return False
+        except Exception as e:
+            print(f" [!] ERRO ao abrir canal no RabbitMQ: {e}")
+            return False
+
+        try:
+            self._basic_publish(entry, exchange, routing_key, body, properties)
+        except Exception as e:
+            self._discard(entry)
+            if not reused:
+                print(f" [!] ERRO ao publicar mensagem: {e}")
+                return False
+
+            # Canal reaproveitado estava morto (broker reiniciado, heartbeat perdido):
+            # descarta os canais ociosos e tenta novamente com uma conexão nova
+            print(f" [!] Canal do pool inválido ({e}). Reconectando ao RabbitMQ...")
+            self._close_idle()
+            return self.publish(exchange, routing_key, message_data, properties)
+
+        self._release(entry)
+        print(f" [x] Mensagem enviada para: {exchange} ({routing_key})")
         return True
 
-    except pika.exceptions.AMQPConnectionError as e:
-        print(f" [!] ERRO: Não foi possível conectar ao RabbitMQ: {e}")
-        return False
-    except Exception as e:
-        print(f" [!] ERRO ao publicar mensagem: {e}")
-        return False
\ No newline at end of file
+    async def publish_async(self, exchange: str, routing_key: str, message_data: dict, properties=None) -> bool:
+        """Versão awaitable: executa a publicação bloqueante fora do event loop."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="amqp-publisher")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, self.publish, exchange, routing_key, message_data, properties
+        )
+
+    def start(self):
+        """Abre o pool e declara a topologia antecipadamente (startup)."""
+        entry, _ = self._acquire()
+        self._release(entry)
+
+    def _close_idle(self):
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                if connection.is_open:
+                    connection.close()
+            except Exception:
+                pass
+
+    def close(self):
+        """Fecha todas as conexões ociosas do pool."""
+        self._close_idle()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self._topology_declared = False
+
+
+# Publicador de requisições usado pelo API Gateway
+publisher = RabbitMQPublisher(topology=[
+    (EXCHANGE_NAME, QUEUE_NAME, QUEUE_NAME),
+    (EXCHANGE_NAME, BULK_QUEUE_NAME, BULK_QUEUE_NAME),
+])
+
+def publish_message(message_data: dict):
+    return publisher.publish(EXCHANGE_NAME, request_routing_key(message_data), message_data)
+
+async def publish_message_async(message_data: dict):
+    return await publisher.publish_async(EXCHANGE_NAME, request_routing_key(message_data), message_data)
@@ -0,0 +1,149 @@
+# backend/app/services/rate_limiter.py
+"""
+Limite de taxa na entrada do WebSocket (token bucket), por usuário e global.
+
+- Por usuário: RATE_LIMIT_USER_RATE mensagens/s, com rajadas de até
+  RATE_LIMIT_USER_BURST (um estudante não ocupa o Worker sozinho).
+- Global: dimensionado pela cota do provedor de IA (RATE_LIMIT_GLOBAL_RATE),
+  para descartar o excesso no Gateway, antes de virar fila e 429 no provedor.
+
+Backend "memory": baldes no processo (um único nó do Gateway). Backend
+"redis": um script Lua verifica e consome os dois baldes atomicamente, então o
+limite vale para o cluster inteiro; se o Redis cair, cada nó aplica os mesmos
+limites localmente até ele voltar.
+
+Uma mensagem só consome fichas se todos os baldes tiverem saldo; caso
+contrário, retorna em quantos segundos haverá ficha (retry_after).
+"""
+
+import time
+from collections import OrderedDict
+
+from ..config import settings
+from .redis_service import get_async_redis
+
+RATE_LIMIT_KEY_PREFIX = "ratelimit:"
+SCOPE_USER = "user"
+SCOPE_GLOBAL = "global"
+
+# KEYS: um hash por balde (tokens, ts); ARGV: pares (taxa, capacidade) na mesma ordem.
+# O relógio é o do Redis (TIME): todos os nós do Gateway enxergam o mesmo instante.
+_TOKEN_BUCKET_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local wait, blocked = 0, 0
+local levels = {}
+for i = 1, #KEYS do
+    local rate, burst = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    local state = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+    levels[i] = tokens
+    if tokens < 1 and (1 - tokens) / rate > wait then
+        wait, blocked = (1 - tokens) / rate, i
+    end
+end
+if blocked > 0 then
+    return {tostring(wait), blocked}
+end
+for i = 1, #KEYS do
+    local rate, burst = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    redis.call('HSET', KEYS[i], 'tokens', levels[i] - 1, 'ts', now)
+    redis.call('EXPIRE', KEYS[i], math.ceil(burst / rate) + 1)
+end
+return {'0', 0}
+"""
+
+
+class MemoryTokenBuckets:
+    """Baldes no processo: {chave: (fichas, instante)}, com limite de chaves (LRU)."""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    def acquire(self, limits: list, now: float = None) -> tuple:
+        """limits: [(escopo, chave, taxa, capacidade)]. Retorna (retry_after, escopo bloqueado)."""
+        now = time.monotonic() if now is None else now
+        wait, blocked, levels = 0.0, None, []
+        for scope, key, rate, burst in limits:
+            tokens, ts = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + max(0.0, now - ts) * rate)
+            levels.append(tokens)
+            if tokens < 1 and (1 - tokens) / rate > wait:
+                wait, blocked = (1 - tokens) / rate, scope
+        if blocked is not None:
+            return wait, blocked
+        for (scope, key, rate, burst), tokens in zip(limits, levels):
+            self._buckets[key] = (tokens - 1, now)
+            self._buckets.move_to_end(key)
+        # Balde esquecido equivale a balde cheio: descartar os mais antigos não afrouxa o limite ativo
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return 0.0, None
+
+
+class RateLimiter:
+    """Limite por usuário + global na ingestão do Gateway."""
+
+    def __init__(self, backend: str = settings.RATE_LIMIT_BACKEND,
+                 user_rate: float = settings.RATE_LIMIT_USER_RATE, user_burst: int = settings.RATE_LIMIT_USER_BURST,
+                 global_rate: float = settings.RATE_LIMIT_GLOBAL_RATE, global_burst: int = settings.RATE_LIMIT_GLOBAL_BURST):
+        self.backend = backend
+        self.user_rate = user_rate
+        self.user_burst = max(1, user_burst)
+        self.global_rate = global_rate
+        self.global_burst = max(1, global_burst)
+        self._local = MemoryTokenBuckets()
+        self._available = True
+
+    def _limits(self, user_id: str) -> list:
+        # Taxa 0 desativa o respectivo limite
+        limits = []
+        if self.user_rate > 0:
+            limits.append((SCOPE_USER, f"{RATE_LIMIT_KEY_PREFIX}user:{user_id}", self.user_rate, self.user_burst))
+        if self.global_rate > 0:
+            limits.append((SCOPE_GLOBAL, f"{RATE_LIMIT_KEY_PREFIX}global", self.global_rate, self.global_burst))
+        return limits
+
+    def _report(self, ok: bool, error: Exception = None):
+        # Loga apenas mudanças de estado para não poluir o log a cada mensagem
+        if ok and not self._available:
+            print(" [RATE LIMIT] Redis disponível novamente.")
+        elif not ok and self._available:
+            print(f" [RATE LIMIT] Aviso: Redis indisponível, limites aplicados apenas neste nó: {error}")
+        self._available = ok
+
+    async def _acquire_redis(self, limits: list) -> tuple:
+        keys = [key for _, key, _, _ in limits]
+        args = [value for _, _, rate, burst in limits for value in (rate, burst)]
+        wait, blocked = await get_async_redis().eval(_TOKEN_BUCKET_SCRIPT, len(keys), *keys, *args)
+        return float(wait), (limits[int(blocked) - 1][0] if int(blocked) else None)
+
+    async def check(self, user_id: str) -> tuple:
+        """(retry_after em segundos, escopo que bloqueou); (0.0, None) libera a mensagem."""
+        limits = self._limits(user_id)
+        if not limits:
+            return 0.0, None
+        if self.backend == "redis":
+            try:
+                result = await self._acquire_redis(limits)
+                self._report(True)
+                return result
+            except Exception as e:
+                self._report(False, e)
+        return self._local.acquire(limits)
+
+
+def throttled_frame(retry_after: float, scope: str) -> dict:
+    """Frame de backpressure enviado ao cliente quando a mensagem é recusada."""
+    retry_after = round(max(retry_after, 0.1), 1)
+    if scope == SCOPE_GLOBAL:
+        content = f"O assistente está com muitas solicitações no momento. Tente novamente em {retry_after:g} s."
+    else:
+        content = f"Você está enviando mensagens rápido demais. Aguarde {retry_after:g} s para enviar a próxima."
+    return {"sender": "SYSTEM", "type": "throttled", "retry_after": retry_after, "scope": scope, "content": content}
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,49 @@
+# backend/app/services/redis_service.py
+
+import redis # type: ignore
+import redis.asyncio as aioredis # type: ignore
+
+from ..config import settings
+
+_async_client = None
+_sync_client = None
+
+
+def get_redis_url() -> str:
+    """Monta a URL do Redis a partir das configurações (REDIS_URL tem prioridade)"""
+    if settings.REDIS_URL:
+        return settings.REDIS_URL
+    return f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/0"
+
+
+def get_async_redis():
+    """Cliente Redis assíncrono compartilhado (API Gateway / event loop)"""
+    global _async_client
+    if _async_client is None:
+        _async_client = aioredis.from_url(
+            get_redis_url(),
+            decode_responses=True,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        )
+    return _async_client
+
+
+def get_sync_redis():
+    """Cliente Redis síncrono compartilhado (IA Worker), com pool de conexões thread-safe"""
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = redis.Redis.from_url(
+            get_redis_url(),
+            decode_responses=True,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        )
+    return _sync_client
+
+
+async def close_async_redis():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
@@ -0,0 +1,99 @@
+# backend/app/services/reply_dispatcher.py
+
+import asyncio
+
+from ..config import settings
+from ..api.websocket import manager
+from .metrics_service import reply_queue_depth, reply_batch_size
+
+
+class ReplyDispatcher:
+    """
+    Entrega respostas do bot aos WebSockets a partir do event loop do servidor.
+
+    As respostas entram numa fila asyncio limitada (a partir do próprio loop com
+    `submit` ou de outras threads com `submit_threadsafe`) e uma task dedicada
+    drena a fila em lotes, enviando para usuários distintos em paralelo e
+    preservando a ordem das mensagens de cada usuário.
+    """
+
+    def __init__(self, maxsize: int = settings.REPLY_QUEUE_MAXSIZE, batch_size: int = settings.REPLY_BATCH_SIZE):
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self._loop = None
+        self._queue = None
+        self._task = None
+
+    def start(self):
+        """Cria a fila e a task de despacho no event loop corrente (lifespan)."""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._task = self._loop.create_task(self._run())
+        print(f" [API] Despachante de respostas iniciado (fila máx. {self.maxsize}, lote {self.batch_size}).")
+
+    async def submit(self, user_id: str, payload: str):
+        """Enfileira uma resposta; aguarda espaço se a fila estiver cheia (backpressure)."""
+        await self._queue.put((user_id, payload))
+        reply_queue_depth.set(self._queue.qsize())
+
+    def submit_threadsafe(self, user_id: str, payload: str, timeout: float = None):
+        """
+        Enfileira a partir de outra thread (ex.: consumidor pika). Bloqueia apenas
+        a thread chamadora enquanto a fila estiver cheia, nunca o event loop.
+        """
+        future = asyncio.run_coroutine_threadsafe(self.submit(user_id, payload), self._loop)
+        return future.result(timeout)
+
+    async def _send_user_batch(self, user_id: str, payloads: list):
+        for payload in payloads:
+            await manager.send_personal_message(payload, user_id)
+
+    async def _dispatch(self, batch: list):
+        # Agrupa por usuário mantendo a ordem de chegada de cada um
+        by_user = {}
+        for user_id, payload in batch:
+            by_user.setdefault(user_id, []).append(payload)
+
+        results = await asyncio.gather(
+            *(self._send_user_batch(user_id, payloads) for user_id, payloads in by_user.items()),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                print(f" [!!!] Erro ao enviar resposta via WebSocket: {result}")
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+
+            reply_queue_depth.set(self._queue.qsize())
+            reply_batch_size.observe(len(batch))
+
+            try:
+                await self._dispatch(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def stop(self, timeout: float = 5.0):
+        """Entrega o que restou na fila (com limite de tempo) e encerra a task."""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f" [!] {self._queue.qsize()} respostas não entregues no desligamento.")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+reply_dispatcher = ReplyDispatcher()
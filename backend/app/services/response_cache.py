@@ -0,0 +1,116 @@
+# backend/app/services/response_cache.py
+
+import re
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from ..config import settings
+from .redis_service import get_sync_redis
+from .metrics_service import ai_cache_requests_total, ai_cache_lookup_seconds
+
+CACHE_KEY_PREFIX = "ai:resp:"
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Normaliza a pergunta para que variações triviais compartilhem a mesma chave:
+    caixa, acentos, espaços repetidos e pontuação nas pontas.
+    """
+    text = unicodedata.normalize("NFKD", prompt.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"\s+", " ", text)
+    return text.strip(" ?!.,;:¿¡\"'")
+
+
+def make_cache_key(prompt: str, model: str, prompt_version: str, context: str = "") -> str:
+    """Chave do cache: pergunta normalizada + modelo + versão do prompt de sistema (+ contexto)"""
+    raw = "\x1f".join([model or "", prompt_version or "", context, normalize_prompt(prompt)])
+    return CACHE_KEY_PREFIX + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Cache de respostas da IA em duas camadas:
+    L1 em memória do processo (LRU com TTL) e L2 no Redis (compartilhado entre Workers, com TTL).
+
+    Falhas do Redis degradam para apenas L1, sem interromper o processamento.
+    """
+
+    def __init__(self, ttl: int = settings.RESPONSE_CACHE_TTL, l1_max_entries: int = settings.RESPONSE_CACHE_L1_SIZE,
+                 use_redis: bool = True):
+        self.ttl = ttl
+        self.l1_max_entries = l1_max_entries
+        self.use_redis = use_redis
+        self._l1 = OrderedDict()  # chave -> (expira_em, resposta)
+        self._lock = threading.Lock()
+        self._redis_available = True
+
+    def _l1_get(self, key: str):
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._l1[key]
+                return None
+            self._l1.move_to_end(key)  # LRU: marca como usada recentemente
+            return value
+
+    def _l1_set(self, key: str, value: str, ttl: int):
+        with self._lock:
+            self._l1[key] = (time.monotonic() + ttl, value)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self.l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _report_redis(self, ok: bool, error: Exception = None):
+        if ok and not self._redis_available:
+            print(" [CACHE] Redis disponível novamente (L2 reativado).")
+        elif not ok and self._redis_available:
+            print(f" [CACHE] Aviso: Redis indisponível, usando apenas cache L1: {error}")
+        self._redis_available = ok
+
+    def get(self, key: str):
+        start = time.perf_counter()
+        value = self._l1_get(key)
+        if value is not None:
+            ai_cache_lookup_seconds.labels(tier="l1").observe(time.perf_counter() - start)
+            ai_cache_requests_total.labels(tier="l1", result="hit").inc()
+            return value
+
+        if self.use_redis:
+            try:
+                value = get_sync_redis().get(key)
+                self._report_redis(True)
+            except Exception as e:
+                self._report_redis(False, e)
+                value = None
+            ai_cache_lookup_seconds.labels(tier="l2").observe(time.perf_counter() - start)
+            if value is not None:
+                ai_cache_requests_total.labels(tier="l2", result="hit").inc()
+                self._l1_set(key, value, self.ttl)
+                return value
+
+        ai_cache_requests_total.labels(tier="all", result="miss").inc()
+        return None
+
+    def set(self, key: str, value: str, ttl: int = None):
+        ttl = ttl or self.ttl
+        self._l1_set(key, value, ttl)
+        if self.use_redis:
+            try:
+                get_sync_redis().set(key, value, ex=ttl)
+                self._report_redis(True)
+            except Exception as e:
+                self._report_redis(False, e)
+
+    def clear_local(self):
+        with self._lock:
+            self._l1.clear()
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,138 @@
+# backend/app/services/retry_queues.py
+"""
+Retentativas com atraso e dead-letter para a fila de requisições da IA.
+
+Em vez de devolver a mensagem à fila com NACK (laço infinito para mensagens
+envenenadas) ou dormir dentro do consumidor (ocupando um slot do Worker), a
+mensagem que falha é republicada numa fila de espera com TTL fixo. Quando o TTL
+expira, o broker a devolve à fila de origem (dead-letter para x.chat_requests):
+cada classe de prioridade tem as suas filas de espera, então uma mensagem bulk
+nunca volta na fila interativa.
+Esgotadas as tentativas, ou se a mensagem nunca puder ser processada (JSON
+inválido, campos ausentes), ela vai para a DLQ para inspeção e replay
+(dlq_cli.py). O Worker confirma (ACK) a original só depois que o broker
+confirma a republicação (publisher confirms no canal do consumidor).
+
+Topologia (as filas de requisição não mudam de argumentos), para <fila> em
+q.ia_request e q.ia_request.bulk:
+    x.chat_requests.retry --<fila>.retry.<ms>--> [TTL] --> x.chat_requests / <fila>
+    x.chat_requests.dlx   --<fila>-->             q.ia_request.dlq
+"""
+
+import json
+from datetime import datetime, timezone
+
+import pika # type: ignore
+
+from ..config import settings
+from .rabbitmq_service import BULK_QUEUE_NAME, request_routing_key
+
+REQUEST_EXCHANGE = "x.chat_requests"
+REQUEST_QUEUE = "q.ia_request"
+REQUEST_QUEUES = (REQUEST_QUEUE, BULK_QUEUE_NAME)
+RETRY_EXCHANGE = "x.chat_requests.retry"
+DEAD_LETTER_EXCHANGE = "x.chat_requests.dlx"
+DEAD_LETTER_QUEUE = "q.ia_request.dlq"
+
+RETRY_COUNT_HEADER = "x-retry-count"
+LAST_ERROR_HEADER = "x-last-error"
+
+
+class PoisonMessageError(Exception):
+    """A mensagem nunca poderá ser processada: vai direto para a DLQ, sem retentativas."""
+
+
+def parse_retry_delays(raw: str = settings.MESSAGE_RETRY_DELAYS_MS) -> list:
+    return [int(delay) for delay in raw.split(",") if delay.strip()]
+
+
+RETRY_DELAYS_MS = parse_retry_delays()
+
+
+def retry_queue_name(delay_ms: int, queue: str = REQUEST_QUEUE) -> str:
+    return f"{queue}.retry.{delay_ms}"
+
+
+def source_queue(body: bytes) -> str:
+    """Fila de requisição de onde a mensagem veio (classe de prioridade do corpo); ilegível = interativa."""
+    try:
+        return request_routing_key(json.loads(body))
+    except (ValueError, AttributeError):
+        return REQUEST_QUEUE
+
+
+def retry_delay_for(retry_count: int, delays: list = None) -> int:
+    """Atraso da próxima tentativa (backoff exponencial pelos níveis configurados)."""
+    delays = delays or RETRY_DELAYS_MS
+    return delays[min(retry_count, len(delays) - 1)]
+
+
+def get_retry_count(properties) -> int:
+    headers = getattr(properties, "headers", None) or {}
+    try:
+        return int(headers.get(RETRY_COUNT_HEADER, 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def is_poison(error: Exception) -> bool:
+    return isinstance(error, (PoisonMessageError, json.JSONDecodeError, UnicodeDecodeError))
+
+
+def declare_retry_topology(channel, delays: list = None):
+    """Declara (idempotente) as exchanges, as filas de espera e a DLQ."""
+    channel.exchange_declare(exchange=RETRY_EXCHANGE, exchange_type="direct", durable=True)
+    channel.exchange_declare(exchange=DEAD_LETTER_EXCHANGE, exchange_type="direct", durable=True)
+    for request_queue in REQUEST_QUEUES:
+        for delay_ms in sorted(set(delays or RETRY_DELAYS_MS)):
+            queue_name = retry_queue_name(delay_ms, request_queue)
+            # TTL por fila (e não por mensagem): todas expiram na ordem de chegada, sem bloqueio na cabeça
+            channel.queue_declare(queue=queue_name, durable=True, arguments={
+                "x-message-ttl": delay_ms,
+                "x-dead-letter-exchange": REQUEST_EXCHANGE,
+                "x-dead-letter-routing-key": request_queue,
+            })
+            channel.queue_bind(exchange=RETRY_EXCHANGE, queue=queue_name, routing_key=queue_name)
+    channel.queue_declare(queue=DEAD_LETTER_QUEUE, durable=True)
+    for request_queue in REQUEST_QUEUES:
+        channel.queue_bind(exchange=DEAD_LETTER_EXCHANGE, queue=DEAD_LETTER_QUEUE, routing_key=request_queue)
+
+
+def retry_or_dead_letter(channel, body: bytes, properties, error: Exception,
+                         max_retries: int = settings.MESSAGE_MAX_RETRIES) -> str:
+    """
+    Republica a mensagem que falhou numa fila de espera ou na DLQ e retorna o
+    destino ("retry" ou "dead_letter"). O canal deve estar em modo de confirmação
+    (`confirm_delivery`): o publish só retorna depois que o broker grava a cópia e
+    levanta exceção em NACK ou se não houver fila de destino (mandatory). Só então
+    o chamador confirma (ACK) a original, no mesmo canal.
+    """
+    retry_count = get_retry_count(properties)
+    origin = source_queue(body)
+    headers = dict(getattr(properties, "headers", None) or {})
+    headers[LAST_ERROR_HEADER] = f"{type(error).__name__}: {error}"[:500]
+
+    if not is_poison(error) and retry_count < max_retries:
+        delay_ms = retry_delay_for(retry_count)
+        headers[RETRY_COUNT_HEADER] = retry_count + 1
+        channel.basic_publish(
+            exchange=RETRY_EXCHANGE,
+            routing_key=retry_queue_name(delay_ms, origin),
+            body=body,
+            properties=pika.BasicProperties(delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE, headers=headers),
+            mandatory=True,
+        )
+        print(f" [RETRY] Tentativa {retry_count + 1}/{max_retries} agendada em {delay_ms} ms: {headers[LAST_ERROR_HEADER]}")
+        return "retry"
+
+    headers["x-failed-at"] = datetime.now(timezone.utc).isoformat()
+    channel.basic_publish(
+        exchange=DEAD_LETTER_EXCHANGE,
+        routing_key=origin,
+        body=body,
+        properties=pika.BasicProperties(delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE, headers=headers),
+        mandatory=True,
+    )
+    reason = "mensagem inválida" if is_poison(error) else f"{retry_count} retentativas esgotadas"
+    print(f" [DLQ] Mensagem enviada para {DEAD_LETTER_QUEUE} ({reason}): {headers[LAST_ERROR_HEADER]}")
+    return "dead_letter"
@@ -0,0 +1,199 @@
+# backend/app/services/semantic_cache.py
+
+import os
+import json
+import time
+import zlib
+import threading
+
+import numpy as np # type: ignore
+
+from ..config import settings
+from .response_cache import normalize_prompt
+from .metrics_service import ai_cache_requests_total, ai_cache_lookup_seconds
+
+# Palavras que não mudam o assunto da pergunta ("explique fotossíntese" ~ "o que é a fotossíntese")
+STOPWORDS = {
+    "o", "a", "os", "as", "um", "uma", "uns", "umas", "de", "da", "do", "das", "dos",
+    "em", "na", "no", "nas", "nos", "e", "que", "qual", "quais", "como", "porque", "por",
+    "para", "pra", "com", "sobre", "me", "eu", "voce", "pode", "poderia", "explique",
+    "explica", "explicar", "defina", "definir", "definicao", "fale", "falar", "diga",
+    "significa", "significado", "conceito", "sao", "seria", "ser", "foi", "funciona", "entre",
+    "isso", "ai",
+}
+
+
+class HashingEmbedder:
+    """
+    Vetorizador leve por hashing (sem modelo externo, só CPU):
+    palavras de conteúdo + trigramas de caracteres, projetados com sinal em `dim`
+    posições e normalizados (norma L2 = 1, então produto interno = cosseno).
+    """
+
+    def __init__(self, dim: int = settings.SEMANTIC_CACHE_DIM, word_weight: float = 1.0, ngram_weight: float = 0.5):
+        self.dim = dim
+        self.word_weight = word_weight
+        self.ngram_weight = ngram_weight
+
+    def _features(self, text: str):
+        words = [w for w in normalize_prompt(text).replace("?", " ").split() if w not in STOPWORDS]
+        for word in words:
+            yield word, self.word_weight
+            padded = f"<{word}>"
+            for i in range(len(padded) - 2):
+                yield padded[i:i + 3], self.ngram_weight
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self._features(text):
+            # crc32 é estável entre processos (hash() do Python é aleatorizado)
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.dim] += weight if (h >> 31) & 1 else -weight
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+
+class SemanticCache:
+    """
+    Cache semântico de respostas: encontra uma pergunta já respondida cujo vetor
+    tenha similaridade de cosseno acima do limiar.
+
+    O índice é uma matriz NumPy (capacidade x dim) com busca vetorizada
+    (um único produto matriz-vetor). Quando `path` é informado, a matriz é um
+    arquivo .npy mapeado em memória (persistido em disco e compartilhado via
+    page cache); as respostas ficam num JSONL append-only ao lado, compactado a
+    cada volta do anel (o arquivo nunca passa de ~2x `capacity` linhas).
+    Ao atingir a capacidade, as entradas mais antigas são sobrescritas (anel).
+    """
+
+    def __init__(self, namespace: str = "default", path: str = settings.SEMANTIC_CACHE_PATH,
+                 capacity: int = settings.SEMANTIC_CACHE_MAX_ENTRIES,
+                 threshold: float = settings.SEMANTIC_CACHE_THRESHOLD,
+                 embedder: HashingEmbedder = None):
+        self.namespace = namespace
+        self.capacity = capacity
+        self.threshold = threshold
+        self.embedder = embedder or HashingEmbedder()
+        self._lock = threading.Lock()
+        self._size = 0
+        self._next_slot = 0
+        self._answers = [None] * capacity
+        self._answers_file = None
+        self._answers_path = None
+
+        if path:
+            self._open_persistent(path)
+        else:
+            self._vectors = np.zeros((capacity, self.embedder.dim), dtype=np.float32)
+
+    # --- Persistência (memory-mapping) ---
+    def _open_persistent(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        base = os.path.join(path, f"semantic_{self.namespace}")
+        vectors_path, answers_path = f"{base}.npy", f"{base}.jsonl"
+        shape = (self.capacity, self.embedder.dim)
+
+        if os.path.exists(vectors_path):
+            self._vectors = np.load(vectors_path, mmap_mode="r+")
+            if self._vectors.shape != shape:
+                print(f" [SEMANTIC] Índice em disco com formato {self._vectors.shape} != {shape}. Recriando.")
+                del self._vectors
+                os.remove(vectors_path)
+                if os.path.exists(answers_path):
+                    os.remove(answers_path)
+                self._vectors = np.lib.format.open_memmap(vectors_path, mode="w+", dtype=np.float32, shape=shape)
+        else:
+            self._vectors = np.lib.format.open_memmap(vectors_path, mode="w+", dtype=np.float32, shape=shape)
+
+        # Reconstrói respostas/posição a partir do log (a última escrita de cada slot vence)
+        self._answers_path = answers_path
+        records = 0
+        if os.path.exists(answers_path):
+            with open(answers_path, encoding="utf-8") as f:
+                for line in f:
+                    records += 1
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # linha parcial de uma escrita interrompida
+                    self._answers[record["slot"]] = record["answer"]
+                    self._size = max(self._size, record["slot"] + 1)
+                    self._next_slot = (record["slot"] + 1) % self.capacity
+            print(f" [SEMANTIC] Índice carregado do disco: {self._size} entradas.")
+        # Buffer de linha: cada resposta chega ao disco junto com a entrada correspondente
+        self._answers_file = open(answers_path, "a", encoding="utf-8", buffering=1)
+        if records > self.capacity:
+            self._compact()  # log de uma versão sem compactação
+
+    def _compact(self):
+        """Reescreve o log só com a resposta atual de cada slot, na ordem do anel (a última é a mais recente)."""
+        tmp_path = f"{self._answers_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for offset in range(self.capacity):
+                slot = (self._next_slot + offset) % self.capacity
+                if self._answers[slot] is not None:
+                    f.write(json.dumps({"slot": slot, "answer": self._answers[slot]}, ensure_ascii=False) + "\n")
+        self._answers_file.close()
+        os.replace(tmp_path, self._answers_path)  # troca atômica: um desligamento no meio não perde o log
+        self._answers_file = open(self._answers_path, "a", encoding="utf-8", buffering=1)
+
+    def flush(self):
+        if isinstance(self._vectors, np.memmap):
+            self._vectors.flush()
+        if self._answers_file is not None:
+            self._answers_file.flush()
+
+    # --- Operações ---
+    def lookup(self, prompt: str):
+        """Retorna (resposta, similaridade) da entrada mais próxima acima do limiar, ou (None, melhor_score)."""
+        start = time.perf_counter()
+        size = self._size
+        if size == 0:
+            ai_cache_requests_total.labels(tier="semantic", result="miss").inc()
+            return None, 0.0
+
+        query = self.embedder.embed(prompt)
+        # A varredura roda sem trava (um `add` concorrente pode sobrescrever slots do anel);
+        # o slot escolhido é reavaliado sob a trava: vetor e resposta lidos juntos, do mesmo par
+        best = int(np.argmax(self._vectors[:size] @ query))
+        with self._lock:
+            score = float(self._vectors[best] @ query)
+            answer = self._answers[best]
+        ai_cache_lookup_seconds.labels(tier="semantic").observe(time.perf_counter() - start)
+
+        if score >= self.threshold and answer is not None:
+            ai_cache_requests_total.labels(tier="semantic", result="hit").inc()
+            return answer, score
+        ai_cache_requests_total.labels(tier="semantic", result="miss").inc()
+        return None, score
+
+    def add(self, prompt: str, answer: str):
+        vector = self.embedder.embed(prompt)
+        with self._lock:
+            slot = self._next_slot
+            self._vectors[slot] = vector
+            self._answers[slot] = answer
+            self._next_slot = (slot + 1) % self.capacity
+            self._size = max(self._size, slot + 1)
+            if self._answers_file is not None:
+                self._answers_file.write(json.dumps({"slot": slot, "answer": answer}, ensure_ascii=False) + "\n")
+                if self._next_slot == 0:
+                    self._compact()  # o anel deu a volta: as linhas anteriores já foram sobrescritas
+
+    def add_vectors(self, vectors: np.ndarray, answers: list):
+        """Inserção em lote de vetores já calculados (aquecimento e benchmark)."""
+        with self._lock:
+            for start in range(0, len(vectors), self.capacity):
+                chunk = vectors[start:start + self.capacity]
+                n = len(chunk)
+                slots = (np.arange(n) + self._next_slot) % self.capacity
+                self._vectors[slots] = chunk
+                for slot, answer in zip(slots.tolist(), answers[start:start + n]):
+                    self._answers[slot] = answer
+                self._size = max(self._size, int(slots.max()) + 1)
+                self._next_slot = int(slots[-1] + 1) % self.capacity
+
+    def __len__(self):
+        return self._size
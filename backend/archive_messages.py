@@ -0,0 +1,124 @@
+"""
+Retenção da tabela messages particionada por mês.
+
+Para cada partição mais antiga que MESSAGE_RETENTION_MONTHS:
+  1. exporta as linhas para MESSAGE_ARCHIVE_DIR (JSONL zstd/gzip ou Parquet);
+  2. confere o número de linhas exportadas;
+  3. desanexa a partição (DETACH) e a remove (DROP), na mesma transação.
+
+Se a exportação falhar, nada é alterado no banco. Também garante as partições
+dos próximos meses, então pode ser agendado (cron) uma vez por dia ou semana.
+
+Uso (a partir de backend/):
+    python archive_messages.py --dry-run
+    python archive_messages.py --retention-months 6 --format parquet
+"""
+
+import asyncio
+import argparse
+import os
+import sys
+from datetime import datetime, timezone
+from sqlalchemy import text # type: ignore
+
+# Adiciona o diretório app ao path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from app.config import settings
+from app.services.database_service import engine
+from app.services.message_partitions import (
+    DEFAULT_PARTITION,
+    PARENT_TABLE,
+    MessageArchiveWriter,
+    archive_path,
+    ensure_future_partitions,
+    is_partitioned,
+    list_partitions,
+    partitions_to_archive,
+)
+
+STREAM_BATCH = 5000
+
+
+async def archive_partition(month, name: str, directory: str, fmt: str, keep_detached: bool) -> int:
+    """Exporta a partição para disco e, se a contagem conferir, a desanexa e remove"""
+    path = archive_path(directory, month, fmt)
+
+    # Leitura em streaming (cursor no servidor): memória constante, qualquer que seja o mês
+    async with engine.connect() as conn:
+        expected = await conn.scalar(text(f"SELECT count(*) FROM {name}"))
+        with MessageArchiveWriter(path, fmt) as writer:
+            result = await conn.stream(
+                text(f"SELECT id, session_id, sender, content, sent_at FROM {name} ORDER BY sent_at"),
+                execution_options={"yield_per": STREAM_BATCH},
+            )
+            async for row in result.mappings():
+                writer.write(dict(row))
+
+    if writer.rows != expected:
+        raise RuntimeError(f"{name}: {writer.rows} linhas exportadas, {expected} esperadas; partição mantida")
+    print(f" [RETENTION] {name}: {writer.rows} mensagens arquivadas em {path}")
+
+    async with engine.begin() as conn:
+        await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+        if keep_detached:
+            print(f" [RETENTION] {name} desanexada (mantida como tabela avulsa).")
+        else:
+            await conn.execute(text(f"DROP TABLE {name}"))
+            print(f" [RETENTION] {name} removida.")
+    return writer.rows
+
+
+async def run_retention(retention_months: int, directory: str, fmt: str, dry_run: bool, keep_detached: bool):
+    async with engine.begin() as conn:
+        if not await is_partitioned(conn):
+            print(" [RETENTION] messages não é particionada. Execute: python migrate_db.py --partition-messages")
+            return
+        created = [] if dry_run else await ensure_future_partitions(conn)
+        partitions = await list_partitions(conn)
+        if DEFAULT_PARTITION in partitions:
+            orphan_rows = await conn.scalar(text(f"SELECT count(*) FROM {DEFAULT_PARTITION}"))
+            if orphan_rows:
+                print(f" [RETENTION] Aviso: {orphan_rows} mensagens na partição {DEFAULT_PARTITION} (fora dos meses criados).")
+
+    if created:
+        print(f" [RETENTION] Partições criadas: {', '.join(created)}")
+
+    today = datetime.now(timezone.utc).date()
+    expired = partitions_to_archive(partitions, today, retention_months)
+    if not expired:
+        print(f" [RETENTION] Nenhuma partição mais antiga que {retention_months} meses.")
+        return
+
+    total = 0
+    for month, name in expired:
+        if dry_run:
+            print(f" [RETENTION] (dry-run) {name} seria arquivada em {archive_path(directory, month, fmt)}")
+            continue
+        total += await archive_partition(month, name, directory, fmt, keep_detached)
+
+    if not dry_run:
+        print(f" [RETENTION] Concluído: {len(expired)} partições, {total} mensagens arquivadas.")
+
+
+async def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description="Arquiva e remove partições antigas de messages")
+    parser.add_argument("--retention-months", type=int, default=settings.MESSAGE_RETENTION_MONTHS)
+    parser.add_argument("--archive-dir", default=settings.MESSAGE_ARCHIVE_DIR)
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default=settings.MESSAGE_ARCHIVE_FORMAT)
+    parser.add_argument("--dry-run", action="store_true", help="apenas lista o que seria arquivado")
+    parser.add_argument("--keep-detached", action="store_true", help="desanexa sem remover a partição")
+    args = parser.parse_args()
+
+    try:
+        await run_retention(args.retention_months, args.archive_dir, args.format, args.dry_run, args.keep_detached)
+    except Exception as e:
+        print(f" [RETENTION ERROR] Falha na retenção: {e}")
+        sys.exit(1)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,119 @@
+# backend/benchmarks/semantic_cache_benchmark.py
+"""
+Benchmark offline do cache semântico: taxa de acerto e latência de busca
+com 10k, 100k e 1M entradas no índice.
+
+Uso (a partir de backend/):
+    python -m benchmarks.semantic_cache_benchmark
+    python -m benchmarks.semantic_cache_benchmark --sizes 10000 100000 --threshold 0.85
+
+O índice é preenchido com vetores aleatórios normalizados (ruído) mais as
+perguntas canônicas abaixo; em seguida são consultadas paráfrases (devem
+acertar) e perguntas de outros assuntos (não devem acertar).
+Memória aproximada: tamanho x dim x 4 bytes (1M x 256 ~ 1 GB).
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np # type: ignore
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.semantic_cache import SemanticCache, HashingEmbedder  # noqa: E402
+
+# Pergunta armazenada -> paráfrases que devem reutilizar a mesma resposta
+CANONICAL_QUESTIONS = {
+    "o que é a fotossíntese": ["explique fotossíntese", "explique a fotossíntese", "fotossíntese o que é?"],
+    "qual a fórmula de bhaskara": ["fórmula de bhaskara", "me explique a fórmula de Bhaskara"],
+    "o que é a mitose": ["explique mitose", "defina mitose"],
+    "como funciona a segunda lei de newton": ["explique a segunda lei de Newton", "segunda lei de newton"],
+    "o que foi a revolução francesa": ["explique a revolução francesa", "fale sobre a Revolução Francesa"],
+    "o que é uma equação do segundo grau": ["explique equação do segundo grau", "equação de segundo grau o que é"],
+    "qual a diferença entre mitose e meiose": ["diferença entre mitose e meiose", "mitose e meiose diferença"],
+    "o que é o teorema de pitágoras": ["explique o teorema de pitágoras", "teorema de Pitágoras"],
+}
+
+# Perguntas de outros assuntos: um acerto aqui é um falso positivo
+UNRELATED_QUESTIONS = [
+    "o que é a respiração celular",
+    "explique a primeira lei de newton",
+    "o que foi a revolução industrial",
+    "qual a fórmula da área do círculo",
+    "o que é a meiose",
+    "explique o teorema de tales",
+    "como estudar para o enem",
+    "o que é uma função afim",
+]
+
+
+def run(size: int, dim: int, threshold: float, rounds: int, seed: int):
+    rng = np.random.default_rng(seed)
+    cache = SemanticCache(path="", capacity=size, threshold=threshold, embedder=HashingEmbedder(dim=dim))
+
+    # Ruído em blocos para não duplicar o índice inteiro na memória
+    filler = size - len(CANONICAL_QUESTIONS)
+    fill_start = time.perf_counter()
+    for start in range(0, filler, 100_000):
+        n = min(100_000, filler - start)
+        block = rng.standard_normal((n, dim), dtype=np.float32)
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        cache.add_vectors(block, [None] * n)
+    for question in CANONICAL_QUESTIONS:
+        cache.add(question, f"resposta: {question}")
+    fill_seconds = time.perf_counter() - fill_start
+
+    paraphrases = [(p, q) for q, variants in CANONICAL_QUESTIONS.items() for p in variants]
+    latencies, hits, wrong_hits, false_hits = [], 0, 0, 0
+    for _ in range(rounds):
+        for prompt, question in paraphrases:
+            start = time.perf_counter()
+            answer, _score = cache.lookup(prompt)
+            latencies.append(time.perf_counter() - start)
+            if answer == f"resposta: {question}":
+                hits += 1
+            elif answer is not None:
+                wrong_hits += 1
+        for prompt in UNRELATED_QUESTIONS:
+            start = time.perf_counter()
+            answer, _score = cache.lookup(prompt)
+            latencies.append(time.perf_counter() - start)
+            if answer is not None:
+                false_hits += 1
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "size": size,
+        "fill_s": fill_seconds,
+        "hit_rate": hits / (len(paraphrases) * rounds),
+        "wrong_hit_rate": wrong_hits / (len(paraphrases) * rounds),
+        "false_hit_rate": false_hits / (len(UNRELATED_QUESTIONS) * rounds),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "index_mb": size * dim * 4 / 1024 / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do cache semântico (taxa de acerto e latência)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--threshold", type=float, default=0.85)
+    parser.add_argument("--rounds", type=int, default=5, help="repetições do conjunto de consultas")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f" [BENCH] dim={args.dim} limiar={args.threshold} rodadas={args.rounds}")
+    print(f" {'entradas':>10} {'índice MB':>10} {'carga s':>8} {'acerto':>8} {'errado':>8} {'falso+':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for size in args.sizes:
+        r = run(size, args.dim, args.threshold, args.rounds, args.seed)
+        print(
+            f" {r['size']:>10} {r['index_mb']:>10.1f} {r['fill_s']:>8.2f} {r['hit_rate']:>8.1%} "
+            f"{r['wrong_hit_rate']:>8.1%} {r['false_hit_rate']:>8.1%} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
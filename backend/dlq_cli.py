@@ -0,0 +1,133 @@
+"""
+Inspeção e replay da dead-letter queue de requisições da IA (q.ia_request.dlq).
+
+Uso (a partir de backend/):
+    python dlq_cli.py stats                 # profundidade da DLQ e das filas de espera
+    python dlq_cli.py list --limit 20       # mostra mensagens sem removê-las
+    python dlq_cli.py replay --limit 100    # devolve mensagens à fila de origem (contador zerado)
+    python dlq_cli.py purge --yes           # descarta todas as mensagens da DLQ
+"""
+
+import os
+import sys
+import json
+import argparse
+
+import pika # type: ignore
+
+# Adiciona o diretório app ao path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from app.services.rabbitmq_service import get_rabbitmq_connection
+from app.services.retry_queues import (
+    DEAD_LETTER_QUEUE,
+    LAST_ERROR_HEADER,
+    REQUEST_EXCHANGE,
+    REQUEST_QUEUES,
+    RETRY_COUNT_HEADER,
+    RETRY_DELAYS_MS,
+    declare_retry_topology,
+    retry_queue_name,
+    source_queue,
+)
+
+
+def queue_depth(channel, queue_name: str) -> int:
+    return channel.queue_declare(queue=queue_name, passive=True).method.message_count
+
+
+def cmd_stats(channel, args):
+    print(f" {DEAD_LETTER_QUEUE}: {queue_depth(channel, DEAD_LETTER_QUEUE)} mensagens")
+    for request_queue in REQUEST_QUEUES:
+        for delay_ms in sorted(set(RETRY_DELAYS_MS)):
+            name = retry_queue_name(delay_ms, request_queue)
+            print(f" {name}: {queue_depth(channel, name)} mensagens")
+
+
+def cmd_list(channel, args):
+    delivery_tags = []
+    for _ in range(args.limit):
+        method, properties, body = channel.basic_get(queue=DEAD_LETTER_QUEUE, auto_ack=False)
+        if method is None:
+            break
+        delivery_tags.append(method.delivery_tag)
+        headers = properties.headers or {}
+        try:
+            preview = json.dumps(json.loads(body), ensure_ascii=False)
+        except ValueError:
+            preview = repr(body)
+        print(f"--- #{len(delivery_tags)} (tentativas: {headers.get(RETRY_COUNT_HEADER, 0)}, "
+              f"falhou em: {headers.get('x-failed-at', '?')})")
+        print(f"    erro: {headers.get(LAST_ERROR_HEADER, '?')}")
+        print(f"    corpo: {preview[:args.width]}")
+    # Apenas inspeção: todas voltam para a DLQ
+    for tag in delivery_tags:
+        channel.basic_nack(delivery_tag=tag, requeue=True)
+    if not delivery_tags:
+        print(" DLQ vazia.")
+
+
+def cmd_replay(channel, args):
+    channel.confirm_delivery()  # só confirma (ACK) na DLQ depois que o broker aceitou a republicação
+    replayed = {}
+    for _ in range(args.limit):
+        method, properties, body = channel.basic_get(queue=DEAD_LETTER_QUEUE, auto_ack=False)
+        if method is None:
+            break
+        headers = dict(properties.headers or {})
+        headers.pop(RETRY_COUNT_HEADER, None)  # nova rodada completa de retentativas
+        headers["x-replayed-from-dlq"] = True
+        # Volta à fila de origem: mensagens bulk não passam à frente do tráfego interativo
+        routing_key = source_queue(body)
+        channel.basic_publish(
+            exchange=REQUEST_EXCHANGE,
+            routing_key=routing_key,
+            body=body,
+            properties=pika.BasicProperties(delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE, headers=headers),
+        )
+        channel.basic_ack(delivery_tag=method.delivery_tag)
+        replayed[routing_key] = replayed.get(routing_key, 0) + 1
+    if not replayed:
+        print(" DLQ vazia.")
+    for routing_key, count in replayed.items():
+        print(f" {count} mensagens devolvidas para {routing_key}.")
+
+
+def cmd_purge(channel, args):
+    if not args.yes:
+        print(" Use --yes para confirmar o descarte de todas as mensagens da DLQ.")
+        sys.exit(1)
+    purged = channel.queue_purge(queue=DEAD_LETTER_QUEUE).method.message_count
+    print(f" {purged} mensagens descartadas de {DEAD_LETTER_QUEUE}.")
+
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description="Inspeção e replay da DLQ de q.ia_request")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="profundidade da DLQ e das filas de espera")
+    list_parser = subparsers.add_parser("list", help="mostra mensagens sem removê-las")
+    list_parser.add_argument("--limit", type=int, default=20)
+    list_parser.add_argument("--width", type=int, default=300, help="caracteres do corpo exibidos")
+    replay_parser = subparsers.add_parser("replay", help="devolve mensagens à fila principal")
+    replay_parser.add_argument("--limit", type=int, default=100)
+    purge_parser = subparsers.add_parser("purge", help="descarta todas as mensagens da DLQ")
+    purge_parser.add_argument("--yes", action="store_true")
+    args = parser.parse_args()
+
+    commands = {"stats": cmd_stats, "list": cmd_list, "replay": cmd_replay, "purge": cmd_purge}
+    try:
+        connection = get_rabbitmq_connection(connection_attempts=2, retry_delay=1)
+    except pika.exceptions.AMQPConnectionError as e:
+        print(f" [!!!] Não foi possível conectar ao RabbitMQ: {e}")
+        sys.exit(1)
+    try:
+        channel = connection.channel()
+        declare_retry_topology(channel)
+        commands[args.command](channel, args)
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
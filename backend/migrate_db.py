@@ -1,13 +1,25 @@
 import asyncio
+import argparse
 import os
 import sys
+from datetime import datetime, timezone
 from sqlalchemy import text # type: ignore
 from dotenv import load_dotenv
 
 # Adiciona o diretório app ao path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
 
-from app.services.database_service import engine, AsyncSessionLocal
+from app.config import settings
+from app.services.database_service import engine
+from app.services.message_partitions import (
+    DEFAULT_PARTITION,
+    add_months,
+    create_partition_sql,
+    ensure_future_partitions,
+    is_partitioned,
+    month_start,
+    months_between,
+)
 
 load_dotenv()
 
@@ -95,14 +107,110 @@ async def migrate_database():
             print(f" [MIGRATION ERROR] Erro durante a migração: {e}")
             raise
 
+MESSAGE_HISTORY_INDEX_SQL = """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_messages_session_sent_at
+    ON messages (session_id, sent_at, id);
+"""
+
+async def migrate_message_indexes(engine=engine):
+    """Cria o índice composto usado pela paginação do histórico de mensagens"""
+    
+    print(" [MIGRATION] Verificando índice ix_messages_session_sent_at...")
+    
+    # CONCURRENTLY não bloqueia gravações em tabelas grandes, mas não pode rodar
+    # dentro de transação: a conexão usa AUTOCOMMIT desde antes da primeira consulta
+    # (o nível de isolamento não pode mudar depois que uma transação começou)
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        if await is_partitioned(conn):
+            # Tabela particionada: o índice é criado no pai (propagado às partições) na conversão
+            print(" [MIGRATION] Tabela messages particionada; índice gerenciado por partição.")
+            return
+        await conn.execute(text(MESSAGE_HISTORY_INDEX_SQL))
+    
+    print(" [MIGRATION] Índice de histórico de mensagens pronto.")
+
+async def migrate_messages_partitioning():
+    """
+    Converte messages numa tabela particionada por mês (RANGE em sent_at).
+    
+    Copia os dados para a nova tabela dentro de uma transação, com a tabela
+    original bloqueada para escrita: execute numa janela de manutenção. A tabela
+    antiga é mantida como messages_unpartitioned para conferência e pode ser
+    removida manualmente depois (DROP TABLE messages_unpartitioned).
+    """
+    
+    async with engine.begin() as conn:
+        if await is_partitioned(conn):
+            print(" [MIGRATION] Tabela messages já é particionada.")
+            return
+        
+        print(" [MIGRATION] Convertendo messages para partições mensais...")
+        await conn.execute(text("LOCK TABLE messages IN EXCLUSIVE MODE"))
+        
+        # A chave de partição precisa fazer parte da chave primária
+        await conn.execute(text("""
+            CREATE TABLE messages_partitioned (
+                id UUID NOT NULL,
+                session_id UUID NOT NULL REFERENCES chat_sessions(id) ON DELETE CASCADE,
+                sender VARCHAR(10) NOT NULL,
+                content TEXT NOT NULL,
+                sent_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (id, sent_at)
+            ) PARTITION BY RANGE (sent_at);
+        """))
+        
+        oldest = await conn.scalar(text("SELECT min(sent_at) FROM messages"))
+        today = datetime.now(timezone.utc).date()
+        last_month = add_months(month_start(today), settings.MESSAGE_PARTITION_MONTHS_AHEAD)
+        months = months_between(oldest or today, last_month)
+        for month in months:
+            await conn.execute(text(create_partition_sql(month, parent="messages_partitioned")))
+        # Rede de segurança para datas fora do intervalo (deve permanecer vazia)
+        await conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF messages_partitioned DEFAULT"))
+        
+        result = await conn.execute(text("""
+            INSERT INTO messages_partitioned (id, session_id, sender, content, sent_at)
+            SELECT id, session_id, sender, content, COALESCE(sent_at, CURRENT_TIMESTAMP) FROM messages
+        """))
+        print(f" [MIGRATION] {result.rowcount} mensagens copiadas para {len(months)} partições.")
+        
+        await conn.execute(text("ALTER INDEX IF EXISTS ix_messages_session_sent_at RENAME TO ix_messages_unpartitioned_session_sent_at"))
+        await conn.execute(text("ALTER TABLE messages RENAME TO messages_unpartitioned"))
+        await conn.execute(text("ALTER TABLE messages_partitioned RENAME TO messages"))
+        await conn.execute(text("CREATE INDEX ix_messages_session_sent_at ON messages (session_id, sent_at, id)"))
+    
+    print(" [MIGRATION] messages particionada. Tabela antiga mantida como messages_unpartitioned.")
+
+async def migrate_message_partitions():
+    """Garante as partições do mês corrente e dos próximos meses (se a tabela for particionada)"""
+    
+    async with engine.begin() as conn:
+        if not await is_partitioned(conn):
+            return
+        created = await ensure_future_partitions(conn)
+    
+    if created:
+        print(f" [MIGRATION] Partições criadas: {', '.join(created)}")
+    else:
+        print(" [MIGRATION] Partições dos próximos meses já existem.")
+
 async def main():
     """Função principal"""
+    parser = argparse.ArgumentParser(description="Migrações do banco de dados do chatbot")
+    parser.add_argument("--partition-messages", action="store_true",
+                        help="converte messages em tabela particionada por mês (janela de manutenção)")
+    args = parser.parse_args()
+    
     try:
         await migrate_database()
+        if args.partition_messages:
+            await migrate_messages_partitioning()
+        await migrate_message_indexes()
+        await migrate_message_partitions()
     except Exception as e:
         print(f" [MIGRATION ERROR] Falha na migração: {e}")
         sys.exit(1)
 
 if __name__ == "__main__":
     asyncio.run(main())
-
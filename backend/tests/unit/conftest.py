@@ -0,0 +1,106 @@
+# backend/tests/unit/conftest.py
+
+import uuid
+import asyncio
+import pytest # type: ignore
+from sqlalchemy import event # type: ignore
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession # type: ignore
+from sqlalchemy.orm import sessionmaker # type: ignore
+from fastapi.testclient import TestClient # type: ignore
+from app import main
+from app.models.models import Base, User
+from app.services.database_service import get_db_session, known_sessions
+from app.services.auth_service import create_access_token, principal_cache
+
+
+def _make_user(user_id: uuid.UUID = None, nome: str = "Ana", sobrenome: str = "Silva", email: str = None,
+               role: str = "USER") -> User:
+    """Usuário ativo com hash de senha fixo (sem bcrypt nos testes)."""
+    return User(id=user_id or uuid.uuid4(), nome=nome, sobrenome=sobrenome,
+                email=email or f"{nome.lower()}@exemplo.com", senha_hash="hash", is_active="ACTIVE", role=role)
+
+
+def _auth_headers(user_id: uuid.UUID) -> dict:
+    return {"Authorization": f"Bearer {create_access_token(data={'sub': str(user_id)})}"}
+
+
+class TestDatabase:
+    """Banco SQLite em arquivo (compartilhado entre o loop do teste e o do TestClient)."""
+
+    __test__ = False  # não é uma classe de testes
+
+    def __init__(self, path):
+        self.engine = create_async_engine(f"sqlite+aiosqlite:///{path}", echo=False)
+        self.session_factory = sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+        self.statements = []  # SQL executado, para os testes que verificam as consultas
+
+        @event.listens_for(self.engine.sync_engine, "before_cursor_execute")
+        def record(conn, cursor, statement, parameters, context, executemany):
+            self.statements.append(statement)
+
+    def seed(self, *steps):
+        """
+        Grava cada passo em ordem (com flush entre eles, respeitando as chaves
+        estrangeiras): um objeto, uma lista de objetos ou uma corrotina `fn(session)`.
+        """
+        async def run():
+            async with self.session_factory() as session:
+                for step in steps:
+                    if callable(step):
+                        await step(session)
+                    else:
+                        session.add_all(step if isinstance(step, (list, tuple)) else [step])
+                    await session.flush()
+                await session.commit()
+
+        asyncio.run(run())
+
+
+@pytest.fixture
+def test_db(tmp_path):
+    db = TestDatabase(tmp_path / "test.db")
+
+    async def create_tables():
+        async with db.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(create_tables())
+    principal_cache.clear()
+    known_sessions.clear()
+    db.statements.clear()
+    yield db
+
+    principal_cache.clear()
+    known_sessions.clear()
+    asyncio.run(db.engine.dispose())
+
+
+@pytest.fixture
+def make_user():
+    """Fábrica de usuários de teste: make_user(nome=..., role=...)."""
+    return _make_user
+
+
+@pytest.fixture
+def auth_headers():
+    """Cabeçalho Authorization com um JWT válido para o id informado."""
+    return _auth_headers
+
+
+@pytest.fixture
+def seeded_user(test_db) -> User:
+    user = _make_user()
+    test_db.seed(user)
+    return user
+
+
+@pytest.fixture
+def db_client(test_db):
+    """TestClient da API com get_db_session apontando para o banco de teste."""
+    async def override_db_session():
+        async with test_db.session_factory() as session:
+            yield session
+
+    main.app.dependency_overrides[get_db_session] = override_db_session
+    yield TestClient(main.app)
+    main.app.dependency_overrides.clear()
@@ -0,0 +1,165 @@
+# backend/tests/unit/test_ai_router.py
+
+import time
+import pytest # type: ignore
+from unittest.mock import patch, MagicMock
+from app.consumers import ia_consumer
+from app.services.ai_router import AIRouter, BackendStats, ProviderBackend, parse_backends, provider_kind
+from app.services.provider_guard import CircuitBreaker, ProviderGuard
+
+
+class TransientError(Exception):
+    retryable = True
+
+
+def make_backend(name: str, latencies=()) -> ProviderBackend:
+    guard = ProviderGuard(name, breaker=CircuitBreaker(name, failure_threshold=100, shared=False), acquire_timeout=1)
+    backend = ProviderBackend(name, f"modelo-{name}", "chave", guard=guard)
+    for latency in latencies:
+        backend.stats.record(latency, ok=True)
+    return backend
+
+
+def test_stats_percentiles_and_error_rate():
+    stats = BackendStats(window=10)
+    for latency in (0.1, 0.2, 0.3, 0.4, 5.0):
+        stats.record(latency, ok=True)
+    stats.record(30.0, ok=False)
+
+    assert stats.percentile(0.5) == 0.3
+    assert stats.percentile(0.95) == 5.0
+    assert stats.error_rate() == pytest.approx(1 / 6)
+
+
+def test_routes_to_fastest_healthy_backend():
+    slow = make_backend("lento", [2.0] * 10)
+    fast = make_backend("rapido", [0.2] * 10)
+    failing = make_backend("falhando", [0.1] * 4)
+    for _ in range(6):
+        failing.stats.record(0.1, ok=False)
+    router = AIRouter([slow, failing, fast], hedge_enabled=False, min_samples=5, max_error_rate=0.5, explore_ratio=0)
+
+    assert [b.name for b in router.ranked()] == ["rapido", "lento", "falhando"]
+    assert router.call(lambda backend: backend.name) == "rapido"
+
+
+def test_fails_over_on_error_and_raises_transient_error_when_all_fail():
+    first, second = make_backend("a"), make_backend("b")
+    router = AIRouter([first, second], hedge_enabled=False, explore_ratio=0)
+
+    def only_b_works(backend):
+        if backend.name == "a":
+            raise TransientError("429")
+        return "resposta de b"
+
+    assert router.call(only_b_works) == "resposta de b"
+    assert first.stats.error_rate() == 1.0
+
+    def all_fail(backend):
+        raise TransientError(backend.name) if backend.name == "a" else ValueError("401")
+
+    with pytest.raises(TransientError):
+        router.call(all_fail)
+
+
+def test_hedged_request_after_p95_returns_fastest_answer():
+    primary = make_backend("primario", [0.05] * 10)
+    secondary = make_backend("secundario", [0.1] * 10)
+    router = AIRouter([primary, secondary], hedge_enabled=True, hedge_quantile=0.95, hedge_min_delay=0.05,
+                      min_samples=5, explore_ratio=0)
+
+    def primary_stalls(backend):
+        time.sleep(1.0 if backend.name == "primario" else 0.05)
+        return backend.name
+
+    start = time.monotonic()
+    assert router.call(primary_stalls) == "secundario"
+    assert time.monotonic() - start < 0.5
+
+
+def test_no_hedge_without_latency_samples():
+    primary, secondary = make_backend("primario"), make_backend("secundario")
+    router = AIRouter([primary, secondary], hedge_enabled=True, min_samples=5, explore_ratio=0)
+    called = []
+
+    def record(backend):
+        called.append(backend.name)
+        time.sleep(0.05)
+        return backend.name
+
+    assert router.call(record) == "primario"
+    assert called == ["primario"]
+
+
+def test_parse_backends_reads_per_backend_credentials():
+    env = {"AI_API_KEY_GROQ": "chave-groq", "AI_API_KEY_GEMINI": "chave-gemini", "AI_API_URL_GEMINI": "http://proxy"}
+    with patch.dict("os.environ", env):
+        backends = parse_backends("groq=llama-3.3-70b-versatile, gemini=gemini-2.0-flash")
+
+    assert [(b.name, b.kind, b.api_key) for b in backends] == [
+        ("groq", "groq", "chave-groq"),
+        ("gemini", "gemini", "chave-gemini"),
+    ]
+    assert backends[1].api_url == "http://proxy"
+    # Orçamento de retentativas compartilhado entre os backends
+    assert backends[0].guard.retry_budget is backends[1].guard.retry_budget
+    assert parse_backends("") == []
+    assert provider_kind("deepseek-chat") == "deepseek"
+    with pytest.raises(ValueError):
+        parse_backends("sem-modelo")
+
+
+def test_backend_reuses_pooled_session_and_single_sdk_client():
+    backend = make_backend("gemini")
+    created = []
+
+    def factory():
+        created.append(object())
+        return created[-1]
+
+    clients = {backend.sdk_client(factory) for _ in range(5)}
+
+    assert len(created) == 1 and clients == {created[0]}
+    adapter = backend.http.get_adapter("https://api.openai.com/v1/chat/completions")
+    assert adapter._pool_maxsize == ia_consumer.settings.AI_HTTP_POOL_SIZE
+    assert adapter.max_retries.total == 0
+
+
+def test_provider_call_goes_through_backend_session_with_timeouts():
+    backend = ProviderBackend("openai", "gpt-teste", "chave")
+    response = MagicMock(status_code=200)
+    response.json.return_value = {"choices": [{"message": {"content": "resposta"}}]}
+
+    with patch.object(backend.http, "post", return_value=response) as mock_post:
+        assert ia_consumer._call_provider("Explique a mitose", [], backend) == "resposta"
+        assert ia_consumer._call_provider("Explique a meiose", [], backend) == "resposta"
+
+    assert mock_post.call_count == 2
+    assert mock_post.call_args.kwargs["timeout"] == (
+        ia_consumer.settings.AI_HTTP_CONNECT_TIMEOUT, ia_consumer.settings.AI_HTTP_READ_TIMEOUT
+    )
+    assert mock_post.call_args.kwargs["headers"]["Authorization"] == "Bearer chave"
+
+
+def test_streamed_responses_feed_backend_stats():
+    backend = make_backend("stream")
+    router = AIRouter([backend], hedge_enabled=False, explore_ratio=0)
+
+    def broken_stream(*args, **kwargs):
+        raise TransientError("503")
+        yield  # gerador
+
+    with patch.object(ia_consumer, "ai_router", router), \
+         patch.object(ia_consumer, "AI_API_KEY", "chave"), \
+         patch.object(ia_consumer, "get_cached_response", return_value=None), \
+         patch.object(ia_consumer, "store_cached_response"), \
+         patch.object(ia_consumer, "call_external_ai_api", return_value="fallback"), \
+         patch.object(ia_consumer.connection_registry, "lookup", return_value=None), \
+         patch.object(ia_consumer.response_publisher, "publish", return_value=True):
+        with patch.object(ia_consumer, "stream_external_ai_api", return_value=iter(["Olá", " mundo"])):
+            ia_consumer.stream_response("user-1", "explique fotossíntese")
+        with patch.object(ia_consumer, "stream_external_ai_api", side_effect=broken_stream):
+            ia_consumer.stream_response("user-1", "explique fotossíntese")
+
+    assert len(backend.stats) == 2
+    assert backend.stats.error_rate() == 0.5
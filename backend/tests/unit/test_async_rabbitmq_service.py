@@ -0,0 +1,74 @@
+# backend/tests/unit/test_async_rabbitmq_service.py
+
+import pytest # type: ignore
+import json
+from unittest.mock import patch, AsyncMock, MagicMock
+from app.services import async_rabbitmq_service
+from app.services.async_rabbitmq_service import AsyncRabbitMQ, publish_request, EXCHANGE_NAME, QUEUE_NAME
+
+
+@pytest.mark.asyncio
+async def test_publish_request_falls_back_to_pika_when_disconnected():
+
+    test_data = {"user_id": "test_ws", "content": "Hello"}
+
+    with patch.object(async_rabbitmq_service, "broker", AsyncRabbitMQ()), \
+         patch.object(async_rabbitmq_service, "publish_message_async", AsyncMock(return_value=True)) as mock_fallback:
+        result = await publish_request(test_data)
+
+    # Sem conexão aio-pika, a publicação usa o pool pika fora do event loop
+    mock_fallback.assert_awaited_once_with(test_data)
+    assert result is True
+
+
+@pytest.mark.asyncio
+async def test_broker_publish_uses_pooled_channel():
+
+    broker = AsyncRabbitMQ()
+    exchange = MagicMock()
+    exchange.publish = AsyncMock()
+    channel = MagicMock()
+    channel.get_exchange = AsyncMock(return_value=exchange)
+
+    # Simula o pool de canais do aio-pika
+    acquire_ctx = MagicMock()
+    acquire_ctx.__aenter__ = AsyncMock(return_value=channel)
+    acquire_ctx.__aexit__ = AsyncMock(return_value=False)
+    broker._channel_pool = MagicMock()
+    broker._channel_pool.acquire.return_value = acquire_ctx
+
+    test_data = {"user_id": "test_ws", "content": "Hello"}
+    result = await broker.publish(EXCHANGE_NAME, QUEUE_NAME, test_data)
+
+    assert result is True
+    channel.get_exchange.assert_awaited_once_with(EXCHANGE_NAME, ensure=False)
+    message = exchange.publish.await_args.args[0]
+    assert json.loads(message.body) == test_data
+    assert exchange.publish.await_args.kwargs["routing_key"] == QUEUE_NAME
+
+
+@pytest.mark.asyncio
+async def test_consume_closes_its_channel_when_the_iterator_exits():
+
+    broker = AsyncRabbitMQ()
+    queue_iter = MagicMock()
+    queue_iter.__aenter__ = AsyncMock(return_value=queue_iter)
+    queue_iter.__aexit__ = AsyncMock(return_value=False)
+    queue_iter.__aiter__ = MagicMock(return_value=queue_iter)
+    queue_iter.__anext__ = AsyncMock(side_effect=["msg-1", "msg-2"])
+    queue = MagicMock()
+    queue.iterator.return_value = queue_iter
+    channel = MagicMock(is_closed=False)
+    channel.set_qos = AsyncMock()
+    channel.declare_queue = AsyncMock(return_value=queue)
+    channel.close = AsyncMock()
+    broker._connection = MagicMock()
+    broker._connection.channel = AsyncMock(return_value=channel)
+
+    messages = broker.consume(QUEUE_NAME)
+    assert await messages.__anext__() == "msg-1"
+    channel.close.assert_not_awaited()
+
+    # Consumidor reiniciado (TaskGroup cancelado): o canal não pode ficar aberto na conexão
+    await messages.aclose()
+    channel.close.assert_awaited_once()
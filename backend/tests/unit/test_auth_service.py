@@ -0,0 +1,45 @@
+# backend/tests/unit/test_auth_service.py
+
+import time
+import asyncio
+import pytest # type: ignore
+from app.services.auth_service import (
+    PLACEHOLDER_PASSWORD_HASH,
+    get_password_hash_async,
+    verify_password,
+    verify_password_async,
+)
+
+
+@pytest.mark.asyncio
+async def test_async_hash_roundtrip():
+
+    hashed = await get_password_hash_async("senha-segura")
+    assert await verify_password_async("senha-segura", hashed) is True
+    assert await verify_password_async("senha-errada", hashed) is False
+
+
+def test_placeholder_hash_never_verifies():
+
+    assert verify_password("temp123", PLACEHOLDER_PASSWORD_HASH) is False
+    assert verify_password("", PLACEHOLDER_PASSWORD_HASH) is False
+
+
+@pytest.mark.asyncio
+async def test_hashing_does_not_block_event_loop():
+
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.gather(*(get_password_hash_async(f"senha-{i}") for i in range(4)))
+    ticker_task.cancel()
+
+    # Com o bcrypt no pool, o loop continua atendendo outras tarefas durante os hashes
+    gaps = [b - a for a, b in zip(ticks, ticks[1:])]
+    assert len(ticks) > 3
+    assert max(gaps) < 0.15
@@ -0,0 +1,40 @@
+# backend/tests/unit/test_connection_routing.py
+
+import pytest # type: ignore
+from unittest.mock import patch, AsyncMock
+from app.consumers import ia_consumer
+from app.consumers import response_consumer
+from app.services.rabbitmq_service import RESPONSE_QUEUE_NAME, RESPONSE_EXCHANGE_NAME, node_routing_key
+
+
+@pytest.mark.parametrize("registry_node, reply_to, expected_key", [
+    ("gw-b-1", "gw-a-1", node_routing_key("gw-b-1")),  # o registro (reconexão recente) tem prioridade
+    (None, "gw-a-1", node_routing_key("gw-a-1")),      # fallback para o nó de origem da requisição
+    (None, None, RESPONSE_QUEUE_NAME),                 # sem informação: fila compartilhada
+])
+def test_publish_response_routes_to_node(registry_node, reply_to, expected_key):
+
+    with patch.object(ia_consumer.connection_registry, "lookup", return_value=registry_node), \
+         patch.object(ia_consumer.response_publisher, "publish", return_value=True) as mock_publish:
+        assert ia_consumer.publish_response("user-1", "resposta", reply_to) is True
+
+    exchange, routing_key, payload = mock_publish.call_args.args
+    assert exchange == RESPONSE_EXCHANGE_NAME
+    assert routing_key == expected_key
+    assert payload["user_id"] == "user-1"
+
+
+@pytest.mark.asyncio
+async def test_shared_queue_reply_is_forwarded_to_owner_node():
+
+    response_data = {"user_id": "user-remoto", "bot_content": "resposta"}
+    fake_broker = AsyncMock()
+    fake_broker.publish.return_value = True
+
+    with patch.object(response_consumer, "broker", fake_broker), \
+         patch.object(response_consumer.connection_registry, "lookup_async", AsyncMock(return_value="gw-outro-1")), \
+         patch.object(response_consumer.reply_dispatcher, "submit", AsyncMock()) as mock_submit:
+        await response_consumer.handle_response(response_data, from_shared_queue=True)
+
+    fake_broker.publish.assert_awaited_once_with(RESPONSE_EXCHANGE_NAME, node_routing_key("gw-outro-1"), response_data)
+    mock_submit.assert_not_awaited()
@@ -0,0 +1,80 @@
+# backend/tests/unit/test_context_store.py
+
+from unittest.mock import MagicMock, patch
+from app.consumers import ia_consumer
+from app.services.context_store import ConversationContext, trim_to_budget
+from app.services.response_cache import ResponseCache
+
+
+def test_history_is_warmed_once_then_served_from_the_ring():
+
+    loader = MagicMock(return_value=[
+        {"role": "user", "content": "O que é mitose?"},
+        {"role": "assistant", "content": "Divisão celular."},
+    ])
+    context = ConversationContext(loader=loader, max_turns=4, use_redis=False)
+
+    assert len(context.get_history("sessao-1")) == 2
+    context.append("sessao-1", "E a meiose?", "Outra divisão celular.")
+    context.append("sessao-1", "Qual a diferença?", "O número de células-filhas.")
+
+    history = context.get_history("sessao-1")
+    loader.assert_called_once_with("sessao-1", 4)  # sem nova consulta ao banco
+    assert [turn["content"] for turn in history] == [
+        "E a meiose?", "Outra divisão celular.", "Qual a diferença?", "O número de células-filhas."
+    ]
+
+
+def test_trim_to_budget_keeps_most_recent_turns_starting_with_user():
+
+    history = [
+        {"role": "user", "content": "a" * 400},
+        {"role": "assistant", "content": "b" * 400},
+        {"role": "user", "content": "c" * 40},
+        {"role": "assistant", "content": "d" * 40},
+    ]
+    trimmed = trim_to_budget(history, token_budget=150)
+    assert [turn["content"][0] for turn in trimmed] == ["c", "d"]
+
+
+def test_worker_sends_history_and_keys_cache_by_context():
+
+    context = ConversationContext(loader=lambda session_id, limit: [], use_redis=False)
+    message = '{"user_id": "sessao-ctx", "content": "Explique a meiose"}'
+
+    with patch.object(ia_consumer, "conversation_context", context), \
+         patch.object(ia_consumer, "response_cache", ResponseCache(use_redis=False)), \
+         patch.object(ia_consumer, "AI_API_KEY", "chave-teste"), \
+         patch.object(ia_consumer, "STREAM_RESPONSES", False), \
+         patch.object(ia_consumer, "_call_provider", side_effect=["resposta 1", "resposta 2"]) as mock_provider, \
+         patch.object(ia_consumer, "run_db"), \
+         patch.object(ia_consumer, "message_writer"), \
+         patch.object(ia_consumer, "publish_response"):
+        ia_consumer.handle_message(message)
+        ia_consumer.handle_message(message)  # mesma pergunta, agora com histórico: não é acerto de cache
+
+    first_history, second_history = (call.args[1] for call in mock_provider.call_args_list)
+    assert first_history == []
+    assert second_history == [
+        {"role": "user", "content": "Explique a meiose"},
+        {"role": "assistant", "content": "resposta 1"},
+    ]
+
+
+def test_cache_scope_lets_standalone_questions_hit_across_conversations():
+
+    history = [{"role": "user", "content": "Oi"}, {"role": "assistant", "content": "Olá! Como posso ajudar?"}]
+    question = "Explique a fase S do ciclo celular"
+
+    with patch.object(ia_consumer, "response_cache", ResponseCache(use_redis=False)), \
+         patch.object(ia_consumer, "semantic_cache", None):
+        ia_consumer.store_cached_response(question, "resposta sem histórico")  # primeira mensagem de outra sessão
+        ia_consumer.store_cached_response("e o segundo?", "resposta de outra conversa")
+
+        with patch.object(ia_consumer.settings, "CACHE_CONTEXT_SCOPE", "auto"):
+            assert ia_consumer.get_cached_response(question, history) == "resposta sem histórico"
+            assert ia_consumer.get_cached_response("e o segundo?", history) is None  # depende da conversa
+        with patch.object(ia_consumer.settings, "CACHE_CONTEXT_SCOPE", "context"):
+            assert ia_consumer.get_cached_response(question, history) is None
+        with patch.object(ia_consumer.settings, "CACHE_CONTEXT_SCOPE", "prompt"):
+            assert ia_consumer.get_cached_response("e o segundo?", history) == "resposta de outra conversa"
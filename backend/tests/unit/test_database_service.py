@@ -6,8 +6,7 @@ import uuid
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession # type: ignore
 from sqlalchemy.orm import sessionmaker # type: ignore
 from sqlalchemy.future import select # type: ignore
-from sqlalchemy import text # type: ignore
-from app.services.database_service import Base, save_message
+from app.services.database_service import Base, save_message, ensure_users_and_sessions, known_sessions
 from app.models.models import User, Message, ChatSession
 
 # --- Setup de Ambiente de Teste (DB em Memória) ---
@@ -41,6 +40,8 @@ async def async_session_test():
         engine, class_=AsyncSession, expire_on_commit=False
     )
 
+    known_sessions.clear()  # cada teste usa um banco novo
+
     # 3. Fornece a sessão para o teste e garante o rollback (limpeza)
     async with AsyncSessionLocalTest() as session:
         yield session
@@ -104,4 +105,51 @@ async def test_save_message_invalid_session_id(async_session_test: AsyncSession)
     
     assert saved_message is not None
     assert saved_message.sender == "BOT"
-    assert saved_message.content == "Resposta falsa."
\ No newline at end of file
+    assert saved_message.content == "Resposta falsa."
+
+@pytest.mark.asyncio
+async def test_known_session_skips_existence_upsert(async_session_test: AsyncSession):
+
+    session_id = str(uuid.uuid4())
+    assert await save_message(async_session_test, session_id, "USER", "Primeira mensagem") is True
+    assert uuid.UUID(session_id) in known_sessions
+
+    # Sessão conhecida: nenhuma instrução além do INSERT da mensagem
+    assert await ensure_users_and_sessions(async_session_test, [uuid.UUID(session_id)]) == []
+    assert await save_message(async_session_test, session_id, "BOT", "Resposta") is True
+
+    result = await async_session_test.execute(select(Message).where(Message.session_id == uuid.UUID(session_id)))
+    assert len(result.scalars().all()) == 2
+
+
+@pytest.mark.asyncio
+async def test_upsert_tolerates_existing_rows_after_cache_invalidation(async_session_test: AsyncSession):
+
+    session_id = str(uuid.uuid4())
+    assert await save_message(async_session_test, session_id, "USER", "Antes") is True
+
+    # Cache perdido (outro processo, TTL expirado): o upsert não falha com linhas existentes
+    known_sessions.invalidate(uuid.UUID(session_id))
+    assert await save_message(async_session_test, session_id, "USER", "Depois") is True
+
+    sessions = await async_session_test.execute(select(ChatSession).where(ChatSession.id == uuid.UUID(session_id)))
+    assert len(sessions.scalars().all()) == 1
+
+
+@pytest.mark.asyncio
+async def test_existing_chat_session_never_gets_temporary_user(async_session_test: AsyncSession):
+
+    user_id, session_id = uuid.uuid4(), uuid.uuid4()
+    async_session_test.add(User(id=user_id, nome="Ana", sobrenome="Silva", email="ana@exemplo.com",
+                                senha_hash="hash", is_active="ACTIVE", role="USER"))
+    await async_session_test.flush()
+    async_session_test.add(ChatSession(id=session_id, user_id=user_id, status="ACTIVE"))
+    await async_session_test.commit()
+
+    # Sessão de login fora do cache (TTL expirado, outra réplica, reinício), com ou sem verificação
+    assert await save_message(async_session_test, str(session_id), "USER", "Pergunta") is True
+    known_sessions.clear()
+    assert await save_message(async_session_test, str(session_id), "BOT", "Resposta", verified=True) is True
+
+    users = await async_session_test.execute(select(User))
+    assert [user.id for user in users.scalars().all()] == [user_id]
@@ -0,0 +1,80 @@
+# backend/tests/unit/test_fair_scheduler.py
+
+import json
+from app.services import rabbitmq_service
+from app.services.fair_scheduler import FairScheduler, PriorityClassifier, PRIORITY_BULK, PRIORITY_INTERACTIVE
+from app.consumers import ia_consumer
+
+
+def test_classifier_marks_burst_excess_as_bulk_and_recovers_after_window():
+    classifier = PriorityClassifier(burst=3, window=10.0)
+
+    first = [classifier.classify("aluno-a", now=t) for t in (0.0, 0.1, 0.2, 0.3, 0.4)]
+
+    assert first == [PRIORITY_INTERACTIVE] * 3 + [PRIORITY_BULK] * 2
+    # Outro usuário não é afetado pela rajada
+    assert classifier.classify("aluno-b", now=0.5) == PRIORITY_INTERACTIVE
+    # Passada a janela, o usuário volta a ser interativo
+    assert classifier.classify("aluno-a", now=20.0) == PRIORITY_INTERACTIVE
+
+
+def test_drr_alternates_between_users():
+    scheduler = FairScheduler(quantum=10, interactive_weight=4)
+    for i in range(5):
+        scheduler.put("pesado", f"pesado-{i}")
+    scheduler.put("leve", "leve-0")
+
+    order = [scheduler.get(timeout=0)[0] for _ in range(len(scheduler))]
+
+    # A mensagem do usuário leve é atendida logo após a primeira do usuário pesado
+    assert order[:2] == ["pesado-0", "leve-0"]
+    assert scheduler.get(timeout=0) is None
+
+
+def test_expensive_messages_need_more_turns():
+    scheduler = FairScheduler(quantum=10, interactive_weight=1)
+    scheduler.put("longo", "prompt-longo", cost=30)
+    for i in range(3):
+        scheduler.put("curto", f"curto-{i}", cost=5)
+
+    order = [scheduler.get(timeout=0)[0] for _ in range(4)]
+
+    # 30 tokens com quantum 10: três visitas, enquanto o usuário de prompts curtos é atendido a cada visita
+    assert order == ["curto-0", "curto-1", "prompt-longo", "curto-2"]
+
+
+def test_bulk_backlog_does_not_starve_interactive_user():
+    scheduler = FairScheduler(quantum=256, interactive_weight=4)
+    for i in range(50):
+        scheduler.put("colou-50", f"bulk-{i}", PRIORITY_BULK)
+    scheduler.put("outro-aluno", "pergunta", PRIORITY_INTERACTIVE)
+
+    item, priority, waited = scheduler.get(timeout=0)
+
+    assert (item, priority) == ("pergunta", PRIORITY_INTERACTIVE)
+    assert waited >= 0
+    assert scheduler.depth(PRIORITY_BULK) == 50
+
+
+def test_bulk_keeps_progressing_under_interactive_load():
+    scheduler = FairScheduler(quantum=256, interactive_weight=4)
+    for i in range(20):
+        scheduler.put(f"aluno-{i}", f"interativa-{i}", PRIORITY_INTERACTIVE)
+    scheduler.put("colou-50", "bulk-0", PRIORITY_BULK)
+
+    priorities = [scheduler.get(timeout=0)[1] for _ in range(5)]
+
+    assert PRIORITY_BULK in priorities
+
+
+def test_bulk_priority_routes_to_bulk_queue():
+    assert rabbitmq_service.request_routing_key({"priority": PRIORITY_BULK}) == rabbitmq_service.BULK_QUEUE_NAME
+    assert rabbitmq_service.request_routing_key({"priority": PRIORITY_INTERACTIVE}) == rabbitmq_service.QUEUE_NAME
+    assert rabbitmq_service.request_routing_key({}) == rabbitmq_service.QUEUE_NAME
+
+
+def test_scheduling_key_reads_user_priority_and_cost():
+    body = json.dumps({"user_id": "u1", "content": "x" * 400, "priority": PRIORITY_BULK}).encode()
+
+    assert ia_consumer.scheduling_key(body) == ("u1", PRIORITY_BULK, 101)
+    assert ia_consumer.scheduling_key(b"nao-json") == ("", PRIORITY_INTERACTIVE, 1)
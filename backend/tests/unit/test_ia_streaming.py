@@ -0,0 +1,101 @@
+# backend/tests/unit/test_ia_streaming.py
+
+import pytest # type: ignore
+from unittest.mock import patch, MagicMock
+from app.consumers import ia_consumer
+from app.services.response_cache import ResponseCache
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache():
+    # Cada teste usa um cache vazio e sem Redis
+    with patch.object(ia_consumer, "response_cache", ResponseCache(use_redis=False)):
+        yield
+
+
+def _published_frames(mock_publish):
+    return [c.args[2] for c in mock_publish.call_args_list]
+
+
+def test_iter_sse_data_stops_at_done_marker():
+
+    response = MagicMock()
+    response.iter_lines.return_value = iter([
+        'data: {"choices": [{"delta": {"content": "Olá"}}]}',
+        '',
+        ': comentário keep-alive',
+        'data: [DONE]',
+        'data: {"ignorado": true}',
+    ])
+
+    assert list(ia_consumer._iter_sse_data(response)) == ['{"choices": [{"delta": {"content": "Olá"}}]}']
+    assert response.encoding == "utf-8"
+
+
+def test_stream_response_publishes_sequenced_chunks_and_end_marker():
+
+    with patch.object(ia_consumer, "AI_API_KEY", "chave"), \
+         patch.object(ia_consumer, "STREAM_FLUSH_CHARS", 1), \
+         patch.object(ia_consumer, "stream_external_ai_api", return_value=iter(["Olá", ", ", "mundo"])), \
+         patch.object(ia_consumer.connection_registry, "lookup", return_value=None), \
+         patch.object(ia_consumer.response_publisher, "publish", return_value=True) as mock_publish:
+        result = ia_consumer.stream_response("user-1", "explique fotossíntese", "gw-a-1")
+
+    frames = _published_frames(mock_publish)
+    assert result == "Olá, mundo"
+    assert [f["type"] for f in frames] == ["chunk", "chunk", "chunk", "end"]
+    assert [f["seq"] for f in frames] == [0, 1, 2, 3]
+    assert [f["bot_content"] for f in frames[:3]] == ["Olá", ", ", "mundo"]
+    assert frames[-1]["bot_content"] == "Olá, mundo"
+    assert len({f["stream_id"] for f in frames}) == 1
+
+
+def test_stream_response_falls_back_when_stream_fails_before_first_token():
+
+    with patch.object(ia_consumer, "AI_API_KEY", "chave"), \
+         patch.object(ia_consumer, "stream_external_ai_api", side_effect=RuntimeError("Status 500")), \
+         patch.object(ia_consumer, "call_external_ai_api", return_value="resposta completa") as mock_call, \
+         patch.object(ia_consumer.connection_registry, "lookup", return_value=None), \
+         patch.object(ia_consumer.response_publisher, "publish", return_value=True) as mock_publish:
+        result = ia_consumer.stream_response("user-1", "explique fotossíntese")
+
+    mock_call.assert_called_once()
+    frames = _published_frames(mock_publish)
+    assert result == "resposta completa"
+    assert [(f["type"], f["seq"], f["bot_content"]) for f in frames] == [("end", 0, "resposta completa")]
+
+
+def test_stream_failure_mid_answer_sends_truncated_end_and_skips_cache():
+
+    def broken_stream(*args, **kwargs):
+        yield "A fotossíntese"
+        raise ConnectionError("conexão encerrada")
+
+    with patch.object(ia_consumer, "AI_API_KEY", "chave"), \
+         patch.object(ia_consumer, "STREAM_FLUSH_CHARS", 1), \
+         patch.object(ia_consumer, "stream_external_ai_api", side_effect=broken_stream), \
+         patch.object(ia_consumer, "store_cached_response") as mock_store, \
+         patch.object(ia_consumer, "call_external_ai_api") as mock_call, \
+         patch.object(ia_consumer.connection_registry, "lookup", return_value=None), \
+         patch.object(ia_consumer.response_publisher, "publish", return_value=True) as mock_publish:
+        result = ia_consumer.stream_response("user-1", "explique fotossíntese")
+
+    frames = _published_frames(mock_publish)
+    assert isinstance(result, ia_consumer.ErrorResponse)  # não entra no contexto da conversa
+    assert result.startswith("A fotossíntese") and ia_consumer.STREAM_INTERRUPTED_MESSAGE in result
+    assert [f["type"] for f in frames] == ["chunk", "end"]
+    assert frames[-1]["truncated"] is True
+    mock_store.assert_not_called()
+    mock_call.assert_not_called()
+
+
+def test_stream_fallback_keeps_retry_path():
+
+    with patch.object(ia_consumer, "AI_API_KEY", "chave"), \
+         patch.object(ia_consumer, "stream_external_ai_api", side_effect=RuntimeError("Status 429")), \
+         patch.object(ia_consumer, "call_external_ai_api", return_value="resposta") as mock_call, \
+         patch.object(ia_consumer.connection_registry, "lookup", return_value=None), \
+         patch.object(ia_consumer.response_publisher, "publish", return_value=True):
+        ia_consumer.stream_response("user-1", "explique fotossíntese", allow_retry=True)
+
+    assert mock_call.call_args.kwargs["allow_retry"] is True
@@ -0,0 +1,49 @@
+# backend/tests/unit/test_ia_worker_concurrency.py
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch, MagicMock
+from app.consumers import ia_consumer
+
+
+class FakeConnection:
+    """Executa os callbacks agendados como faria a thread da conexão pika"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    def add_callback_threadsafe(self, callback):
+        with self.lock:
+            callback()
+
+
+def test_concurrent_callback_keeps_many_requests_in_flight():
+
+    channel = MagicMock()
+    channel.is_open = True
+    connection = FakeConnection()
+
+    def slow_handle(body, retry_count=0):
+        time.sleep(0.2)  # Simula a chamada à IA (I/O-bound)
+        if body == b"falha":
+            raise RuntimeError("erro no provedor")
+
+    executor = ThreadPoolExecutor(max_workers=8)
+    with patch.object(ia_consumer, "_executor", executor), \
+         patch.object(ia_consumer, "handle_message", side_effect=slow_handle):
+        start = time.time()
+        for tag, body in enumerate([b"ok"] * 7 + [b"falha"], start=1):
+            method = MagicMock(delivery_tag=tag)
+            ia_consumer.concurrent_callback(connection, channel, method, None, body)
+        executor.shutdown(wait=True)
+        elapsed = time.time() - start
+
+    # 8 chamadas de 0,2s em paralelo terminam bem antes de 8 x 0,2s
+    assert elapsed < 1.0
+    # A falha é reagendada numa fila de espera e a original é confirmada (sem NACK)
+    acked = sorted(c.kwargs["delivery_tag"] for c in channel.basic_ack.call_args_list)
+    assert acked == list(range(1, 9))
+    channel.basic_nack.assert_not_called()
+    channel.basic_publish.assert_called_once()
+    assert channel.basic_publish.call_args.kwargs["exchange"] == "x.chat_requests.retry"
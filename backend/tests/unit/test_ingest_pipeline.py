@@ -0,0 +1,35 @@
+# backend/tests/unit/test_ingest_pipeline.py
+
+import json
+import pytest # type: ignore
+from unittest.mock import patch, AsyncMock
+from fastapi.testclient import TestClient # type: ignore
+from app import main
+
+
+@pytest.mark.parametrize("ingest_mode, expected_order", [
+    ("pipelined", ["publish", "write"]),  # ACK sai antes da persistência
+    ("ordered", ["write", "publish"]),
+])
+def test_ingest_mode_controls_persistence_order(ingest_mode, expected_order):
+
+    calls = []
+    fake_publish = AsyncMock(side_effect=lambda *a, **k: calls.append("publish") or True)
+    fake_write = AsyncMock(side_effect=lambda *a, **k: calls.append("write") or True)
+
+    with patch.object(main.settings, "INGEST_MODE", ingest_mode), \
+         patch.object(main, "publish_request", fake_publish), \
+         patch.object(main.message_writer, "write", fake_write), \
+         patch.object(main.connection_registry, "register", AsyncMock()), \
+         patch.object(main.connection_registry, "unregister", AsyncMock()):
+        client = TestClient(main.app)  # sem "with": não executa o lifespan
+        with client.websocket_connect("/ws_chat?id=user-ingest") as websocket:
+            websocket.send_text("O que é a fotossíntese?")
+            ack = json.loads(websocket.receive_text())
+
+    assert ack["sender"] == "SYSTEM"
+    assert calls == expected_order
+    kwargs = fake_write.await_args.kwargs
+    assert kwargs["sent_at"] is not None
+    if ingest_mode == "pipelined":
+        assert kwargs["wait_for_commit"] is False
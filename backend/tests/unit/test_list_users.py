@@ -0,0 +1,86 @@
+# backend/tests/unit/test_list_users.py
+
+import json
+import pytest # type: ignore
+from unittest.mock import patch, AsyncMock, MagicMock
+from app.api import users
+from app.models.models import User
+from app.services.database_service import count_rows
+
+TOTAL_USERS = 12
+
+
+@pytest.fixture
+def users_client(test_db, db_client, make_user, auth_headers):
+    seeded = [
+        make_user(nome=f"Aluno{i}", sobrenome="Teste", role="ADMIN" if i == 0 else "USER")
+        for i in range(TOTAL_USERS)
+    ]
+    test_db.seed(seeded)
+    headers = {"admin": auth_headers(seeded[0].id), "user": auth_headers(seeded[1].id)}
+    with patch.object(users, "AsyncSessionLocal", test_db.session_factory):
+        yield db_client, headers, test_db.statements
+
+
+def test_cursor_pagination_and_count_without_loading_rows(users_client):
+
+    client, headers, statements = users_client
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 5, **({"after": cursor} if cursor else {})}
+        statements.clear()
+        body = client.get("/api/v1/users", params=params, headers=headers["user"]).json()
+        assert body["total"] == TOTAL_USERS
+        assert body["total_is_estimate"] is False
+        seen.extend(user["id"] for user in body["users"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(seen) == len(set(seen)) == TOTAL_USERS
+    assert seen == sorted(seen)
+    # O total vem de count(*), nunca de um SELECT de todas as linhas sem LIMIT
+    assert any("count(*)" in statement for statement in statements)
+    assert all("LIMIT" in statement for statement in statements if "FROM users" in statement and "count" not in statement)
+
+
+def test_field_projection(users_client):
+
+    client, headers, _ = users_client
+
+    body = client.get("/api/v1/users", params={"fields": "nome,email", "limit": 3}, headers=headers["user"]).json()
+    assert [set(user) for user in body["users"]] == [{"id", "nome", "email"}] * 3
+
+    response = client.get("/api/v1/users", params={"fields": "senha_hash"}, headers=headers["user"])
+    assert response.status_code == 400
+
+
+def test_ndjson_export_streams_all_users_for_admin(users_client):
+
+    client, headers, _ = users_client
+
+    with patch.object(users.settings, "USERS_EXPORT_BATCH_SIZE", 5):
+        response = client.get("/api/v1/users", params={"format": "ndjson", "fields": "email"}, headers=headers["admin"])
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == TOTAL_USERS
+    assert set(lines[0]) == {"id", "email"}
+
+    forbidden = client.get("/api/v1/users", headers={**headers["user"], "Accept": "application/x-ndjson"})
+    assert forbidden.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_count_uses_pg_class_estimate_for_large_tables():
+
+    session = MagicMock()
+    session.bind.dialect.name = "postgresql"
+    session.scalar = AsyncMock(return_value=250000)
+    assert await count_rows(session, User, estimate_threshold=100000) == (250000, True)
+    session.scalar.assert_awaited_once()
+
+    # Tabela pequena (ou nunca analisada): contagem exata
+    session.scalar = AsyncMock(side_effect=[-1, 42])
+    assert await count_rows(session, User, estimate_threshold=100000) == (42, False)
@@ -0,0 +1,96 @@
+# backend/tests/unit/test_message_history.py
+
+import uuid
+from datetime import datetime, timedelta, timezone
+import pytest # type: ignore
+from unittest.mock import patch
+from sqlalchemy import insert # type: ignore
+from app.config import settings
+from app.models.models import ChatSession, Message
+from app.services.http_compression import choose_encoding
+
+TOTAL_MESSAGES = 25
+
+
+@pytest.fixture
+def history_client(test_db, db_client, make_user, auth_headers):
+    owner, other = make_user(nome="Ana"), make_user(nome="Bruno", sobrenome="Souza")
+    session_id = uuid.uuid4()
+    base_time = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    async def add_messages(session):
+        # As duas últimas mensagens têm o mesmo sent_at: o desempate é feito pelo id
+        await session.execute(insert(Message), [
+            {"id": uuid.uuid4(), "session_id": session_id, "sender": "USER" if i % 2 == 0 else "BOT",
+             "content": f"mensagem {i}", "sent_at": base_time + timedelta(seconds=min(i, TOTAL_MESSAGES - 2))}
+            for i in range(TOTAL_MESSAGES)
+        ])
+
+    test_db.seed([owner, other], ChatSession(id=session_id, user_id=owner.id), add_messages)
+    headers = {"owner": auth_headers(owner.id), "other": auth_headers(other.id)}
+    yield db_client, headers, session_id
+
+
+def test_cursor_pages_cover_history_without_gaps(history_client):
+
+    client, headers, session_id = history_client
+    url = f"/api/v1/sessions/{session_id}/messages"
+
+    pages, cursor = [], None
+    while True:
+        params = {"limit": 10, **({"before": cursor} if cursor else {})}
+        response = client.get(url, params=params, headers=headers["owner"])
+        assert response.status_code == 200
+        body = response.json()
+        pages.append([m["content"] for m in body["messages"]])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+
+    assert [len(page) for page in pages] == [10, 10, 5]
+    # Páginas vêm da mais recente para a mais antiga; cada página em ordem cronológica
+    contents = [content for page in reversed(pages) for content in page]
+    assert sorted(contents) == sorted(f"mensagem {i}" for i in range(TOTAL_MESSAGES))
+    assert len(set(contents)) == TOTAL_MESSAGES
+    assert pages[0][0] == "mensagem 15"
+
+
+def test_other_users_session_is_not_found(history_client):
+
+    client, headers, session_id = history_client
+
+    assert client.get(f"/api/v1/sessions/{session_id}/messages", headers=headers["other"]).status_code == 404
+    assert client.get(f"/api/v1/sessions/{uuid.uuid4()}/messages", headers=headers["owner"]).status_code == 404
+    assert client.get(f"/api/v1/sessions/{session_id}/messages").status_code in (401, 403)
+
+
+def test_invalid_cursor_is_rejected(history_client):
+
+    client, headers, session_id = history_client
+    response = client.get(f"/api/v1/sessions/{session_id}/messages",
+                          params={"before": "nao-e-um-cursor"}, headers=headers["owner"])
+    assert response.status_code == 400
+
+
+def test_response_is_gzip_compressed_when_accepted(history_client):
+
+    client, headers, session_id = history_client
+    url = f"/api/v1/sessions/{session_id}/messages"
+
+    with patch.object(settings, "HTTP_COMPRESSION_MIN_BYTES", 0):
+        compressed = client.get(url, headers={**headers["owner"], "Accept-Encoding": "gzip"})
+        plain = client.get(url, headers={**headers["owner"], "Accept-Encoding": "identity"})
+
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert "content-encoding" not in plain.headers
+    assert compressed.json() == plain.json()
+    assert "Accept-Encoding" in compressed.headers["vary"]
+
+
+def test_choose_encoding_respects_quality_values():
+
+    assert choose_encoding("gzip, deflate, br") == "gzip"
+    assert choose_encoding("gzip;q=0") is None
+    assert choose_encoding("identity") is None
+    assert choose_encoding("*") in ("zstd", "gzip")
+
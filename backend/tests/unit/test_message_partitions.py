@@ -0,0 +1,106 @@
+# backend/tests/unit/test_message_partitions.py
+
+import gzip
+import json
+import uuid
+from datetime import date, datetime, timezone
+import pytest # type: ignore
+from unittest.mock import patch
+from app.services import message_partitions
+from app.services.message_partitions import (
+    MessageArchiveWriter,
+    add_months,
+    archive_path,
+    create_partition_sql,
+    months_between,
+    parse_partition_name,
+    partition_name,
+    partitions_to_archive,
+)
+
+
+def test_month_arithmetic_and_names():
+
+    assert add_months(date(2025, 11, 1), 3) == date(2026, 2, 1)
+    assert add_months(date(2025, 1, 1), -1) == date(2024, 12, 1)
+    assert months_between(date(2025, 11, 20), date(2026, 1, 5)) == [
+        date(2025, 11, 1), date(2025, 12, 1), date(2026, 1, 1)
+    ]
+    assert partition_name(date(2025, 3, 1)) == "messages_p202503"
+    assert parse_partition_name("messages_p202503") == date(2025, 3, 1)
+    assert parse_partition_name("messages_default") is None
+
+
+def test_partition_bounds_cover_exactly_one_month():
+
+    sql = create_partition_sql(date(2025, 12, 1))
+    assert "messages_p202512 PARTITION OF messages" in sql
+    assert "FROM ('2025-12-01 00:00:00+00') TO ('2026-01-01 00:00:00+00')" in sql
+
+
+def test_only_partitions_older_than_retention_are_selected():
+
+    partitions = ["messages_p202409", "messages_p202410", "messages_p202509", "messages_default"]
+    expired = partitions_to_archive(partitions, today=date(2025, 10, 15), retention_months=12)
+    assert expired == [(date(2024, 9, 1), "messages_p202409")]
+
+
+def test_jsonl_archive_roundtrip(tmp_path):
+
+    row = {"id": uuid.uuid4(), "session_id": uuid.uuid4(), "sender": "USER", "content": "olá",
+           "sent_at": datetime(2024, 9, 1, 12, 0, tzinfo=timezone.utc)}
+    with patch.object(message_partitions, "zstandard", None):
+        path = archive_path(str(tmp_path), date(2024, 9, 1), "jsonl")
+        with MessageArchiveWriter(path, "jsonl") as writer:
+            writer.write(row)
+            writer.write({**row, "id": uuid.uuid4(), "content": "tchau"})
+
+    assert path.endswith("messages_p202409.jsonl.gz")
+    assert writer.rows == 2
+    with gzip.open(path, "rt", encoding="utf-8") as archived:
+        lines = [json.loads(line) for line in archived]
+    assert lines[0] == {**row, "id": str(row["id"]), "session_id": str(row["session_id"]),
+                        "sent_at": "2024-09-01T12:00:00+00:00"}
+    assert lines[1]["content"] == "tchau"
+
+
+def test_failed_export_leaves_no_archive(tmp_path):
+
+    path = str(tmp_path / "messages_p202409.jsonl.gz")
+    with pytest.raises(RuntimeError):
+        with MessageArchiveWriter(path, "jsonl") as writer:
+            writer.write({"content": "parcial"})
+            raise RuntimeError("conexão perdida")
+
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_history_index_migration_runs_on_unpartitioned_table(tmp_path):
+
+    import migrate_db
+    from sqlalchemy import text # type: ignore
+    from sqlalchemy.ext.asyncio import create_async_engine # type: ignore
+    from app.models.models import Base
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'migracao.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(text("DROP INDEX IF EXISTS ix_messages_session_sent_at"))
+
+    async def not_partitioned(conn):
+        await conn.execute(text("SELECT 1"))  # consulta real antes do CREATE INDEX, como no PostgreSQL
+        return False
+
+    # SQLite não tem CONCURRENTLY: mesmo índice, mesma sequência de conexão
+    sqlite_index = migrate_db.MESSAGE_HISTORY_INDEX_SQL.replace(" CONCURRENTLY", "")
+    with patch.object(migrate_db, "is_partitioned", not_partitioned), \
+         patch.object(migrate_db, "MESSAGE_HISTORY_INDEX_SQL", sqlite_index):
+        await migrate_db.migrate_message_indexes(engine)
+
+    async with engine.connect() as conn:
+        indexes = await conn.scalar(text(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'index' AND name = 'ix_messages_session_sent_at'"
+        ))
+    await engine.dispose()
+    assert indexes == 1
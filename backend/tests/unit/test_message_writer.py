@@ -0,0 +1,127 @@
+# backend/tests/unit/test_message_writer.py
+
+import uuid
+import asyncio
+import pytest # type: ignore
+import pytest_asyncio # type: ignore
+from unittest.mock import patch
+from sqlalchemy import func, select # type: ignore
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession # type: ignore
+from sqlalchemy.orm import sessionmaker # type: ignore
+from app.models.models import Base, Message, ChatSession
+from app.services import message_writer as message_writer_module
+from app.services.message_writer import MessageWriter
+from app.services.database_service import known_sessions
+
+
+@pytest_asyncio.fixture
+async def session_factory():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", echo=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    known_sessions.clear()  # cada teste usa um banco novo
+
+    # hash de senha fixo: os usuários temporários não precisam de bcrypt real aqui
+    with patch("app.services.auth_service.get_password_hash", return_value="hash"):
+        yield sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    await engine.dispose()
+
+
+async def count_messages(session_factory):
+    async with session_factory() as session:
+        return (await session.execute(select(func.count()).select_from(Message))).scalar()
+
+
+@pytest.mark.asyncio
+async def test_batched_mode_groups_messages_in_one_flush(session_factory):
+
+    writer = MessageWriter(durability="batched", batch_size=50, flush_interval_ms=20, session_factory=session_factory)
+    session_ids = [str(uuid.uuid4()) for _ in range(3)]
+
+    with patch.object(writer, "_flush", wraps=writer._flush) as spy_flush:
+        results = await asyncio.gather(*(
+            writer.write(session_ids[i % 3], "USER", f"mensagem {i}") for i in range(10)
+        ))
+    await writer.stop()
+
+    assert results == [True] * 10
+    assert spy_flush.await_count == 1
+    assert await count_messages(session_factory) == 10
+    async with session_factory() as session:
+        sessions = (await session.execute(select(func.count()).select_from(ChatSession))).scalar()
+    assert sessions == 3  # usuários/sessões criados uma única vez por lote
+
+
+@pytest.mark.asyncio
+async def test_async_mode_returns_before_commit_and_stop_flushes(session_factory):
+
+    writer = MessageWriter(durability="async", batch_size=100, flush_interval_ms=1000, session_factory=session_factory)
+
+    for i in range(5):
+        assert await writer.write("sessao-anonima", "BOT", f"resposta {i}") is True
+    assert await count_messages(session_factory) == 0
+
+    await writer.stop()  # desligamento grava o que ficou pendente
+    assert await count_messages(session_factory) == 5
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_falls_back_to_single_inserts(session_factory):
+
+    writer = MessageWriter(durability="batched", batch_size=10, flush_interval_ms=10, session_factory=session_factory)
+
+    with patch("app.services.message_writer.ensure_users_and_sessions", side_effect=RuntimeError("lote inválido")):
+        results = await asyncio.gather(
+            writer.write(str(uuid.uuid4()), "USER", "a"),
+            writer.write(str(uuid.uuid4()), "USER", "b"),
+        )
+    await writer.stop()
+
+    assert results == [True, True]
+    assert await count_messages(session_factory) == 2
+
+
+def test_invalid_durability_mode_is_rejected():
+
+    with pytest.raises(ValueError):
+        MessageWriter(durability="eventual")
+
+
+@pytest.mark.asyncio
+async def test_verified_sessions_skip_user_and_session_upsert(session_factory):
+
+    writer = MessageWriter(durability="batched", batch_size=10, flush_interval_ms=10, session_factory=session_factory)
+    anonymous = str(uuid.uuid4())
+
+    with patch("app.services.message_writer.ensure_users_and_sessions",
+               wraps=message_writer_module.ensure_users_and_sessions) as spy_ensure:
+        await asyncio.gather(
+            writer.write(str(uuid.uuid4()), "USER", "autenticada", verified=True),
+            writer.write(anonymous, "USER", "anônima"),
+        )
+    await writer.stop()
+
+    assert spy_ensure.await_args.args[1] == [uuid.UUID(anonymous)]
+
+
+@pytest.mark.asyncio
+async def test_sync_mode_without_wait_for_commit_does_not_block_caller(session_factory):
+
+    writer = MessageWriter(durability="sync", session_factory=session_factory)
+    release = asyncio.Event()
+    original_save = message_writer_module.save_message
+
+    async def slow_save(*args, **kwargs):
+        await release.wait()  # PostgreSQL lento
+        return await original_save(*args, **kwargs)
+
+    with patch("app.services.message_writer.save_message", side_effect=slow_save):
+        assert await asyncio.wait_for(
+            writer.write(str(uuid.uuid4()), "USER", "pipelined", wait_for_commit=False), timeout=0.5
+        ) is True
+        assert await count_messages(session_factory) == 0
+        release.set()
+        await writer.stop()  # aguarda as gravações em segundo plano
+
+    assert await count_messages(session_factory) == 1
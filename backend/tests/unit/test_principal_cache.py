@@ -0,0 +1,43 @@
+# backend/tests/unit/test_principal_cache.py
+
+import pytest # type: ignore
+
+
+def user_selects(statements: list) -> list:
+    return [s for s in statements if s.lstrip().upper().startswith("SELECT") and "FROM users" in s]
+
+
+@pytest.fixture
+def client_and_queries(db_client, seeded_user, test_db, auth_headers):
+    yield db_client, auth_headers(seeded_user.id), test_db.statements
+
+
+def test_repeated_requests_skip_user_lookup(client_and_queries):
+
+    client, headers, statements = client_and_queries
+
+    assert client.get("/api/v1/users/me", headers=headers).status_code == 200
+    assert client.get("/api/v1/users/me", headers=headers).status_code == 200
+
+    assert len(user_selects(statements)) == 1
+
+
+def test_update_and_delete_invalidate_cached_principal(client_and_queries):
+
+    client, headers, _ = client_and_queries
+    assert client.get("/api/v1/users/me", headers=headers).json()["nome"] == "Ana"
+
+    assert client.put("/api/v1/users/me", headers=headers, json={"nome": "Beatriz"}).status_code == 200
+    assert client.get("/api/v1/users/me", headers=headers).json()["nome"] == "Beatriz"
+
+    assert client.delete("/api/v1/users/me", headers=headers).status_code == 200
+    assert client.get("/api/v1/users/me", headers=headers).status_code == 403
+
+
+def test_invalid_token_is_rejected_even_if_cached(client_and_queries):
+
+    client, headers, _ = client_and_queries
+    assert client.get("/api/v1/users/me", headers=headers).status_code == 200
+
+    tampered = {"Authorization": headers["Authorization"][:-2] + "xx"}
+    assert client.get("/api/v1/users/me", headers=tampered).status_code == 401
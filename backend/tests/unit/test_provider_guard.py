@@ -0,0 +1,167 @@
+# backend/tests/unit/test_provider_guard.py
+
+import pytest # type: ignore
+from unittest.mock import patch
+from app.consumers import ia_consumer
+from app.services.ai_router import AIRouter, ProviderBackend
+from app.services.provider_guard import (
+    AIMDLimiter,
+    CircuitBreaker,
+    ProviderGuard,
+    ProviderRejectedError,
+    RetryBudget,
+    BREAKER_CLOSED,
+    BREAKER_HALF_OPEN,
+    BREAKER_OPEN,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TransientError(Exception):
+    retryable = True
+
+
+def make_guard(clock=None, **limiter_kwargs):
+    breaker = CircuitBreaker("teste", failure_threshold=3, reset_timeout=10, shared=False, clock=clock or FakeClock())
+    limiter = AIMDLimiter(**{"initial": 4, "min_limit": 1, "max_limit": 16, "backoff": 0.5, **limiter_kwargs})
+    return ProviderGuard("teste", limiter=limiter, breaker=breaker, retry_budget=RetryBudget(ratio=0.5, reserve=2),
+                         acquire_timeout=0.01, latency_threshold=0)
+
+
+def test_aimd_grows_while_busy_and_halves_on_overload():
+    limiter = AIMDLimiter(initial=4, min_limit=1, max_limit=16, backoff=0.5)
+
+    for _ in range(20):
+        for _ in range(4):
+            assert limiter.acquire(timeout=0)
+        for _ in range(4):
+            limiter.release(overloaded=False)
+    grown = limiter.limit
+    assert grown > 4
+
+    assert limiter.acquire(timeout=0)
+    limiter.release(overloaded=True)
+    assert limiter.limit <= grown // 2 + 1
+
+    for _ in range(10):
+        assert limiter.acquire(timeout=0)
+        limiter.release(overloaded=True)
+    assert limiter.limit == 1
+
+
+def test_limiter_rejects_above_current_limit():
+    limiter = AIMDLimiter(initial=2, min_limit=1, max_limit=2)
+
+    assert limiter.acquire(timeout=0) and limiter.acquire(timeout=0)
+    assert limiter.acquire(timeout=0.01) is False
+
+
+def test_breaker_opens_probes_once_and_closes_on_success():
+    clock = FakeClock()
+    breaker = CircuitBreaker("teste", failure_threshold=3, reset_timeout=10, shared=False, clock=clock)
+
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record(failed=True)
+    assert breaker.state == BREAKER_OPEN
+    assert breaker.allow() is False
+
+    clock.now = 10.0
+    assert breaker.allow() is True  # chamada de teste
+    assert breaker.state == BREAKER_HALF_OPEN
+    assert breaker.allow() is False  # só uma por vez
+
+    breaker.record(failed=False)
+    assert breaker.state == BREAKER_CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens_breaker():
+    clock = FakeClock()
+    breaker = CircuitBreaker("teste", failure_threshold=1, reset_timeout=10, shared=False, clock=clock)
+    breaker.record(failed=True)
+
+    clock.now = 11.0
+    assert breaker.allow()
+    breaker.record(failed=True)
+
+    assert breaker.state == BREAKER_OPEN
+    clock.now = 15.0
+    assert breaker.allow() is False
+
+
+def test_retry_budget_limits_retries_to_fraction_of_calls():
+    budget = RetryBudget(ratio=0.5, reserve=2)
+
+    assert budget.try_spend() and budget.try_spend()
+    assert budget.try_spend() is False
+    budget.deposit()
+    budget.deposit()
+    assert budget.try_spend()
+    assert budget.try_spend() is False
+
+
+def test_guard_counts_only_transient_failures_and_rejects_when_open():
+    guard = make_guard()
+
+    # Erro de configuração (não transitório) não abre o disjuntor
+    for _ in range(5):
+        with pytest.raises(ValueError):
+            with guard.call():
+                raise ValueError("401")
+    assert guard.breaker.state == BREAKER_CLOSED
+
+    for _ in range(3):
+        with pytest.raises(TransientError):
+            with guard.call():
+                raise TransientError()
+    assert guard.breaker.state == BREAKER_OPEN
+    assert guard.limiter.limit == 1
+    assert guard.limiter.inflight == 0
+
+    with pytest.raises(ProviderRejectedError) as exc_info:
+        with guard.call():
+            pytest.fail("chamada com disjuntor aberto")
+    assert exc_info.value.reason == "circuit_open"
+
+
+def test_worker_reschedules_when_breaker_is_open_and_respects_retry_budget():
+    guard = make_guard()
+    for _ in range(3):
+        guard.breaker.record(failed=True)
+
+    def transient_failure(user_prompt, history=None, backend=None):
+        raise ia_consumer.AIProviderError(ia_consumer.RATE_LIMIT_MESSAGE, retryable=True)
+
+    router = AIRouter([ProviderBackend("teste", "gpt-teste", "chave-teste", guard=guard)], hedge_enabled=False)
+
+    with patch.object(ia_consumer, "ai_router", router), \
+         patch.object(ia_consumer, "AI_API_KEY", "chave-teste"), \
+         patch.object(ia_consumer, "get_cached_response", return_value=None), \
+         patch.object(ia_consumer, "_call_provider", side_effect=transient_failure) as mock_call:
+        # Disjuntor aberto: a chamada não é feita e a mensagem é reagendada
+        with pytest.raises(ia_consumer.AIProviderError) as exc_info:
+            ia_consumer.call_external_ai_api("Explique fotossíntese", allow_retry=True)
+        assert exc_info.value.retryable
+        assert ia_consumer.call_external_ai_api("Explique fotossíntese") == ia_consumer.PROVIDER_UNAVAILABLE_MESSAGE
+        mock_call.assert_not_called()
+
+        # Disjuntor fechado: retentativas até esgotar o orçamento, depois o erro vai ao usuário
+        guard.breaker.record(failed=False)
+        guard.breaker.failure_threshold = 100
+        outcomes = []
+        for _ in range(4):
+            try:
+                outcomes.append(ia_consumer.call_external_ai_api("Explique fotossíntese", allow_retry=True))
+            except ia_consumer.AIProviderError:
+                outcomes.append("retry")
+
+    assert outcomes[:3] == ["retry"] * 3
+    assert outcomes[3] == ia_consumer.RATE_LIMIT_MESSAGE
@@ -2,7 +2,14 @@ import pytest # type: ignore
 from unittest.mock import patch, MagicMock
 import json
 import pika.exceptions # type: ignore
-from app.services.rabbitmq_service import publish_message, QUEUE_NAME, EXCHANGE_NAME
+from app.services.rabbitmq_service import publish_message, publisher, QUEUE_NAME, EXCHANGE_NAME
+
+@pytest.fixture(autouse=True)
+def reset_publisher():
+    # O publicador mantém conexões entre chamadas: cada teste começa com o pool vazio
+    publisher.close()
+    yield
+    publisher.close()
 
 # Mocka a função BlockingConnection para simular o comportamento do RabbitMQ
 @patch('app.services.rabbitmq_service.pika.BlockingConnection') 
@@ -20,7 +27,7 @@ def test_publish_message_success(mock_connection):
     mock_channel.exchange_declare.assert_called_once_with(
         exchange=EXCHANGE_NAME, exchange_type='direct', durable=True
     )
-    mock_channel.queue_declare.assert_called_once_with(
+    mock_channel.queue_declare.assert_any_call(
         queue=QUEUE_NAME, durable=True
     )
     
@@ -47,4 +54,31 @@ def test_publish_message_connection_failure(mock_connection):
     mock_connection.assert_called_once()
     
     # O resultado deve ser False (indicando falha no serviço)
-    assert result is False
\ No newline at end of file
+    assert result is False
+
+@patch('app.services.rabbitmq_service.pika.BlockingConnection')
+def test_publish_message_reuses_pooled_channel(mock_connection):
+
+    mock_channel = mock_connection.return_value.channel.return_value
+    
+    for i in range(3):
+        assert publish_message({"user_id": "test_ws", "content": f"msg {i}"}) is True
+    
+    # Uma única conexão e uma única declaração de topologia para várias publicações
+    mock_connection.assert_called_once()
+    mock_channel.exchange_declare.assert_called_once()
+    assert mock_channel.basic_publish.call_count == 3
+
+@patch('app.services.rabbitmq_service.pika.BlockingConnection')
+def test_publish_message_reconnects_stale_channel(mock_connection):
+
+    stale_conn, fresh_conn = MagicMock(), MagicMock()
+    stale_conn.channel.return_value.basic_publish.side_effect = [None, pika.exceptions.StreamLostError()]
+    mock_connection.side_effect = [stale_conn, fresh_conn]
+    
+    assert publish_message({"user_id": "test_ws", "content": "primeira"}) is True
+    # O canal do pool morreu entre as publicações: deve reconectar e publicar
+    assert publish_message({"user_id": "test_ws", "content": "segunda"}) is True
+    
+    assert mock_connection.call_count == 2
+    fresh_conn.channel.return_value.basic_publish.assert_called_once()
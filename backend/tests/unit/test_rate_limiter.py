@@ -0,0 +1,76 @@
+# backend/tests/unit/test_rate_limiter.py
+
+import pytest # type: ignore
+from unittest.mock import patch, MagicMock, AsyncMock
+from app.services.rate_limiter import (
+    MemoryTokenBuckets,
+    RateLimiter,
+    SCOPE_GLOBAL,
+    SCOPE_USER,
+    throttled_frame,
+)
+
+USER = [(SCOPE_USER, "ratelimit:user:u1", 1.0, 3)]
+
+
+def test_bucket_allows_burst_then_returns_retry_after_and_refills():
+    buckets = MemoryTokenBuckets()
+
+    assert [buckets.acquire(USER, now=0.0)[0] for _ in range(3)] == [0.0, 0.0, 0.0]
+    retry_after, scope = buckets.acquire(USER, now=0.0)
+
+    assert scope == SCOPE_USER
+    assert retry_after == pytest.approx(1.0)
+    # Após 1 s (taxa 1/s) há uma nova ficha
+    assert buckets.acquire(USER, now=1.0) == (0.0, None)
+
+
+def test_rejection_by_global_bucket_does_not_consume_user_tokens():
+    buckets = MemoryTokenBuckets()
+    global_limit = (SCOPE_GLOBAL, "ratelimit:global", 0.1, 1)
+    other_user = (SCOPE_USER, "ratelimit:user:u2", 1.0, 3)
+
+    assert buckets.acquire([other_user, global_limit], now=0.0) == (0.0, None)
+    retry_after, scope = buckets.acquire(USER + [global_limit], now=0.0)
+
+    assert scope == SCOPE_GLOBAL
+    assert retry_after == pytest.approx(10.0)
+    # As fichas do usuário continuam intactas
+    assert [buckets.acquire(USER, now=0.0)[0] for _ in range(3)] == [0.0, 0.0, 0.0]
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_uses_atomic_script_and_falls_back_to_memory():
+    fake_redis = MagicMock()
+    fake_redis.eval = AsyncMock(return_value=["2.5", 2])
+    limiter = RateLimiter(backend="redis", user_rate=1.0, user_burst=1, global_rate=5.0, global_burst=10)
+
+    with patch("app.services.rate_limiter.get_async_redis", return_value=fake_redis):
+        assert await limiter.check("u1") == (2.5, SCOPE_GLOBAL)
+        args = fake_redis.eval.call_args.args
+        assert args[1:4] == (2, "ratelimit:user:u1", "ratelimit:global")
+
+        # Redis fora do ar: os mesmos limites são aplicados no processo
+        fake_redis.eval.side_effect = ConnectionError("redis fora do ar")
+        assert await limiter.check("u1") == (0.0, None)
+        retry_after, scope = await limiter.check("u1")
+
+    assert scope == SCOPE_USER
+    assert retry_after > 0
+
+
+@pytest.mark.asyncio
+async def test_zero_rates_disable_limits():
+    limiter = RateLimiter(backend="memory", user_rate=0, global_rate=0)
+
+    for _ in range(100):
+        assert await limiter.check("u1") == (0.0, None)
+
+
+def test_throttled_frame_signals_retry_after():
+    frame = throttled_frame(0.04, SCOPE_USER)
+
+    assert frame["sender"] == "SYSTEM"
+    assert frame["type"] == "throttled"
+    assert frame["retry_after"] == 0.1
+    assert frame["scope"] == SCOPE_USER
@@ -0,0 +1,56 @@
+# backend/tests/unit/test_reply_dispatcher.py
+
+import pytest # type: ignore
+import asyncio
+import threading
+from unittest.mock import patch
+from app.services.reply_dispatcher import ReplyDispatcher
+
+
+class FakeManager:
+    """Registra os envios e em qual thread eles aconteceram"""
+
+    def __init__(self):
+        self.sent = []
+        self.threads = set()
+
+    async def send_personal_message(self, message: str, user_id: str):
+        self.sent.append((user_id, message))
+        self.threads.add(threading.get_ident())
+
+
+@pytest.mark.asyncio
+async def test_submit_threadsafe_delivers_on_server_loop():
+
+    fake_manager = FakeManager()
+    dispatcher = ReplyDispatcher(maxsize=10, batch_size=4)
+
+    with patch("app.services.reply_dispatcher.manager", fake_manager):
+        dispatcher.start()
+        loop_thread = threading.get_ident()
+
+        # Simula o callback do pika entregando a partir de outra thread
+        worker = threading.Thread(target=dispatcher.submit_threadsafe, args=("user-1", "oi"))
+        worker.start()
+        await asyncio.to_thread(worker.join)
+        await dispatcher.stop()
+
+    assert fake_manager.sent == [("user-1", "oi")]
+    # O envio acontece na thread do event loop do servidor
+    assert fake_manager.threads == {loop_thread}
+
+
+@pytest.mark.asyncio
+async def test_batch_preserves_per_user_order():
+
+    fake_manager = FakeManager()
+    dispatcher = ReplyDispatcher(maxsize=10, batch_size=8)
+
+    with patch("app.services.reply_dispatcher.manager", fake_manager):
+        dispatcher.start()
+        for user_id, payload in [("a", "1"), ("b", "1"), ("a", "2"), ("b", "2"), ("a", "3")]:
+            await dispatcher.submit(user_id, payload)
+        await dispatcher.stop()
+
+    assert [p for u, p in fake_manager.sent if u == "a"] == ["1", "2", "3"]
+    assert [p for u, p in fake_manager.sent if u == "b"] == ["1", "2"]
@@ -0,0 +1,51 @@
+# backend/tests/unit/test_response_cache.py
+
+import time
+from unittest.mock import patch, MagicMock
+from app.services.response_cache import ResponseCache, make_cache_key
+
+
+def test_cache_key_ignores_trivial_prompt_variations():
+
+    base = make_cache_key("O que é fotossíntese?", "gpt-3.5-turbo", "v1")
+
+    assert make_cache_key("  o que e   FOTOSSINTESE ", "gpt-3.5-turbo", "v1") == base
+    # Modelo e versão do prompt de sistema fazem parte da chave
+    assert make_cache_key("O que é fotossíntese?", "llama-3.3-70b-versatile", "v1") != base
+    assert make_cache_key("O que é fotossíntese?", "gpt-3.5-turbo", "v2") != base
+
+
+def test_l1_evicts_least_recently_used_and_expires():
+
+    cache = ResponseCache(ttl=60, l1_max_entries=2, use_redis=False)
+    cache.set("a", "resposta a")
+    cache.set("b", "resposta b")
+    assert cache.get("a") == "resposta a"  # 'a' passa a ser a mais recente
+    cache.set("c", "resposta c")           # remove 'b' (menos usada)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "resposta a"
+
+    cache.set("d", "resposta d", ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("d") is None
+
+
+def test_l2_hit_populates_l1_and_redis_failure_degrades():
+
+    fake_redis = MagicMock()
+    fake_redis.get.return_value = "resposta do redis"
+    cache = ResponseCache(ttl=60, use_redis=True)
+
+    with patch("app.services.response_cache.get_sync_redis", return_value=fake_redis):
+        assert cache.get("k") == "resposta do redis"
+        assert cache.get("k") == "resposta do redis"
+    # A segunda consulta foi atendida pelo L1
+    fake_redis.get.assert_called_once_with("k")
+
+    fake_redis.get.side_effect = ConnectionError("redis fora do ar")
+    fake_redis.set.side_effect = ConnectionError("redis fora do ar")
+    with patch("app.services.response_cache.get_sync_redis", return_value=fake_redis):
+        cache.set("x", "resposta x")
+        assert cache.get("x") == "resposta x"
+        assert cache.get("inexistente") is None
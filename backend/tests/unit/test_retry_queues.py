@@ -0,0 +1,158 @@
+# backend/tests/unit/test_retry_queues.py
+
+import json
+import pika # type: ignore
+from unittest.mock import patch, MagicMock
+from app.consumers import ia_consumer
+from app.services.rabbitmq_service import BULK_QUEUE_NAME
+from app.services.retry_queues import (
+    DEAD_LETTER_EXCHANGE,
+    RETRY_COUNT_HEADER,
+    RETRY_EXCHANGE,
+    declare_retry_topology,
+    retry_delay_for,
+    retry_or_dead_letter,
+    retry_queue_name,
+)
+
+BODY = json.dumps({"user_id": "sessao-1", "content": "o que é a mitose"}).encode()
+
+
+def published(channel):
+    return channel.basic_publish.call_args.kwargs
+
+
+def test_transient_failure_goes_to_delay_queue_with_incremented_header():
+
+    channel = MagicMock()
+    properties = pika.BasicProperties(headers={RETRY_COUNT_HEADER: 1})
+
+    assert retry_or_dead_letter(channel, BODY, properties, RuntimeError("banco fora"), max_retries=3) == "retry"
+    kwargs = published(channel)
+    assert kwargs["exchange"] == RETRY_EXCHANGE
+    assert kwargs["routing_key"] == retry_queue_name(retry_delay_for(1))
+    assert kwargs["properties"].headers[RETRY_COUNT_HEADER] == 2
+    assert kwargs["body"] == BODY
+
+
+def test_exhausted_retries_and_poison_messages_go_to_dlq():
+
+    channel = MagicMock()
+    exhausted = pika.BasicProperties(headers={RETRY_COUNT_HEADER: 3})
+    assert retry_or_dead_letter(channel, BODY, exhausted, RuntimeError("erro"), max_retries=3) == "dead_letter"
+    assert published(channel)["exchange"] == DEAD_LETTER_EXCHANGE
+
+    # JSON inválido nunca terá sucesso: vai direto para a DLQ na primeira falha
+    channel = MagicMock()
+    error = json.JSONDecodeError("inválido", "{", 0)
+    assert retry_or_dead_letter(channel, b"{", pika.BasicProperties(), error, max_retries=3) == "dead_letter"
+
+
+def test_delays_grow_and_cap_at_last_level():
+
+    delays = [1000, 5000, 25000]
+    assert [retry_delay_for(n, delays) for n in range(5)] == [1000, 5000, 25000, 25000, 25000]
+
+
+def test_delay_queues_dead_letter_back_to_request_queue():
+
+    channel = MagicMock()
+    declare_retry_topology(channel, delays=[1000])
+    arguments = channel.queue_declare.call_args_list[0].kwargs["arguments"]
+    assert arguments == {
+        "x-message-ttl": 1000,
+        "x-dead-letter-exchange": "x.chat_requests",
+        "x-dead-letter-routing-key": "q.ia_request",
+    }
+
+
+def test_worker_reschedules_rate_limit_instead_of_answering_with_error():
+
+    channel = MagicMock()
+    method = MagicMock(delivery_tag=5)
+    rate_limited = ia_consumer.AIProviderError(ia_consumer.RATE_LIMIT_MESSAGE, retryable=True)
+
+    with patch.object(ia_consumer, "AI_API_KEY", "chave-teste"), \
+         patch.object(ia_consumer, "get_cached_response", return_value=None), \
+         patch.object(ia_consumer, "load_history", return_value=[]), \
+         patch.object(ia_consumer, "_call_provider", side_effect=rate_limited), \
+         patch.object(ia_consumer, "publish_response") as mock_publish:
+        ia_consumer.callback(channel, method, pika.BasicProperties(headers={}), BODY)
+
+    mock_publish.assert_not_called()  # o usuário não recebe o erro enquanto houver retentativas
+    assert published(channel)["exchange"] == RETRY_EXCHANGE
+    channel.basic_ack.assert_called_once_with(delivery_tag=5)
+    channel.basic_nack.assert_not_called()
+
+
+def test_last_attempt_delivers_error_to_user():
+
+    channel = MagicMock()
+    method = MagicMock(delivery_tag=6)
+    rate_limited = ia_consumer.AIProviderError(ia_consumer.RATE_LIMIT_MESSAGE, retryable=True)
+    last = pika.BasicProperties(headers={RETRY_COUNT_HEADER: ia_consumer.settings.MESSAGE_MAX_RETRIES})
+
+    with patch.object(ia_consumer, "AI_API_KEY", "chave-teste"), \
+         patch.object(ia_consumer, "get_cached_response", return_value=None), \
+         patch.object(ia_consumer, "load_history", return_value=[]), \
+         patch.object(ia_consumer, "_call_provider", side_effect=rate_limited), \
+         patch.object(ia_consumer, "run_db"), \
+         patch.object(ia_consumer, "message_writer"), \
+         patch.object(ia_consumer, "publish_response") as mock_publish:
+        ia_consumer.callback(channel, method, last, BODY)
+
+    assert mock_publish.call_args.args[1] == ia_consumer.RATE_LIMIT_MESSAGE
+    channel.basic_publish.assert_not_called()
+    channel.basic_ack.assert_called_once_with(delivery_tag=6)
+
+
+def test_bulk_messages_retry_and_dead_letter_to_their_own_queue():
+
+    bulk_body = json.dumps({"user_id": "sessao-1", "content": "resumo", "priority": "bulk"}).encode()
+
+    channel = MagicMock()
+    assert retry_or_dead_letter(channel, bulk_body, pika.BasicProperties(), RuntimeError("erro"), max_retries=3) == "retry"
+    assert published(channel)["routing_key"] == retry_queue_name(retry_delay_for(0), BULK_QUEUE_NAME)
+
+    exhausted = pika.BasicProperties(headers={RETRY_COUNT_HEADER: 3})
+    retry_or_dead_letter(channel, bulk_body, exhausted, RuntimeError("erro"), max_retries=3)
+    assert published(channel)["routing_key"] == BULK_QUEUE_NAME  # replay devolve à fila bulk
+
+    channel = MagicMock()
+    declare_retry_topology(channel, delays=[1000])
+    dead_letter_keys = {
+        c.kwargs["queue"]: c.kwargs["arguments"]["x-dead-letter-routing-key"]
+        for c in channel.queue_declare.call_args_list if c.kwargs.get("arguments")
+    }
+    assert dead_letter_keys == {
+        retry_queue_name(1000): "q.ia_request",
+        retry_queue_name(1000, BULK_QUEUE_NAME): BULK_QUEUE_NAME,
+    }
+
+
+def test_original_is_acked_only_after_the_broker_confirms_the_copy():
+
+    channel = MagicMock()
+    retry_or_dead_letter(channel, BODY, pika.BasicProperties(), RuntimeError("erro"), max_retries=3)
+    assert published(channel)["mandatory"] is True  # sem fila de espera: UnroutableError, não descarte silencioso
+
+    # Canal em modo de confirmação: NACK do broker levanta no publish e a original volta à fila
+    channel = MagicMock()
+    channel.basic_publish.side_effect = pika.exceptions.NackError([])
+    ia_consumer.settle_failure(channel, 7, BODY, pika.BasicProperties(), RuntimeError("erro"))
+
+    channel.basic_ack.assert_not_called()
+    channel.basic_nack.assert_called_once_with(delivery_tag=7)
+
+
+def test_worker_channel_enables_publisher_confirms():
+
+    connection = MagicMock()
+    channel = connection.channel.return_value
+    with patch.object(ia_consumer.pika, "BlockingConnection", return_value=connection), \
+         patch.object(ia_consumer, "WORKER_CONCURRENCY", 1):
+        ia_consumer.start_consuming()
+
+    channel.confirm_delivery.assert_called_once()
+    calls = [c[0] for c in channel.method_calls]
+    assert calls.index("confirm_delivery") < calls.index("start_consuming")
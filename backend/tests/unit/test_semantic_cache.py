@@ -0,0 +1,102 @@
+# backend/tests/unit/test_semantic_cache.py
+
+import numpy as np # type: ignore
+from unittest.mock import patch
+from app.consumers import ia_consumer
+from app.services.semantic_cache import SemanticCache, HashingEmbedder
+
+
+def test_paraphrase_hits_and_other_topic_misses():
+
+    cache = SemanticCache(path="", capacity=16, threshold=0.85)
+    cache.add("o que é a fotossíntese", "Resposta sobre fotossíntese")
+    cache.add("o que foi a revolução francesa", "Resposta sobre a revolução")
+
+    answer, score = cache.lookup("Explique fotossíntese")
+    assert answer == "Resposta sobre fotossíntese"
+    assert score >= 0.85
+
+    answer, _ = cache.lookup("o que foi a revolução industrial")
+    assert answer is None
+
+
+def test_embedding_is_normalized_and_deterministic():
+
+    embedder = HashingEmbedder(dim=64)
+    vector = embedder.embed("Teorema de Pitágoras")
+    assert np.isclose(np.linalg.norm(vector), 1.0)
+    assert np.array_equal(vector, embedder.embed("teorema de pitagoras"))
+
+
+def test_ring_buffer_overwrites_oldest_entries():
+
+    cache = SemanticCache(path="", capacity=2, threshold=0.85)
+    cache.add("o que é a mitose", "mitose")
+    cache.add("o que é a meiose", "meiose")
+    cache.add("o que é a fotossíntese", "fotossíntese")
+
+    assert len(cache) == 2
+    assert cache.lookup("explique mitose")[0] is None
+    assert cache.lookup("explique fotossíntese")[0] == "fotossíntese"
+
+
+def test_index_is_persisted_to_disk(tmp_path):
+
+    cache = SemanticCache(namespace="teste", path=str(tmp_path), capacity=8, threshold=0.85)
+    cache.add("qual a fórmula de bhaskara", "Resposta Bhaskara")
+    cache.flush()
+
+    reopened = SemanticCache(namespace="teste", path=str(tmp_path), capacity=8, threshold=0.85)
+    assert len(reopened) == 1
+    assert reopened.lookup("fórmula de Bhaskara")[0] == "Resposta Bhaskara"
+
+
+def test_worker_serves_semantic_hit_without_calling_provider():
+
+    cache = SemanticCache(path="", capacity=8, threshold=0.85)
+    cache.add("o que é a fotossíntese", "Resposta em cache")
+
+    with patch.object(ia_consumer, "semantic_cache", cache), \
+         patch.object(ia_consumer, "AI_API_KEY", "chave-teste"), \
+         patch.object(ia_consumer.response_cache, "get", return_value=None), \
+         patch.object(ia_consumer, "_call_provider") as mock_provider:
+        assert ia_consumer.call_external_ai_api("Explique a fotossíntese") == "Resposta em cache"
+
+    mock_provider.assert_not_called()
+
+
+def test_answers_log_is_compacted_when_ring_wraps(tmp_path):
+
+    cache = SemanticCache(namespace="teste", path=str(tmp_path), capacity=2, threshold=0.85)
+    topics = ["mitose", "meiose", "fotossíntese", "respiração celular", "osmose"]
+    for topic in topics:
+        cache.add(f"o que é a {topic}", topic)
+    cache.flush()
+
+    with open(tmp_path / "semantic_teste.jsonl", encoding="utf-8") as f:
+        assert len(f.readlines()) <= 2 * cache.capacity
+
+    reopened = SemanticCache(namespace="teste", path=str(tmp_path), capacity=2, threshold=0.85)
+    assert reopened.lookup("explique osmose")[0] == "osmose"
+    assert reopened.lookup("explique respiração celular")[0] == "respiração celular"
+    assert reopened.lookup("explique mitose")[0] is None
+    reopened.add("o que é a clorofila", "clorofila")  # sobrescreve a entrada mais antiga
+    assert reopened.lookup("explique osmose")[0] == "osmose"
+
+
+def test_lookup_never_pairs_new_vector_with_overwritten_answer():
+
+    cache = SemanticCache(path="", capacity=1, threshold=0.85)
+    cache.add("o que é a mitose", "mitose")
+    argmax = np.argmax
+
+    def argmax_then_overwrite(scores):
+        # Simula um `add` de outra thread entre a varredura e a leitura da resposta
+        best = argmax(scores)
+        cache.add("o que foi a revolução francesa", "revolução")
+        return best
+
+    with patch("app.services.semantic_cache.np.argmax", side_effect=argmax_then_overwrite):
+        answer, _ = cache.lookup("o que é a mitose")
+
+    assert answer is None  # o slot agora guarda outra pergunta: erro de cache, não resposta trocada
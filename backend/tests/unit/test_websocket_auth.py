@@ -0,0 +1,67 @@
+# backend/tests/unit/test_websocket_auth.py
+
+import uuid
+import pytest # type: ignore
+from unittest.mock import patch, AsyncMock
+from starlette.websockets import WebSocketDisconnect # type: ignore
+from fastapi.testclient import TestClient # type: ignore
+from app import main
+from app.api import websocket as websocket_module
+from app.models.models import ChatSession
+from app.services.auth_service import create_access_token
+
+
+@pytest.fixture
+def auth_env(test_db, seeded_user):
+    session_id = uuid.uuid4()
+    test_db.seed(ChatSession(id=session_id, user_id=seeded_user.id, status="ACTIVE"))
+
+    fake_write = AsyncMock(return_value=True)
+    with patch.object(websocket_module, "AsyncSessionLocal", test_db.session_factory), \
+         patch.object(main, "publish_request", AsyncMock(return_value=True)) as fake_publish, \
+         patch.object(main.message_writer, "write", fake_write), \
+         patch.object(main.connection_registry, "register", AsyncMock()), \
+         patch.object(main.connection_registry, "unregister", AsyncMock()):
+        yield TestClient(main.app), create_access_token(data={"sub": str(seeded_user.id)}), session_id, fake_publish, fake_write
+
+
+def test_token_handshake_binds_session_once(auth_env):
+
+    client, token, session_id, fake_publish, fake_write = auth_env
+
+    with client.websocket_connect(f"/ws_chat?id={session_id}&token={token}") as websocket:
+        for text in ("primeira", "segunda"):
+            websocket.send_text(text)
+            websocket.receive_text()  # ACK
+
+    # gravações levam o resultado do handshake e não fazem upsert de usuário/sessão
+    assert all(call.args[0] == session_id for call in fake_write.await_args_list)
+    assert all(call.kwargs["verified"] is True for call in fake_write.await_args_list)
+    message_data = fake_publish.await_args.args[0]
+    assert message_data["user_id"] == str(session_id)
+    assert message_data["session_verified"] is True
+
+
+@pytest.mark.parametrize("query", [
+    "token=token-invalido",
+    "id={other}&token={token}",  # sessão que não pertence ao usuário do token
+])
+def test_invalid_handshake_is_rejected(auth_env, query):
+
+    client, token, _, _, _ = auth_env
+    url = "/ws_chat?" + query.format(token=token, other=uuid.uuid4())
+
+    with pytest.raises(WebSocketDisconnect) as exc_info:
+        with client.websocket_connect(url) as websocket:
+            websocket.receive_text()
+    assert exc_info.value.code == 1008
+
+
+def test_anonymous_connection_requires_flag(auth_env):
+
+    client, _, _, _, _ = auth_env
+
+    with patch.object(main.settings, "WS_ALLOW_ANONYMOUS", False):
+        with pytest.raises(WebSocketDisconnect):
+            with client.websocket_connect("/ws_chat?id=user-anonimo") as websocket:
+                websocket.receive_text()
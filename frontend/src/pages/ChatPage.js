@@ -1,5 +1,6 @@
 import React, { useState, useEffect, useRef, useCallback } from 'react';
 import { WebSocketService } from '../services/websocketService';
+import { getSessionMessages } from '../services/userService';
 import ChatMessage from '../components/ChatMessage';
 import ChatInput from '../components/ChatInput';
 import './ChatPage.css';
@@ -13,17 +14,76 @@ const ChatPage = ({ userInfo: propUserInfo, onLogout }) => {
     const stored = localStorage.getItem('user');
     return stored ? JSON.parse(stored) : null;
   });
+  const [historyCursor, setHistoryCursor] = useState(null);
+  const [isLoadingHistory, setIsLoadingHistory] = useState(false);
   const wsServiceRef = useRef(null);
   const messagesEndRef = useRef(null);
+  const skipScrollRef = useRef(false);
 
   const addMessage = useCallback((sender, content) => {
     setMessages(prev => [...prev, { sender, content, timestamp: new Date() }]);
   }, []);
 
+  // Respostas em streaming: frames 'chunk' (com seq) são agrupados por stream_id
+  // e o frame 'end' substitui o conteúdo pela resposta completa
+  const upsertStreamMessage = useCallback((frame) => {
+    setMessages(prev => {
+      const index = prev.findIndex(m => m.streamId === frame.stream_id);
+      const current = index === -1
+        ? { sender: 'BOT', content: '', timestamp: new Date(), streamId: frame.stream_id, parts: {}, done: false }
+        : prev[index];
+
+      let updated;
+      if (frame.type === 'end') {
+        updated = { ...current, content: frame.content, done: true };
+      } else {
+        if (current.done) return prev; // pedaço atrasado após o fim
+        const parts = { ...current.parts, [frame.seq]: frame.content };
+        const content = Object.keys(parts)
+          .sort((a, b) => a - b)
+          .map(seq => parts[seq])
+          .join('');
+        updated = { ...current, parts, content };
+      }
+
+      if (index === -1) return [...prev, updated];
+      const next = [...prev];
+      next[index] = updated;
+      return next;
+    });
+  }, []);
+
   const addSystemMessage = useCallback((content) => {
     addMessage('SYSTEM', content);
   }, [addMessage]);
 
+  // Histórico paginado por cursor: cada página custa o mesmo, independente do tamanho da conversa
+  const loadHistory = useCallback(async (before = null) => {
+    const sessionId = localStorage.getItem('sessionId') || userInfo?.session_id;
+    if (!sessionId || !localStorage.getItem('token')) return;
+
+    setIsLoadingHistory(true);
+    try {
+      const page = await getSessionMessages(sessionId, before);
+      const older = page.messages.map(m => ({
+        sender: m.sender,
+        content: m.content,
+        timestamp: new Date(m.sent_at)
+      }));
+      skipScrollRef.current = before !== null; // páginas antigas não rolam a conversa para o fim
+      setMessages(prev => [...older, ...prev]);
+      setHistoryCursor(page.next_cursor);
+    } catch (error) {
+      console.error('Erro ao carregar histórico:', error);
+    } finally {
+      setIsLoadingHistory(false);
+    }
+  }, [userInfo]);
+
+  useEffect(() => {
+    loadHistory();
+  }, [loadHistory]);
+
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   };
@@ -40,7 +100,9 @@ const ChatPage = ({ userInfo: propUserInfo, onLogout }) => {
 
     const baseUrl = process.env.REACT_APP_WS_URL || 'ws://localhost:8000/ws_chat';
     const separator = baseUrl.includes('?') ? '&' : '?';
-    const wsUrl = `${baseUrl}${separator}id=${sessionId}`;
+    // O token JWT do login autentica o handshake e vincula a sessão à conexão
+    const token = localStorage.getItem('token');
+    const wsUrl = `${baseUrl}${separator}id=${sessionId}${token ? `&token=${encodeURIComponent(token)}` : ''}`;
 
     const wsService = new WebSocketService(
       wsUrl,
@@ -54,6 +116,10 @@ const ChatPage = ({ userInfo: propUserInfo, onLogout }) => {
         onMessage: (data) => {
           try {
             const message = JSON.parse(data);
+            if (message.type === 'chunk' || message.type === 'end') {
+              upsertStreamMessage(message);
+              return;
+            }
             console.log('Mensagem recebida do WebSocket:', message);
             // Normaliza o sender para garantir compatibilidade
             const sender = message.sender === 'BOT' ? 'BOT' : message.sender;
@@ -82,9 +148,13 @@ const ChatPage = ({ userInfo: propUserInfo, onLogout }) => {
         wsServiceRef.current.disconnect();
       }
     };
-  }, [userInfo, addMessage, addSystemMessage]);
+  }, [userInfo, addMessage, addSystemMessage, upsertStreamMessage]);
 
   useEffect(() => {
+    if (skipScrollRef.current) {
+      skipScrollRef.current = false;
+      return;
+    }
     scrollToBottom();
   }, [messages]);
 
@@ -124,6 +194,15 @@ const ChatPage = ({ userInfo: propUserInfo, onLogout }) => {
         </div>
 
         <div className="chat-messages">
+          {historyCursor && (
+            <button
+              className="load-history-button"
+              onClick={() => loadHistory(historyCursor)}
+              disabled={isLoadingHistory}
+            >
+              {isLoadingHistory ? 'Carregando...' : 'Carregar mensagens anteriores'}
+            </button>
+          )}
           {messages.map((msg, index) => (
             <ChatMessage
               key={index}
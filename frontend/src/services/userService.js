@@ -74,9 +74,12 @@ export async function updateUser(userData) {
   });
 }
 
-// Listar todos os usuários (requer autenticação)
-export async function listUsers(skip = 0, limit = 100) {
-  return authenticatedFetch(`${API_BASE_URL}/api/v1/users?skip=${skip}&limit=${limit}`);
+// Listar usuários (requer autenticação); `after` é o next_cursor da página anterior
+export async function listUsers(skip = 0, limit = 100, after = null) {
+  const params = new URLSearchParams({ limit: String(limit) });
+  if (after) params.set('after', after);
+  else if (skip) params.set('skip', String(skip));
+  return authenticatedFetch(`${API_BASE_URL}/api/v1/users?${params}`);
 }
 
 // Obter usuário por ID
@@ -84,6 +87,13 @@ export async function getUserById(userId) {
   return authenticatedFetch(`${API_BASE_URL}/api/v1/users/${userId}`);
 }
 
+// Histórico da sessão em páginas (cursor: next_cursor da página anterior)
+export async function getSessionMessages(sessionId, before = null, limit = 50) {
+  const params = new URLSearchParams({ limit: String(limit) });
+  if (before) params.set('before', before);
+  return authenticatedFetch(`${API_BASE_URL}/api/v1/sessions/${sessionId}/messages?${params}`);
+}
+
 // Desativar conta do usuário atual
 export async function deleteCurrentUser() {
   return authenticatedFetch(`${API_BASE_URL}/api/v1/users/me`, {